@@ -1,9 +1,21 @@
 from django.contrib import admin
-from .models import Requestor, Antibody, Study, Tissue, Request, Status, Assignee, Probe, Priority, EmbeddingRequest, SectioningRequest, StainingRequestChangeLog, EmbeddingRequestChangeLog, SectioningRequestChangeLog
+from django.utils.html import format_html, format_html_join
+from .models import Requestor, Antibody, Study, Tissue, Request, Status, Assignee, Probe, Priority, EmbeddingRequest, SectioningRequest, RequestChangeLog, EmailOutbox, ImportJob
 from .forms import AntibodyForm, ProbeForm, StudyEditForm
+from .lookups import fuzzy_lookup
+
+
+class FuzzySearchAdminMixin:
+    """Adds trigram matches to the admin search so misspelled names still find rows"""
+
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            matches = fuzzy_lookup(self.model, search_term, limit=None, include_archived=True)
+            results = results | queryset.filter(pk__in=matches.values('pk'))
+        return results, may_have_duplicates
 
 # Register your models here.
-admin.site.register(Requestor)
 admin.site.register(Tissue)
 admin.site.register(Request)
 admin.site.register(Status)
@@ -12,9 +24,14 @@ admin.site.register(Priority)
 admin.site.register(EmbeddingRequest)
 admin.site.register(SectioningRequest)
 
+@admin.register(Requestor)
+class RequestorAdmin(FuzzySearchAdminMixin, admin.ModelAdmin):
+    list_display = ('name', 'email')
+    search_fields = ('name', 'email')
+
 # Custom admin for models with archived field
 @admin.register(Antibody)
-class AntibodyAdmin(admin.ModelAdmin):
+class AntibodyAdmin(FuzzySearchAdminMixin, admin.ModelAdmin):
     form = AntibodyForm
     list_display = ('name', 'description', 'antigen', 'species', 'vendor', 'archived')
     list_filter = ('archived', 'species', 'vendor')
@@ -22,7 +39,7 @@ class AntibodyAdmin(admin.ModelAdmin):
     list_editable = ('archived',)
 
 @admin.register(Probe)
-class ProbeAdmin(admin.ModelAdmin):
+class ProbeAdmin(FuzzySearchAdminMixin, admin.ModelAdmin):
     form = ProbeForm
     list_display = ('name', 'description', 'target_gene', 'vendor', 'platform', 'archived')
     list_filter = ('archived', 'platform', 'vendor')
@@ -30,27 +47,39 @@ class ProbeAdmin(admin.ModelAdmin):
     list_editable = ('archived',)
 
 @admin.register(Study)
-class StudyAdmin(admin.ModelAdmin):
+class StudyAdmin(FuzzySearchAdminMixin, admin.ModelAdmin):
     form = StudyEditForm
     list_display = ('study_id', 'title', 'archived')
     list_filter = ('archived',)
     search_fields = ('study_id', 'title')
     list_editable = ('archived',)
 
-# Custom admin for change log models
-@admin.register(StainingRequestChangeLog)
-class StainingRequestChangeLogAdmin(admin.ModelAdmin):
-    list_display = ('request_id', 'requestor', 'status', 'change_type', 'changed_at', 'description')
-    list_filter = ('change_type', 'status', 'changed_at', 'requestor')
-    search_fields = ('request__key', 'requestor__name', 'status__status', 'description')
-    readonly_fields = ('request', 'requestor', 'study', 'tissue', 'antibody', 'probe', 'status', 'assigned_to', 'priority', 'special_request', 'notes', 'change_type', 'changed_at', 'description', 'changed_fields', 'change_summary', 'data')
+# Custom admin for the change log
+@admin.register(RequestChangeLog)
+class ChangeLogAdmin(admin.ModelAdmin):
+    """Read-only change log admin that shows each version's request state rebuilt from its snapshot"""
+    list_display = ('request_id', 'request_type', 'version', 'requestor', 'status', 'change_type', 'changed_at', 'description')
+    list_filter = ('request_type', 'change_type', 'changed_at')
+    search_fields = ('=request_id', 'description')
+    readonly_fields = ('request_type', 'request_id', 'version', 'snapshot', 'change_type', 'changed_at', 'description', 'changed_fields', 'change_summary', 'request_state', 'diff', 'data', 'tissue_ids')
+    list_select_related = ('snapshot',)
     ordering = ('-changed_at',)
     list_per_page = 50
     
-    def request_id(self, obj):
-        return f"#{obj.request.key}"
-    request_id.short_description = 'Request ID'
-    request_id.admin_order_field = 'request__key'
+    def requestor(self, obj):
+        return obj.state.get('requestor') or '-'
+
+    def status(self, obj):
+        return obj.state.get('status') or '-'
+
+    def request_state(self, obj):
+        rows = []
+        for name, value in obj.state.items():
+            if isinstance(value, list):
+                value = ', '.join(str(item) for item in value)
+            rows.append((name.replace('_', ' ').capitalize(), '-' if value is None else value))
+        return format_html('<table>{}</table>', format_html_join('', '<tr><th>{}</th><td>{}</td></tr>', rows))
+    request_state.short_description = 'Request state at this version'
     
     def has_add_permission(self, request):
         return False
@@ -61,48 +90,34 @@ class StainingRequestChangeLogAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         return False
 
-@admin.register(EmbeddingRequestChangeLog)
-class EmbeddingRequestChangeLogAdmin(admin.ModelAdmin):
-    list_display = ('request_id', 'requestor', 'status', 'change_type', 'changed_at', 'description')
-    list_filter = ('change_type', 'status', 'changed_at', 'requestor')
-    search_fields = ('request__key', 'requestor__name', 'status__status', 'description')
-    readonly_fields = ('request', 'requestor', 'study', 'tissues', 'status', 'assigned_to', 'special_request', 'number_of_animals', 'take_down_date', 'currently_in', 'date_of_xylene_etoh_change', 'length_of_time_in_etoh', 'change_type', 'changed_at', 'description', 'changed_fields', 'change_summary', 'data')
-    ordering = ('-changed_at',)
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('id', 'event', 'request_type', 'request_id', 'state', 'digest', 'recipient', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('state', 'event', 'request_type', 'digest')
+    search_fields = ('request_id', 'recipient', 'last_error')
+    readonly_fields = ('event', 'request_type', 'request_id', 'old_status_id', 'new_status_id', 'state', 'digest', 'recipient', 'attempts', 'next_attempt_at', 'last_error', 'created_at', 'sent_at')
+    ordering = ('-created_at',)
     list_per_page = 50
-    
-    def request_id(self, obj):
-        return f"#{obj.request.key}"
-    request_id.short_description = 'Request ID'
-    request_id.admin_order_field = 'request__key'
-    
+
     def has_add_permission(self, request):
         return False
-    
+
     def has_change_permission(self, request, obj=None):
         return False
-    
-    def has_delete_permission(self, request, obj=None):
-        return False
 
-@admin.register(SectioningRequestChangeLog)
-class SectioningRequestChangeLogAdmin(admin.ModelAdmin):
-    list_display = ('request_id', 'requestor', 'status', 'change_type', 'changed_at', 'description')
-    list_filter = ('change_type', 'status', 'changed_at', 'requestor')
-    search_fields = ('request__key', 'requestor__name', 'status__status', 'description')
-    readonly_fields = ('request', 'requestor', 'study', 'tissues', 'status', 'assigned_to', 'special_request', 'cut_surface_down', 'sections_per_slide', 'slides_per_block', 'other', 'for_what', 'change_type', 'changed_at', 'description', 'changed_fields', 'change_summary', 'data')
-    ordering = ('-changed_at',)
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'mode', 'file_name', 'state', 'checkpoint_row', 'total_rows', 'imported_count', 'updated_count', 'unchanged_count', 'skipped_count', 'invalid_count', 'attempts', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('state', 'kind', 'mode')
+    search_fields = ('file_name', 'last_error')
+    readonly_fields = ('kind', 'mode', 'dry_run', 'file', 'preview', 'preview_counts', 'file_name', 'state', 'total_rows', 'checkpoint_row', 'imported_count', 'updated_count', 'unchanged_count', 'skipped_count', 'invalid_count', 'errors', 'attempts', 'last_error', 'created_by', 'created_at', 'updated_at', 'finished_at')
+    ordering = ('-created_at',)
     list_per_page = 50
-    
-    def request_id(self, obj):
-        return f"#{obj.request.key}"
-    request_id.short_description = 'Request ID'
-    request_id.admin_order_field = 'request__key'
-    
+
     def has_add_permission(self, request):
         return False
-    
+
     def has_change_permission(self, request, obj=None):
         return False
-    
-    def has_delete_permission(self, request, obj=None):
-        return False
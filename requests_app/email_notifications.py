@@ -1,118 +1,143 @@
 """
 Email notification utilities for request management system
 """
-from django.core.mail import send_mail
+from django.core.mail import EmailMultiAlternatives, send_mail
 from django.template.loader import render_to_string
 from django.conf import settings
 from django.utils.html import strip_tags
-from .models import NotificationSettings, Requestor, Status
+from .models import Assignee, NotificationSettings, Requestor
+from .reference_data import SUBMITTED_STATUS, get_reference, status_id
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-def send_request_created_notification(request):
+def build_message(subject, html_message, recipient_email):
+    """
+    Email with an HTML body and its plain text version, as send_mail would
+    build it, ready to be sent over any connection
+    """
+    message = EmailMultiAlternatives(
+        subject=subject,
+        body=strip_tags(html_message),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[recipient_email],
+    )
+    message.attach_alternative(html_message, 'text/html')
+    return message
+
+
+def build_request_created_message(request):
+    """
+    Email for a newly created request, or None if notifications are off for
+    it or there is nobody to send it to
+    """
+    # Check if notifications are enabled for 'submitted' status
+    submitted_status_id = status_id(SUBMITTED_STATUS)
+    if not submitted_status_id:
+        return None
+
+    # Check if notifications are enabled for this request type
+    request_type = get_request_type(request)
+    if not NotificationSettings.is_notification_enabled(request_type, submitted_status_id):
+        return None
+
+    # Get recipient email
+    recipient_email = get_recipient_email(request)
+    if not recipient_email:
+        return None
+
+    # Prepare email content
+    subject = f"New {request_type.title()} Request Created - ID: #{request.key} | Type: {request_type.title()}"
+
+    # Render HTML email template
+    html_message = render_to_string('requests_app/emails/request_created.html', {
+        'request': request,
+        'request_type': request_type,
+        'requestor': request.requestor,
+        'request_url': get_request_url(request),
+    })
+    return build_message(subject, html_message, recipient_email)
+
+
+def build_status_change_message(request, old_status, new_status):
+    """
+    Email for a request status change, or None if notifications are off for
+    the new status or there is nobody to send it to
+    """
+    # Check if notifications are enabled for the new status
+    request_type = get_request_type(request)
+    if not NotificationSettings.is_notification_enabled(request_type, new_status):
+        return None
+
+    # Get recipient email
+    recipient_email = get_recipient_email(request)
+    if not recipient_email:
+        return None
+
+    # Prepare email content
+    subject = f"{request_type.title()} Request Status Updated - ID: #{request.key} | Type: {request_type.title()}"
+
+    # Render HTML email template
+    html_message = render_to_string('requests_app/emails/status_changed.html', {
+        'request': request,
+        'request_type': request_type,
+        'requestor': request.requestor,
+        'old_status': old_status,
+        'new_status': new_status,
+        'request_url': get_request_url(request),
+    })
+    return build_message(subject, html_message, recipient_email)
+
+
+def build_digest_message(recipient_email, items):
+    """
+    One summary email covering several requests. Each item describes the net
+    change to one request: request, request_type, request_url, created,
+    old_status, new_status and the number of status transitions.
+    """
+    subject = f"Request Updates - {len(items)} request{'s' if len(items) != 1 else ''} changed"
+    html_message = render_to_string('requests_app/emails/notification_digest.html', {
+        'items': items,
+    })
+    return build_message(subject, html_message, recipient_email)
+
+
+def send_request_created_notification(request, connection=None):
     """
     Send email notification when a new request is created
     """
     try:
-        # Check if notifications are enabled for 'submitted' status
-        submitted_status = Status.objects.filter(status='Submitted').first()
-        if not submitted_status:
-            return False
-            
-        # Check if notifications are enabled for this request type
-        request_type = get_request_type(request)
-        if not NotificationSettings.is_notification_enabled(request_type, submitted_status):
+        message = build_request_created_message(request)
+        if message is None:
             return False
-            
-        # Get recipient email
-        recipient_email = get_recipient_email(request)
-        if not recipient_email:
-            return False
-            
-        # Prepare email content
-        subject = f"New {request_type.title()} Request Created - ID: #{request.key} | Type: {request_type.title()}"
-        
-        # Get request URL
-        request_url = get_request_url(request)
-        
-        # Render HTML email template
-        html_message = render_to_string('requests_app/emails/request_created.html', {
-            'request': request,
-            'request_type': request_type,
-            'requestor': request.requestor,
-            'request_url': request_url,
-        })
-        
-        # Create plain text version
-        plain_message = strip_tags(html_message)
-        
-        # Send email
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[recipient_email],
-            html_message=html_message,
-            fail_silently=False,
-        )
-        
-        logger.info(f"Request creation notification sent to {recipient_email} for request #{request.key}")
+
+        message.connection = connection
+        message.send(fail_silently=False)
+
+        logger.info(f"Request creation notification sent to {message.to[0]} for request #{request.key}")
         return True
-        
+
     except Exception as e:
         logger.error(f"Failed to send request creation notification: {str(e)}")
         return False
 
 
-def send_status_change_notification(request, old_status, new_status):
+def send_status_change_notification(request, old_status, new_status, connection=None):
     """
     Send email notification when request status changes
     """
     try:
-        # Check if notifications are enabled for the new status
-        request_type = get_request_type(request)
-        if not NotificationSettings.is_notification_enabled(request_type, new_status):
-            return False
-            
-        # Get recipient email
-        recipient_email = get_recipient_email(request)
-        if not recipient_email:
+        message = build_status_change_message(request, old_status, new_status)
+        if message is None:
             return False
-            
-        # Prepare email content
-        subject = f"{request_type.title()} Request Status Updated - ID: #{request.key} | Type: {request_type.title()}"
-        
-        # Get request URL
-        request_url = get_request_url(request)
-        
-        # Render HTML email template
-        html_message = render_to_string('requests_app/emails/status_changed.html', {
-            'request': request,
-            'request_type': request_type,
-            'requestor': request.requestor,
-            'old_status': old_status,
-            'new_status': new_status,
-            'request_url': request_url,
-        })
-        
-        # Create plain text version
-        plain_message = strip_tags(html_message)
-        
-        # Send email
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[recipient_email],
-            html_message=html_message,
-            fail_silently=False,
-        )
-        
-        logger.info(f"Status change notification sent to {recipient_email} for request #{request.key}")
+
+        message.connection = connection
+        message.send(fail_silently=False)
+
+        logger.info(f"Status change notification sent to {message.to[0]} for request #{request.key}")
         return True
-        
+
     except Exception as e:
         logger.error(f"Failed to send status change notification: {str(e)}")
         return False
@@ -155,15 +180,18 @@ def get_request_url(request):
 
 def get_recipient_email(request):
     """
-    Get the recipient email address for notifications
+    Get the recipient email address for notifications. Requestors and
+    assignees come from the reference data cache, so this runs no query.
     """
     # Try to get email from requestor
-    if hasattr(request, 'requestor') and request.requestor and request.requestor.email:
-        return request.requestor.email
+    requestor = get_reference(Requestor, getattr(request, 'requestor_id', None))
+    if requestor and requestor.email:
+        return requestor.email
     
     # Try to get email from assigned_to if available
-    if hasattr(request, 'assigned_to') and request.assigned_to and request.assigned_to.email:
-        return request.assigned_to.email
+    assignee = get_reference(Assignee, getattr(request, 'assigned_to_id', None))
+    if assignee and assignee.email:
+        return assignee.email
     
     # Fallback to admin email
     return getattr(settings, 'ADMIN_EMAIL', 'admin@example.com')
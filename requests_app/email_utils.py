@@ -2,22 +2,21 @@ from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.conf import settings
 from django.urls import reverse
-from django.contrib.auth.models import User
+from .notification_cache import staff_emails
 import logging
 
 logger = logging.getLogger(__name__)
 
-def send_request_created_email(request):
+def send_request_created_email(request, connection=None):
     """
-    Send email notification when a new request is created
+    Send email notification when a new request is created. Pass an open
+    connection (e.g. BatchMailer.connection) to avoid a new SMTP session per email.
     """
     try:
-        # Get admin users to notify
-        admin_users = User.objects.filter(is_staff=True, is_active=True)
-        admin_emails = [user.email for user in admin_users if user.email]
-        
+        # Get admin users to notify (cached, so this runs no query)
+        recipient_emails = list(staff_emails())
+
         # Add the requestor email if available
-        recipient_emails = admin_emails.copy()
         if request.requestor.email:
             recipient_emails.append(request.requestor.email)
         
@@ -41,7 +40,8 @@ def send_request_created_email(request):
             from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=recipient_emails,
             html_message=html_content,
-            fail_silently=False
+            fail_silently=False,
+            connection=connection
         )
         
         logger.info(f"Request created email sent for request #{request.key}")
@@ -51,17 +51,16 @@ def send_request_created_email(request):
         logger.error(f"Failed to send request created email: {str(e)}")
         return False
 
-def send_request_completed_email(request):
+def send_request_completed_email(request, connection=None):
     """
-    Send email notification when a request is completed
+    Send email notification when a request is completed. Pass an open
+    connection (e.g. BatchMailer.connection) to avoid a new SMTP session per email.
     """
     try:
-        # Get admin users to notify
-        admin_users = User.objects.filter(is_staff=True, is_active=True)
-        admin_emails = [user.email for user in admin_users if user.email]
-        
+        # Get admin users to notify (cached, so this runs no query)
+        recipient_emails = list(staff_emails())
+
         # Add the requestor email if available
-        recipient_emails = admin_emails.copy()
         if request.requestor.email:
             recipient_emails.append(request.requestor.email)
         
@@ -85,7 +84,8 @@ def send_request_completed_email(request):
             from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=recipient_emails,
             html_message=html_content,
-            fail_silently=False
+            fail_silently=False,
+            connection=connection
         )
         
         logger.info(f"Request completed email sent for request #{request.key}")
@@ -1,5 +1,7 @@
 from django import forms
-from .models import Requestor, Antibody, Study, Tissue, Request, Status, Assignee, Probe, Priority, EmbeddingRequest, SectioningRequest
+from .models import Requestor, Antibody, Study, Tissue, Request, Status, Assignee, Probe, Priority, EmbeddingRequest, SectioningRequest, NotificationDigestSettings
+from .reference_data import reference_list, use_cached_choices
+from .widgets import AutocompleteSelect
 
 class RequestForm(forms.ModelForm):
     special_request = forms.CharField(widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'maxlength': 256}), required=False, max_length=256)
@@ -8,11 +10,11 @@ class RequestForm(forms.ModelForm):
         model = Request
         fields = ['requestor', 'antibody', 'probe', 'study', 'description', 'tissue', 'priority', 'special_request', 'assigned_to', 'links']
         widgets = {
-            'requestor': forms.Select(attrs={'class': 'form-control'}),
-            'antibody': forms.Select(attrs={'class': 'form-control'}),
-            'probe': forms.Select(attrs={'class': 'form-control'}),
-            'study': forms.Select(attrs={'class': 'form-control'}),
-            'tissue': forms.Select(attrs={'class': 'form-control'}),
+            'requestor': AutocompleteSelect(),
+            'antibody': AutocompleteSelect(),
+            'probe': AutocompleteSelect(),
+            'study': AutocompleteSelect(),
+            'tissue': AutocompleteSelect(),
             'description': forms.TextInput(attrs={'class': 'form-control', 'maxlength': 256}),
             'priority': forms.Select(attrs={'class': 'form-control'}),
             'special_request': forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'maxlength': 256}),
@@ -32,6 +34,8 @@ class RequestForm(forms.ModelForm):
         self.fields['assigned_to'].queryset = Assignee.objects.all().order_by('name')
         self.fields['assigned_to'].required = False
         self.fields['probe'].required = False
+        use_cached_choices(self.fields['priority'], reference_list(Priority))
+        use_cached_choices(self.fields['assigned_to'], reference_list(Assignee))
 
 class RequestEditForm(forms.ModelForm):
     notes = forms.CharField(widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 4, 'maxlength': 256}), required=False, max_length=256)
@@ -47,8 +51,8 @@ class RequestEditForm(forms.ModelForm):
             'special_request': forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'maxlength': 256}),
             'priority': forms.Select(attrs={'class': 'form-control'}),
             'assigned_to': forms.Select(attrs={'class': 'form-control'}),
-            'antibody': forms.Select(attrs={'class': 'form-control'}),
-            'probe': forms.Select(attrs={'class': 'form-control'}),
+            'antibody': AutocompleteSelect(),
+            'probe': AutocompleteSelect(),
         }
 
     def __init__(self, *args, **kwargs):
@@ -62,17 +66,21 @@ class RequestEditForm(forms.ModelForm):
         self.fields['probe'].queryset = Probe.objects.filter(archived=False).order_by('name')
         self.fields['probe'].label_from_instance = lambda obj: f"{obj.name} - {obj.description}"
         self.fields['probe'].required = False
+        use_cached_choices(self.fields['status'], reference_list(Status))
+        use_cached_choices(self.fields['priority'], reference_list(Priority))
+        use_cached_choices(self.fields['assigned_to'], reference_list(Assignee))
 
 class RequestSearchForm(forms.Form):
+    q = forms.CharField(required=False, label='Keywords', widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Search description, special request and notes'}))
     request_id = forms.IntegerField(required=False, widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Request ID'}))
     date_from = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
     date_to = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
-    requestor = forms.ModelChoiceField(queryset=Requestor.objects.all().order_by('name'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
+    requestor = forms.ModelChoiceField(queryset=Requestor.objects.all().order_by('name'), required=False, widget=AutocompleteSelect())
     description = forms.CharField(required=False, widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Description'}))
-    antibody = forms.ModelChoiceField(queryset=Antibody.objects.filter(archived=False).order_by('name'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
-    probe = forms.ModelChoiceField(queryset=Probe.objects.filter(archived=False).order_by('name'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
-    tissue = forms.ModelChoiceField(queryset=Tissue.objects.all().order_by('name'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
-    study = forms.ModelChoiceField(queryset=Study.objects.all().order_by('study_id'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
+    antibody = forms.ModelChoiceField(queryset=Antibody.objects.filter(archived=False).order_by('name'), required=False, widget=AutocompleteSelect())
+    probe = forms.ModelChoiceField(queryset=Probe.objects.filter(archived=False).order_by('name'), required=False, widget=AutocompleteSelect())
+    tissue = forms.ModelChoiceField(queryset=Tissue.objects.all().order_by('name'), required=False, widget=AutocompleteSelect())
+    study = forms.ModelChoiceField(queryset=Study.objects.all().order_by('study_id'), required=False, widget=AutocompleteSelect())
     status = forms.ModelChoiceField(queryset=Status.objects.all().order_by('status'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
     priority = forms.ModelChoiceField(queryset=Priority.objects.all().order_by('value'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
     assigned_to = forms.ModelChoiceField(queryset=Assignee.objects.all().order_by('name'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
@@ -95,6 +103,9 @@ class RequestSearchForm(forms.Form):
         self.fields['status'].empty_label = "Select Status"
         self.fields['priority'].empty_label = "Select Priority"
         self.fields['assigned_to'].empty_label = "Select Assignee"
+        use_cached_choices(self.fields['status'], reference_list(Status))
+        use_cached_choices(self.fields['priority'], reference_list(Priority))
+        use_cached_choices(self.fields['assigned_to'], reference_list(Assignee))
 
 # Embedding Request Form
 class EmbeddingRequestForm(forms.ModelForm):
@@ -105,8 +116,8 @@ class EmbeddingRequestForm(forms.ModelForm):
         fields = ['requestor', 'study', 'special_request', 'assigned_to', 'currently_in', 'take_down_date', 'length_of_time_in_etoh', 'number_of_animals', 'date_of_xylene_etoh_change', 'links']
         exclude = ['tissues']
         widgets = {
-            'requestor': forms.Select(attrs={'class': 'form-control'}),
-            'study': forms.Select(attrs={'class': 'form-control'}),
+            'requestor': AutocompleteSelect(),
+            'study': AutocompleteSelect(),
             'special_request': forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'maxlength': 256}),
             'assigned_to': forms.Select(attrs={'class': 'form-control'}),
             'currently_in': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Currently In'}),
@@ -125,6 +136,7 @@ class EmbeddingRequestForm(forms.ModelForm):
         self.fields['take_down_date'].required = False
         self.fields['length_of_time_in_etoh'].required = False
         self.fields['currently_in'].required = False
+        use_cached_choices(self.fields['assigned_to'], reference_list(Assignee))
 
     def save(self, commit=True):
         instance = super().save(commit=False)
@@ -141,8 +153,8 @@ class SectioningRequestForm(forms.ModelForm):
         fields = ['requestor', 'study', 'special_request', 'assigned_to', 'cut_surface_down', 'sections_per_slide', 'slides_per_block', 'other', 'for_what', 'links']
         exclude = ['tissues']
         widgets = {
-            'requestor': forms.Select(attrs={'class': 'form-control'}),
-            'study': forms.Select(attrs={'class': 'form-control'}),
+            'requestor': AutocompleteSelect(),
+            'study': AutocompleteSelect(),
             'special_request': forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'maxlength': 256}),
             'assigned_to': forms.Select(attrs={'class': 'form-control'}),
             'cut_surface_down': forms.Select(attrs={'class': 'form-control'}, choices=[(True, 'Yes'), (False, 'No')]),
@@ -162,6 +174,7 @@ class SectioningRequestForm(forms.ModelForm):
         self.fields['slides_per_block'].required = False
         self.fields['other'].required = False
         self.fields['for_what'].required = False
+        use_cached_choices(self.fields['assigned_to'], reference_list(Assignee))
 
     def save(self, commit=True):
         instance = super().save(commit=False)
@@ -177,8 +190,8 @@ class EmbeddingRequestEditForm(forms.ModelForm):
         fields = ['status', 'requestor', 'study', 'special_request', 'assigned_to', 'currently_in', 'take_down_date', 'length_of_time_in_etoh', 'number_of_animals', 'date_of_xylene_etoh_change']
         widgets = {
             'status': forms.Select(attrs={'class': 'form-control'}),
-            'requestor': forms.Select(attrs={'class': 'form-control'}),
-            'study': forms.Select(attrs={'class': 'form-control'}),
+            'requestor': AutocompleteSelect(),
+            'study': AutocompleteSelect(),
             'special_request': forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'maxlength': 256}),
             'assigned_to': forms.Select(attrs={'class': 'form-control'}),
             'currently_in': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Currently In'}),
@@ -196,6 +209,8 @@ class EmbeddingRequestEditForm(forms.ModelForm):
         self.fields['assigned_to'].queryset = Assignee.objects.all().order_by('name')
         self.fields['assigned_to'].required = False
         self.fields['currently_in'].required = False
+        use_cached_choices(self.fields['status'], reference_list(Status))
+        use_cached_choices(self.fields['assigned_to'], reference_list(Assignee))
 
 class SectioningRequestEditForm(forms.ModelForm):
     special_request = forms.CharField(widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'maxlength': 256}), required=False, max_length=256)
@@ -205,8 +220,8 @@ class SectioningRequestEditForm(forms.ModelForm):
         fields = ['status', 'requestor', 'study', 'special_request', 'assigned_to', 'cut_surface_down', 'sections_per_slide', 'slides_per_block', 'other', 'for_what']
         widgets = {
             'status': forms.Select(attrs={'class': 'form-control'}),
-            'requestor': forms.Select(attrs={'class': 'form-control'}),
-            'study': forms.Select(attrs={'class': 'form-control'}),
+            'requestor': AutocompleteSelect(),
+            'study': AutocompleteSelect(),
             'special_request': forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'maxlength': 256}),
             'assigned_to': forms.Select(attrs={'class': 'form-control'}),
             'cut_surface_down': forms.Select(attrs={'class': 'form-control'}, choices=[(True, 'Yes'), (False, 'No')]),
@@ -227,18 +242,21 @@ class SectioningRequestEditForm(forms.ModelForm):
         self.fields['slides_per_block'].required = False
         self.fields['other'].required = False
         self.fields['for_what'].required = False
+        use_cached_choices(self.fields['status'], reference_list(Status))
+        use_cached_choices(self.fields['assigned_to'], reference_list(Assignee))
 
 # Staining Request Search Form
 class StainingRequestSearchForm(forms.Form):
+    q = forms.CharField(required=False, label='Keywords', widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Search description, special request and notes'}))
     request_id = forms.IntegerField(required=False, widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Request ID'}))
     date_from = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
     date_to = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
-    requestor = forms.ModelChoiceField(queryset=Requestor.objects.all().order_by('name'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
+    requestor = forms.ModelChoiceField(queryset=Requestor.objects.all().order_by('name'), required=False, widget=AutocompleteSelect())
     description = forms.CharField(required=False, widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Description'}))
-    antibody = forms.ModelChoiceField(queryset=Antibody.objects.filter(archived=False).order_by('name'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
-    probe = forms.ModelChoiceField(queryset=Probe.objects.filter(archived=False).order_by('name'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
-    tissue = forms.ModelChoiceField(queryset=Tissue.objects.all().order_by('name'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
-    study = forms.ModelChoiceField(queryset=Study.objects.all().order_by('study_id'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
+    antibody = forms.ModelChoiceField(queryset=Antibody.objects.filter(archived=False).order_by('name'), required=False, widget=AutocompleteSelect())
+    probe = forms.ModelChoiceField(queryset=Probe.objects.filter(archived=False).order_by('name'), required=False, widget=AutocompleteSelect())
+    tissue = forms.ModelChoiceField(queryset=Tissue.objects.all().order_by('name'), required=False, widget=AutocompleteSelect())
+    study = forms.ModelChoiceField(queryset=Study.objects.all().order_by('study_id'), required=False, widget=AutocompleteSelect())
     status = forms.ModelChoiceField(queryset=Status.objects.all().order_by('status'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
     priority = forms.ModelChoiceField(queryset=Priority.objects.all().order_by('value'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
     assigned_to = forms.ModelChoiceField(queryset=Assignee.objects.all().order_by('name'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
@@ -261,15 +279,19 @@ class StainingRequestSearchForm(forms.Form):
         self.fields['status'].empty_label = "Select Status"
         self.fields['priority'].empty_label = "Select Priority"
         self.fields['assigned_to'].empty_label = "Select Assignee"
+        use_cached_choices(self.fields['status'], reference_list(Status))
+        use_cached_choices(self.fields['priority'], reference_list(Priority))
+        use_cached_choices(self.fields['assigned_to'], reference_list(Assignee))
 
 # Sectioning Request Search Form
 class SectioningRequestSearchForm(forms.Form):
+    q = forms.CharField(required=False, label='Keywords', widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Search special request and other'}))
     request_id = forms.IntegerField(required=False, widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Request ID'}))
     date_from = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
     date_to = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
-    requestor = forms.ModelChoiceField(queryset=Requestor.objects.all().order_by('name'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
-    tissue = forms.ModelChoiceField(queryset=Tissue.objects.all().order_by('name'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
-    study = forms.ModelChoiceField(queryset=Study.objects.all().order_by('study_id'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
+    requestor = forms.ModelChoiceField(queryset=Requestor.objects.all().order_by('name'), required=False, widget=AutocompleteSelect())
+    tissue = forms.ModelChoiceField(queryset=Tissue.objects.all().order_by('name'), required=False, widget=AutocompleteSelect())
+    study = forms.ModelChoiceField(queryset=Study.objects.all().order_by('study_id'), required=False, widget=AutocompleteSelect())
     status = forms.ModelChoiceField(queryset=Status.objects.all().order_by('status'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
     assigned_to = forms.ModelChoiceField(queryset=Assignee.objects.all().order_by('name'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
     special_request = forms.CharField(required=False, widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Special Request'}))
@@ -287,15 +309,18 @@ class SectioningRequestSearchForm(forms.Form):
         self.fields['tissue'].empty_label = "Select Tissue"
         self.fields['status'].empty_label = "Select Status"
         self.fields['assigned_to'].empty_label = "Select Assignee"
+        use_cached_choices(self.fields['status'], reference_list(Status))
+        use_cached_choices(self.fields['assigned_to'], reference_list(Assignee))
 
 # Embedding Request Search Form
 class EmbeddingRequestSearchForm(forms.Form):
+    q = forms.CharField(required=False, label='Keywords', widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Search special request and currently in'}))
     request_id = forms.IntegerField(required=False, widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Request ID'}))
     date_from = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
     date_to = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
-    requestor = forms.ModelChoiceField(queryset=Requestor.objects.all().order_by('name'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
-    tissue = forms.ModelChoiceField(queryset=Tissue.objects.all().order_by('name'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
-    study = forms.ModelChoiceField(queryset=Study.objects.all().order_by('study_id'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
+    requestor = forms.ModelChoiceField(queryset=Requestor.objects.all().order_by('name'), required=False, widget=AutocompleteSelect())
+    tissue = forms.ModelChoiceField(queryset=Tissue.objects.all().order_by('name'), required=False, widget=AutocompleteSelect())
+    study = forms.ModelChoiceField(queryset=Study.objects.all().order_by('study_id'), required=False, widget=AutocompleteSelect())
     status = forms.ModelChoiceField(queryset=Status.objects.all().order_by('status'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
     assigned_to = forms.ModelChoiceField(queryset=Assignee.objects.all().order_by('name'), required=False, widget=forms.Select(attrs={'class': 'form-control'}))
     special_request = forms.CharField(required=False, widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Special Request'}))
@@ -313,6 +338,8 @@ class EmbeddingRequestSearchForm(forms.Form):
         self.fields['tissue'].empty_label = "Select Tissue"
         self.fields['status'].empty_label = "Select Status"
         self.fields['assigned_to'].empty_label = "Select Assignee"
+        use_cached_choices(self.fields['status'], reference_list(Status))
+        use_cached_choices(self.fields['assigned_to'], reference_list(Assignee))
 
 class StudyEditForm(forms.ModelForm):
     archived = forms.ChoiceField(
@@ -427,7 +454,7 @@ class BaseNotificationConfigForm(forms.Form):
         self.request_type = request_type
         
         # Get all statuses
-        statuses = Status.objects.all().order_by('status')
+        statuses = reference_list(Status)
         
         # Create a checkbox field for each status
         for status in statuses:
@@ -438,6 +465,23 @@ class BaseNotificationConfigForm(forms.Form):
                 widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
             )
 
+        # Digest mode for this request type, initially as stored
+        digest_settings = NotificationDigestSettings.objects.filter(request_type=request_type).first()
+        self.fields['digest_enabled'] = forms.BooleanField(
+            required=False,
+            initial=digest_settings.digest_enabled if digest_settings else False,
+            label='Send notifications as a digest',
+            widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+        )
+        self.fields['digest_window_minutes'] = forms.IntegerField(
+            required=False,
+            min_value=1,
+            max_value=1440,
+            initial=digest_settings.window_minutes if digest_settings else NotificationDigestSettings.DEFAULT_WINDOW_MINUTES,
+            label='Digest window (minutes)',
+            widget=forms.NumberInput(attrs={'class': 'form-control', 'min': 1, 'max': 1440})
+        )
+
 
 class StainingNotificationConfigForm(BaseNotificationConfigForm):
     """Form for configuring staining request notifications"""
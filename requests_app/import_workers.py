@@ -0,0 +1,20 @@
+"""
+Set-up of the worker processes that parse large workbooks for the import
+engine (see imports.parallel_xlsx_chunks).
+
+Workers are spawned rather than forked, so they never share the parent's
+database connection. A spawned worker starts without Django, which is why
+this module must not import the models: it is loaded to run the
+initializer before the parse function pulls in requests_app.imports.
+"""
+import django
+
+# Parser settings of the workbook being imported: its shared strings, date
+# epoch and date styles. Set once per worker, as the shared strings can be
+# large and are the same for every part of the sheet.
+workbook_context = {}
+
+
+def init_worker(context):
+    django.setup()
+    workbook_context.update(context)
@@ -0,0 +1,1048 @@
+"""
+Streaming import of the reference catalogs (studies, antibodies, probes)
+from uploaded spreadsheets (.xlsx), CSV and TSV files and Parquet files.
+
+Rows are streamed from the file (openpyxl in read-only mode, the csv module
+or one Parquet row group at a time) and handled CHUNK_SIZE at a time: every
+chunk is validated as a pandas DataFrame, a column at a time, checked
+against the existing keys with one query and inserted with bulk_create, so
+memory stays flat and import time grows linearly with the file instead of
+costing two queries per row. Large workbooks, whose parsing dominates, are
+cut into parts of CHUNK_SIZE rows that a pool of processes parses and
+validates while this process writes the results.
+
+Uploads are not imported inside the web request: they are saved as an
+ImportJob and processed by the process_import_jobs management command,
+which commits every chunk together with the job's checkpoint. A dry-run
+job only stores the diff the import would apply, for the user to review
+and then commit as is.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from datetime import timedelta
+import csv
+import io
+import multiprocessing
+import os
+import re
+import tempfile
+
+import numpy as np
+import openpyxl
+from openpyxl.worksheet._reader import WorkSheetParser
+import pandas as pd
+from django.core.files import File
+from django.db import IntegrityError, connection, models, transaction
+from django.utils import timezone
+from . import import_workers
+from .models import ImportJob, Study, Antibody, Probe
+from .reference_data import bump_version
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 2000
+BATCH_SIZE = 500
+
+# What a previewed row does when the import is committed: 'existing' rows
+# are skipped (add-only mode), 'unchanged' ones already match (upsert mode),
+# and only 'new' and 'update' rows are written
+PREVIEW_ACTIONS = ['new', 'update', 'unchanged', 'existing', 'duplicate', 'invalid']
+PREVIEW_WRITTEN = ['new', 'update']
+PREVIEW_COLUMNS = ['row', 'action', 'changed', 'message']
+
+# Workbooks whose sheet XML is larger than this (about 25k rows) are parsed
+# by a pool of PARSE_WORKERS processes; for smaller ones starting the pool
+# costs more than it saves
+PARALLEL_PARSE_MIN_BYTES = 8 * 2**20
+PARSE_WORKERS = min(os.cpu_count() or 1, 8)
+
+# Where the rows of a worksheet's XML start and end: the sheetData element
+# (self-closing when the sheet is empty) and each row element in it
+SHEET_DATA_TAG = re.compile(rb'<((?:[\w.-]+:)?)sheetData(?:\s[^>]*?)?(/?)>')
+ROW_TAG = re.compile(rb'<(?:[\w.-]+:)?row[\s/>]')
+
+# A running job whose heartbeat (updated_at) has not moved for this long
+# is taken over by the next worker, which resumes it. A live job saves its
+# heartbeat with every checkpoint and at least every JOB_HEARTBEAT_INTERVAL
+# while it only reads (counting rows, building a preview).
+STALE_JOB_AFTER = timedelta(minutes=10)
+JOB_HEARTBEAT_INTERVAL = timedelta(minutes=1)
+
+# Invalid rows reported back to the user by row number; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+# Characters allowed in keys and study titles: letters, numbers, spaces,
+# hyphens, underscores, parentheses, colons, periods and commas. Matched
+# against whole values with Series.str.fullmatch. Text is also limited to
+# its model field's max_length and integers to its field's range.
+VALID_IMPORT_VALUE = r'[a-zA-Z0-9\s\-_\(\):.,]+'
+
+# Cell values read as True in boolean columns (compared lowercased); anything else is False
+TRUE_VALUES = ['true', 'yes', 'y', '1', 'x']
+
+# What each catalog is imported into. Columns are matched against the
+# headers in the first row after lowercasing them and replacing spaces with
+# underscores, so "Study ID" and "study_id" are the same column. Optional
+# columns are imported (and updated) only when the file has them. Rows whose
+# key appears earlier in the file are skipped.
+IMPORT_SPECS = {
+    'studies': {
+        'model': Study,
+        'key': 'study_id',
+        'columns': ['study_id', 'title'],
+        'optional': ['archived'],
+        'validated': ['study_id', 'title'],
+        'integers': [],
+        'booleans': ['archived'],
+    },
+    'antibodies': {
+        'model': Antibody,
+        'key': 'name',
+        'columns': ['name', 'description', 'antigen', 'species', 'recognizes', 'vendor'],
+        'optional': ['archived'],
+        'validated': ['name'],
+        'integers': [],
+        'booleans': ['archived'],
+    },
+    'probes': {
+        'model': Probe,
+        'key': 'name',
+        'columns': ['name', 'description', 'target_gene', 'vendor', 'platform', 'number_of_pairs'],
+        'optional': ['archived'],
+        'validated': ['name'],
+        'integers': ['number_of_pairs'],
+        'booleans': ['archived'],
+    },
+}
+
+
+class ImportFileError(ValueError):
+    """The uploaded file cannot be imported at all (wrong type or missing columns)"""
+
+
+class JobTakenOver(Exception):
+    """Another worker claimed the job as stale; the worker that had it must stop without saving anything"""
+
+
+def normalize_header(value):
+    return re.sub(r'\s+', '_', str(value).strip().lower()) if value is not None else ''
+
+
+def read_xlsx_rows(file):
+    """Tuples of cell values of the first sheet, header row first, streamed without loading the workbook"""
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def xlsx_row_count(file):
+    """Data rows in the first sheet according to its dimensions, or None if it does not record them"""
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        max_row = workbook.active.max_row
+    finally:
+        workbook.close()
+    return max_row - 1 if max_row else None
+
+
+def read_csv_rows(file, delimiter=','):
+    """Lists of cell strings of a binary CSV file (UTF-8, with or without BOM), header row first"""
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    try:
+        yield from csv.reader(text, delimiter=delimiter)
+    finally:
+        # Leave the underlying file open for the caller to close
+        text.detach()
+
+
+def read_tsv_rows(file):
+    return read_csv_rows(file, delimiter='\t')
+
+
+def csv_row_count(file, delimiter=','):
+    """Data rows in a CSV file, counted with a pass of the csv module (quoted cells may span lines)"""
+    return max(sum(1 for _ in read_csv_rows(file, delimiter)) - 1, 0)
+
+
+def tsv_row_count(file):
+    return csv_row_count(file, delimiter='\t')
+
+
+def read_parquet_rows(file):
+    """Tuples of values of a Parquet file, column names first, read one row group at a time"""
+    # Imported here so that only Parquet imports load pyarrow
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(file)
+    yield tuple(parquet.schema_arrow.names)
+    for index in range(parquet.num_row_groups):
+        columns = parquet.read_row_group(index).columns
+        yield from zip(*(column.to_pylist() for column in columns))
+
+
+def parquet_row_count(file):
+    """Rows in a Parquet file, from its footer"""
+    import pyarrow.parquet as pq
+
+    return pq.ParquetFile(file).metadata.num_rows
+
+
+# File types that can be imported, by extension: 'read' streams the rows
+# of a binary file as sequences of values, header row first, and 'count'
+# tells how many data rows it has (or None) for progress reporting
+IMPORT_FORMATS = {
+    '.xlsx': {'label': 'Excel', 'read': read_xlsx_rows, 'count': xlsx_row_count},
+    '.csv': {'label': 'CSV', 'read': read_csv_rows, 'count': csv_row_count},
+    '.tsv': {'label': 'TSV', 'read': read_tsv_rows, 'count': tsv_row_count},
+    '.parquet': {'label': 'Parquet', 'read': read_parquet_rows, 'count': parquet_row_count},
+}
+
+
+def import_format(name):
+    """The IMPORT_FORMATS entry for a file name; raises ImportFileError for any other type"""
+    extension = os.path.splitext(name)[1].lower()
+    if extension not in IMPORT_FORMATS:
+        accepted = ', '.join(f"{entry['label']} ({suffix})" for suffix, entry in IMPORT_FORMATS.items())
+        raise ImportFileError(f'Please upload one of these file types: {accepted}.')
+    return IMPORT_FORMATS[extension]
+
+
+def read_rows(file, name=None):
+    """Rows of an uploaded file of any IMPORT_FORMATS type, header row first; name defaults to file.name"""
+    return import_format(name or file.name)['read'](file)
+
+
+def count_rows(file, name=None):
+    """Data rows in an uploaded file, or None if that cannot be told without reading it"""
+    return import_format(name or file.name)['count'](file)
+
+
+def column_indexes(header, spec):
+    """{column: position in the row} for spec's columns and whichever optional columns the header row has"""
+    header = [normalize_header(value) for value in header]
+    missing = [column for column in spec['columns'] if column not in header]
+    if missing:
+        raise ImportFileError(f'Missing required columns: {", ".join(missing)}')
+    return {
+        column: header.index(column)
+        for column in spec['columns'] + spec['optional'] if column in header
+    }
+
+
+def iter_records(rows, spec):
+    """
+    (row_number, {column: raw value}) for every data row, after matching the
+    header row to spec's columns and whichever optional columns it has
+    """
+    rows = iter(rows)
+    indexes = column_indexes(next(rows, ()), spec)
+    for row_number, row in enumerate(rows, start=2):
+        yield row_number, {
+            column: row[index] if index < len(row) else None
+            for column, index in indexes.items()
+        }
+
+
+def records_frame(records, spec):
+    """DataFrame of (row_number, record) pairs with one column per record key, indexed by row number"""
+    # rename_axis because from_records drops the index's name when there are no records
+    return pd.DataFrame.from_records(
+        [record for _, record in records],
+        index=pd.Index([row_number for row_number, _ in records]),
+        columns=list(records[0][1]) if records else spec['columns'],
+    ).rename_axis('row')
+
+
+def validate_frame(frame, spec):
+    """
+    Normalize and validate a frame of raw records (see records_frame) whole
+    columns at a time. Returns the rows that can be imported, with text
+    stripped, integer columns converted (None where a number could not be
+    read) and boolean columns read with TRUE_VALUES, and a report with one
+    row per rejected row: its row number, the issue ('invalid' or
+    'duplicate', meaning its key appeared earlier in the frame), a message
+    and its key. Rows with text longer than its field allows or numbers out of
+    its field's range are invalid. Blank lines are dropped without being
+    reported.
+    """
+    model = spec['model']
+    values = pd.DataFrame(index=frame.index)
+    filled = pd.Series(False, index=frame.index)
+    # (rows failing a check, message) pairs, checked in column order
+    failures = []
+    for column in frame.columns:
+        field = model._meta.get_field(column)
+        label = column.replace('_', ' ')
+        text = frame[column].astype('string').str.strip()
+        filled |= text.fillna('') != ''
+        if column in spec['integers']:
+            numbers = pd.to_numeric(text, errors='coerce').astype('Float64')
+            low, high = connection.ops.integer_field_range(field.get_internal_type())
+            in_range = numbers.between(low, high).fillna(False)
+            failures.append((numbers.notna() & ~in_range, f'{label} out of range'))
+            values[column] = np.trunc(numbers.where(in_range)).astype('Int64')
+        elif column in spec['booleans']:
+            values[column] = text.str.lower().isin(TRUE_VALUES)
+        else:
+            values[column] = text.fillna('')
+            if column in spec['validated']:
+                failures.append((~values[column].str.fullmatch(VALID_IMPORT_VALUE), f'invalid {label}'))
+            if field.max_length is not None:
+                failures.append((
+                    values[column].str.len() > field.max_length,
+                    f'{label} longer than {field.max_length} characters',
+                ))
+    values = values[filled]
+
+    # The first failing check of each row gives its message
+    error = pd.Series(pd.NA, index=values.index, dtype='string')
+    for failed, message in failures:
+        error = error.mask(failed[filled] & error.isna(), message)
+    invalid = error.notna()
+
+    key = spec['key']
+    duplicate = pd.Series(False, index=values.index)
+    duplicate[~invalid] = values.loc[~invalid, key].duplicated()
+
+    report = pd.concat([
+        pd.DataFrame({'issue': 'invalid', 'message': error[invalid], key: values.loc[invalid, key]}),
+        duplicate_report(values.loc[duplicate, key], key),
+    ]).sort_index().rename_axis('row').reset_index()
+    return values[~invalid & ~duplicate], report
+
+
+def duplicate_report(keys, key):
+    """Report rows (see validate_frame) for the rows of keys, a Series of key values indexed by row number"""
+    return pd.DataFrame({'issue': 'duplicate', 'message': f'duplicate {key.replace("_", " ")} ' + keys, key: keys})
+
+
+def drop_repeated_keys(chunks, key):
+    """
+    Validated chunks (see file_chunks) with the rows whose key appeared in
+    an earlier chunk moved to the report as duplicates; validate_frame only
+    sees one chunk at a time
+    """
+    seen = set()
+    for last_row, rows, report in chunks:
+        repeated = rows[key].isin(seen)
+        if repeated.any():
+            report = pd.concat([
+                report.set_index('row'), duplicate_report(rows.loc[repeated, key], key),
+            ]).sort_index().rename_axis('row').reset_index()
+            rows = rows[~repeated]
+        seen.update(rows[key])
+        yield last_row, rows, report
+
+
+def frame_values(frame):
+    """The rows of a validated frame as field value dicts, with None for missing values"""
+    return frame.astype(object).where(frame.notna(), None).to_dict('records')
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def new_result():
+    return {'imported': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0, 'invalid': 0, 'errors': []}
+
+
+def same_value(current, new):
+    """Whether a stored field value already matches the file; blank and NULL text count as the same"""
+    return current == new or (current in (None, '') and new in (None, ''))
+
+
+def update_existing(spec, rows, result):
+    """
+    Apply the file's values to the existing rows with the keys of rows, with
+    one SELECT and batched UPDATEs of just the fields that changed. Returns
+    the keys that were found.
+    """
+    model, key = spec['model'], spec['key']
+    fields = [column for column in rows.columns if column != key]
+    incoming = {values[key]: values for values in frame_values(rows)}
+
+    changed_objects, changed_fields = [], set()
+    found, updated = set(), set()
+    for obj in model.objects.filter(**{f'{key}__in': list(incoming)}).only(key, *fields):
+        value = getattr(obj, key)
+        values = incoming[value]
+        found.add(value)
+        changed = [field for field in fields if not same_value(getattr(obj, field), values[field])]
+        if changed:
+            for field in changed:
+                setattr(obj, field, values[field])
+            changed_objects.append(obj)
+            changed_fields.update(changed)
+            updated.add(value)
+    if changed_objects:
+        model.objects.bulk_update(changed_objects, sorted(changed_fields), batch_size=BATCH_SIZE)
+
+    result['updated'] += len(updated)
+    result['unchanged'] += len(found) - len(updated)
+    return found
+
+
+def lock_catalog(model):
+    """
+    Hold an advisory lock on a catalog until the transaction ends. Antibody
+    and probe names have no unique constraint, so two imports (or a job and
+    the worker that took it over as stale) must not both find a name
+    missing and insert it.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [f'import:{model._meta.label_lower}'])
+
+
+def existing_keys(spec, keys):
+    """The keys out of a list that a catalog already has, with one SELECT"""
+    model, key = spec['model'], spec['key']
+    return set(model.objects.filter(**{f'{key}__in': keys}).values_list(key, flat=True))
+
+
+def apply_rows(spec, rows, result, mode):
+    """write_rows without the catalog's lock or the retry"""
+    model, key = spec['model'], spec['key']
+    if mode == ImportJob.MODE_UPSERT:
+        found = update_existing(spec, rows, result)
+    else:
+        found = existing_keys(spec, rows[key].tolist())
+        result['skipped'] += len(found)
+
+    new_objects = [model(**values) for values in frame_values(rows[~rows[key].isin(list(found))])]
+    model.objects.bulk_create(new_objects, batch_size=BATCH_SIZE)
+    result['imported'] += len(new_objects)
+    return result
+
+
+def write_rows(spec, rows, result, mode=ImportJob.MODE_INSERT):
+    """
+    Write a frame of validated rows (see validate_frame): rows with new keys
+    are inserted with batched INSERTs, and rows whose key exists are skipped
+    or, in upsert mode (see ImportJob.MODE_CHOICES), applied with batched
+    UPDATEs. Existing keys are found with one SELECT, under the catalog's
+    lock (see lock_catalog), so must be called in a transaction.
+
+    The lock only keeps imports apart. A study saved some other way (a
+    form, the admin) between the SELECT and the INSERT makes the INSERT fail
+    on the unique study_id; the chunk is then written again, now finding
+    that study.
+    """
+    lock_catalog(spec['model'])
+    written = new_result()
+    try:
+        with transaction.atomic():
+            apply_rows(spec, rows, written, mode)
+    except IntegrityError:
+        written = new_result()
+        with transaction.atomic():
+            apply_rows(spec, rows, written, mode)
+    for name in ('imported', 'updated', 'unchanged', 'skipped'):
+        result[name] += written[name]
+    return result
+
+
+def add_report(report, result):
+    """Count the rejected rows of a validation report into result, keeping the first error messages"""
+    invalid = report[report['issue'] == 'invalid']
+    result['invalid'] += len(invalid)
+    result['skipped'] += len(report) - len(invalid)
+    for row_number, message in invalid[['row', 'message']].head(MAX_REPORTED_ERRORS - len(result['errors'])).itertuples(index=False):
+        result['errors'].append(f'Row {row_number}: {message}')
+    return result
+
+
+def import_chunk(spec, records, result, mode=ImportJob.MODE_INSERT):
+    """Validate and write the (row_number, record) pairs of one chunk; see write_rows"""
+    if not records:
+        return result
+    rows, report = validate_frame(records_frame(records, spec), spec)
+    add_report(report, result)
+    return write_rows(spec, rows, result, mode)
+
+
+def frame_chunk(records, spec, validate=True):
+    """(last row number, frame, report) for a list of (row_number, record) pairs; see validate_frame"""
+    frame = records_frame(records, spec)
+    if not validate:
+        return records[-1][0], frame, None
+    rows, report = validate_frame(frame, spec)
+    return records[-1][0], rows, report
+
+
+def record_chunks(records, spec, chunk_size=CHUNK_SIZE, validate=True):
+    """frame_chunk for every chunk_size (row_number, record) pairs"""
+    for chunk in chunked(records, chunk_size):
+        yield frame_chunk(chunk, spec, validate)
+
+
+def file_chunks(kind, file, name=None, chunk_size=CHUNK_SIZE, after_row=1, validate=True, workers=PARSE_WORKERS):
+    """
+    (last row number, frame, report) for every chunk of an uploaded file's
+    rows after after_row: the validated rows and the report of rejected
+    rows (see validate_frame), or with validate=False the raw records and
+    None. Large workbooks are parsed by up to workers processes.
+    """
+    spec = IMPORT_SPECS[kind]
+    name = name or file.name
+    if workers > 1 and import_format(name) is IMPORT_FORMATS['.xlsx']:
+        return parallel_xlsx_chunks(kind, file, chunk_size, after_row, validate, workers)
+    records = (
+        (row_number, record) for row_number, record in iter_records(read_rows(file, name), spec)
+        if row_number > after_row
+    )
+    return record_chunks(records, spec, chunk_size, validate)
+
+
+def split_sheet_xml(source, rows_per_part, block_size=2**20):
+    """
+    (ordinal of its first row, XML) for every rows_per_part rows of a
+    worksheet's XML stream: standalone worksheets made of the original's
+    opening up to sheetData and that range of row elements. Rows are found
+    by their tags, which cannot occur in cell text as XML escapes its '<'.
+    """
+    buffer = b''
+    match = None
+    while match is None:
+        block = source.read(block_size)
+        if not block:
+            return
+        buffer += block
+        match = SHEET_DATA_TAG.search(buffer)
+    prefix, buffer = buffer[:match.end()], buffer[match.end():]
+    ns, empty = match.groups()
+    if empty:
+        return
+    end_tag = b'</%ssheetData>' % ns
+    suffix = end_tag + b'</%sworksheet>' % ns
+
+    first_row = 1
+    rows = 0
+    scanned = 0  # how far buffer has been searched for row tags
+    ended = False
+    while not ended:
+        block = source.read(block_size)
+        buffer += block
+        end = buffer.find(end_tag, scanned)
+        if end != -1:
+            buffer = buffer[:end]
+        ended = end != -1 or not block
+
+        start = 0
+        for match in ROW_TAG.finditer(buffer, scanned):
+            rows += 1
+            if rows > rows_per_part:
+                yield first_row, prefix + buffer[start:match.start()] + suffix
+                first_row += rows_per_part
+                rows = 1
+                start = match.start()
+            scanned = match.end()
+        buffer = buffer[start:]
+        scanned -= start
+    if rows:
+        yield first_row, prefix + buffer + suffix
+
+
+def parse_xlsx_part(kind, indexes, first_row, xml, after_row, validate):
+    """
+    file_chunks' chunk for one part of a workbook (see split_sheet_xml), or
+    None if all its rows are up to after_row. Runs in the parse workers,
+    with the workbook's parser settings in import_workers.workbook_context.
+    """
+    context = import_workers.workbook_context
+    parser = WorkSheetParser(
+        io.BytesIO(xml), context['shared_strings'], data_only=True, epoch=context['epoch'],
+        date_formats=context['date_formats'], timedelta_formats=context['timedelta_formats'],
+    )
+    # Rows without an r attribute are numbered by position
+    parser.row_counter = first_row - 1
+
+    records = []
+    for row_number, cells in parser.parse():
+        if row_number <= after_row:
+            continue
+        values = {cell['column']: cell['value'] for cell in cells}
+        records.append((row_number, {column: values.get(index + 1) for column, index in indexes.items()}))
+    if not records:
+        return None
+    return frame_chunk(records, IMPORT_SPECS[kind], validate)
+
+
+def parallel_xlsx_chunks(kind, file, chunk_size, after_row, validate, workers):
+    """
+    file_chunks for a workbook. Unless it is small, its first sheet is cut
+    into parts of chunk_size rows that up to workers processes parse and
+    validate, keeping at most two parts per worker in flight. Chunks are
+    yielded in file order.
+
+    The sheet's XML and the parser settings come from openpyxl internals,
+    which is why requirements.txt keeps openpyxl to the minor version the
+    tests (ParallelWorkbookParseTests) were run against.
+    """
+    spec = IMPORT_SPECS[kind]
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        indexes = column_indexes(next(sheet.iter_rows(max_row=1, values_only=True), ()), spec)
+        if workbook._archive.getinfo(sheet._worksheet_path).file_size >= PARALLEL_PARSE_MIN_BYTES:
+            # Read-only workbooks keep the shared strings on their sheets
+            context = {
+                'shared_strings': list(sheet._shared_strings),
+                'epoch': workbook.epoch,
+                'date_formats': workbook._date_formats,
+                'timedelta_formats': workbook._timedelta_formats,
+            }
+            # Spawned rather than forked workers, which would share this
+            # process's database connection
+            pool = ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=import_workers.init_worker, initargs=(context,),
+            )
+            try:
+                with sheet._get_source() as source:
+                    pending = deque()
+                    for first_row, xml in split_sheet_xml(source, chunk_size):
+                        pending.append(pool.submit(parse_xlsx_part, kind, indexes, first_row, xml, after_row, validate))
+                        if len(pending) >= workers * 2:
+                            chunk = pending.popleft().result()
+                            if chunk is not None:
+                                yield chunk
+                    while pending:
+                        chunk = pending.popleft().result()
+                        if chunk is not None:
+                            yield chunk
+            finally:
+                pool.shutdown(cancel_futures=True)
+            return
+    finally:
+        workbook.close()
+
+    file.seek(0)
+    records = (
+        (row_number, record) for row_number, record in iter_records(read_xlsx_rows(file), spec)
+        if row_number > after_row
+    )
+    yield from record_chunks(records, spec, chunk_size, validate)
+
+
+def write_chunks(spec, chunks, mode=ImportJob.MODE_INSERT):
+    """Write validated chunks (see file_chunks) as one transaction and return the import result"""
+    result = new_result()
+    with transaction.atomic():
+        for _, rows, report in drop_repeated_keys(chunks, spec['key']):
+            add_report(report, result)
+            write_rows(spec, rows, result, mode)
+        if result['imported'] or result['updated']:
+            # bulk_create and bulk_update send no post_save, so invalidate the cached lists here
+            transaction.on_commit(lambda: bump_version(spec['model']))
+    return result
+
+
+def import_rows(kind, rows, chunk_size=CHUNK_SIZE, mode=ImportJob.MODE_INSERT):
+    """
+    Import an iterable of row tuples (header row first) into the catalog
+    kind, as one transaction. Returns the counts of imported, updated and
+    unchanged (upsert mode), skipped (already existing or repeated) and
+    invalid rows, plus the first errors.
+    """
+    spec = IMPORT_SPECS[kind]
+    return write_chunks(spec, record_chunks(iter_records(rows, spec), spec, chunk_size), mode)
+
+
+def check_upload(file):
+    """Raise ImportFileError for a file the import engine cannot read"""
+    import_format(file.name)
+
+
+def import_file(kind, file, chunk_size=CHUNK_SIZE, mode=ImportJob.MODE_INSERT, workers=PARSE_WORKERS):
+    """Import an uploaded file into the catalog kind right away; see import_rows"""
+    return write_chunks(IMPORT_SPECS[kind], file_chunks(kind, file, chunk_size=chunk_size, workers=workers), mode)
+
+
+def existing_frame(spec, keys, fields):
+    """Stored values of fields for the rows with keys, one query per CHUNK_SIZE keys; the first row wins for repeated keys"""
+    model, key = spec['model'], spec['key']
+    frames = [
+        pd.DataFrame(list(model.objects.filter(**{f'{key}__in': chunk}).values(key, *fields)), columns=[key, *fields], dtype=object)
+        for chunk in chunked(keys, CHUNK_SIZE)
+    ]
+    if not frames:
+        return pd.DataFrame(columns=[key, *fields], dtype=object)
+    return pd.concat(frames).drop_duplicates(key)
+
+
+def preview_rows(kind, rows, mode=ImportJob.MODE_INSERT, chunk_size=CHUNK_SIZE):
+    """The diff importing an iterable of row tuples (header row first) would apply, as one frame; see preview_chunks"""
+    spec = IMPORT_SPECS[kind]
+    previews = list(preview_chunks(kind, record_chunks(iter_records(rows, spec), spec, chunk_size, validate=False), mode))
+    if not previews:
+        return pd.DataFrame(columns=[*PREVIEW_COLUMNS, *spec['columns']])
+    return pd.concat(previews, ignore_index=True)
+
+
+def preview_file(kind, file, name=None, mode=ImportJob.MODE_INSERT, chunk_size=CHUNK_SIZE, workers=PARSE_WORKERS):
+    """The diff importing an uploaded file would apply, a frame per chunk; see preview_chunks"""
+    chunks = file_chunks(kind, file, name, chunk_size, validate=False, workers=workers)
+    return preview_chunks(kind, chunks, mode)
+
+
+def preview_chunks(kind, chunks, mode=ImportJob.MODE_INSERT):
+    """
+    The diff importing unvalidated chunks (see file_chunks) would apply,
+    without writing anything, as a frame per chunk: one row per data row
+    with its row number, action (one of PREVIEW_ACTIONS), the file's values,
+    the fields an update would change and why a row is rejected. Each chunk
+    is validated and joined against the stored rows with its keys as it is
+    read, so memory stays flat however long the file is; keys repeated from
+    an earlier chunk are found by drop_repeated_keys.
+    """
+    spec = IMPORT_SPECS[kind]
+    key = spec['key']
+
+    validated = ((last_row, *validate_frame(raw, spec)) for last_row, raw, _ in chunks)
+    for _, rows, report in drop_repeated_keys(validated, key):
+        yield preview_chunk(spec, rows, report, mode)
+
+
+def preview_chunk(spec, rows, report, mode):
+    """preview_chunks' frame for one chunk's validated rows and report of rejected rows"""
+    key = spec['key']
+    fields = [column for column in rows.columns if column != key]
+    existing = existing_frame(spec, rows[key].unique().tolist(), fields)
+    diff = rows.reset_index().merge(existing, on=key, how='left', suffixes=('', '_current'), indicator=True)
+    found = diff['_merge'] == 'both'
+
+    # Compare as text so that e.g. 12 and 12.0 or None and '' are the same value
+    differs = pd.DataFrame({
+        field: found & (
+            diff[field].astype('string').fillna('') != diff[f'{field}_current'].astype('string').fillna('')
+        )
+        for field in fields
+    })
+    diff['changed'] = differs.dot(pd.Series([f'{field}, ' for field in fields], index=fields)).str.rstrip(', ') if fields else ''
+    if mode == ImportJob.MODE_UPSERT:
+        diff['action'] = np.select([~found, differs.any(axis=1)], ['new', 'update'], 'unchanged')
+    else:
+        diff['action'] = np.where(found, 'existing', 'new')
+        diff['changed'] = ''
+    diff['message'] = ''
+
+    report = report.rename(columns={'issue': 'action'})
+    preview = pd.concat([diff[[*PREVIEW_COLUMNS, key, *fields]], report], ignore_index=True)
+    preview['changed'] = preview['changed'].fillna('')
+    return preview.sort_values('row', ignore_index=True)
+
+
+def preview_schema(spec, columns):
+    """Arrow schema of a stored preview whose file has the catalog columns columns, the same for every chunk"""
+    import pyarrow as pa
+
+    def column_type(column):
+        if column in spec['integers']:
+            return pa.int64()
+        if column in spec['booleans']:
+            return pa.bool_()
+        return pa.string()
+    return pa.schema([
+        ('row', pa.int64()),
+        *((column, pa.string()) for column in PREVIEW_COLUMNS[1:]),
+        *((column, column_type(column)) for column in columns),
+    ])
+
+
+def write_preview(spec, previews, file):
+    """
+    Write the frames of a preview (see preview_chunks) to a binary file as
+    one Parquet file, a row group per frame, and return its preview_counts
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    counts = dict.fromkeys(PREVIEW_ACTIONS, 0)
+    writer = None
+    try:
+        for preview in previews:
+            if writer is None:
+                schema = preview_schema(spec, list(preview.columns[len(PREVIEW_COLUMNS):]))
+                writer = pq.ParquetWriter(file, schema)
+            # Rejected rows leave the other columns empty, so every frame is cast to the schema's types
+            writer.write_table(pa.Table.from_pandas(preview, schema=schema, preserve_index=False))
+            for action, count in preview_counts(preview).items():
+                counts[action] += count
+        if writer is None:
+            # Header-only file
+            pq.write_table(preview_schema(spec, spec['columns']).empty_table(), file)
+    finally:
+        if writer is not None:
+            writer.close()
+    return counts
+
+
+def preview_batches(file, batch_size=CHUNK_SIZE, columns=None):
+    """The frames of a stored preview (see write_preview), up to batch_size rows each, optionally only some columns"""
+    import pyarrow.parquet as pq
+
+    for batch in pq.ParquetFile(file).iter_batches(batch_size, columns=columns):
+        yield preview_frame(batch)
+
+
+def preview_frame(data):
+    """An Arrow table or batch of a stored preview as a frame"""
+    import pyarrow as pa
+
+    # Keep integer and boolean columns with empty values as such rather than float and object
+    dtypes = {pa.int64(): pd.Int64Dtype(), pa.bool_(): pd.BooleanDtype()}
+    return data.to_pandas(types_mapper=dtypes.get)
+
+
+def preview_counts(preview):
+    """{action: number of previewed rows} for every PREVIEW_ACTIONS entry"""
+    counts = preview['action'].value_counts()
+    return {action: int(counts.get(action, 0)) for action in PREVIEW_ACTIONS}
+
+
+def preview_result(previews):
+    """The import result for the previewed rows that committing does not write, from the frames of a preview"""
+    result = new_result()
+    for preview in previews:
+        result['unchanged'] += int((preview['action'] == 'unchanged').sum())
+        result['skipped'] += int(preview['action'].isin(['existing', 'duplicate']).sum())
+        invalid = preview[preview['action'] == 'invalid']
+        result['invalid'] += len(invalid)
+        result['errors'].extend(
+            f'Row {row_number}: {message}'
+            for row_number, message in invalid[['row', 'message']].head(MAX_REPORTED_ERRORS - len(result['errors'])).itertuples(index=False)
+        )
+    return result
+
+
+def preview_values(preview):
+    """The rows of a preview that committing writes, as a frame of field values indexed by row number"""
+    rows = preview[preview['action'].isin(PREVIEW_WRITTEN)]
+    return rows.set_index('row').drop(columns=[column for column in PREVIEW_COLUMNS if column != 'row'])
+
+
+def create_job(kind, file, user=None, mode=ImportJob.MODE_INSERT, dry_run=False):
+    """Save an upload as a pending ImportJob; the file is only checked, not read"""
+    check_upload(file)
+    return ImportJob.objects.create(
+        kind=kind,
+        mode=mode,
+        dry_run=dry_run,
+        file=file,
+        file_name=file.name,
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+
+
+# ImportJob field holding each entry of an import result
+JOB_RESULT_FIELDS = {
+    'imported': 'imported_count',
+    'updated': 'updated_count',
+    'unchanged': 'unchanged_count',
+    'skipped': 'skipped_count',
+    'invalid': 'invalid_count',
+    'errors': 'errors',
+}
+
+
+def claim_job():
+    """
+    Mark the oldest pending job, or a running job whose worker stopped
+    saving its heartbeat, as running by this worker and return it (None if
+    there is nothing to do). Jobs are locked with SKIP LOCKED, so several
+    workers never claim the same one, and a worker that was only slow stops
+    at its next save (see hold_job).
+    """
+    stale = timezone.now() - STALE_JOB_AFTER
+    with transaction.atomic():
+        job = (
+            ImportJob.objects.select_for_update(skip_locked=True)
+            .filter(
+                models.Q(state=ImportJob.STATE_PENDING)
+                | models.Q(state=ImportJob.STATE_RUNNING, updated_at__lt=stale)
+            )
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.state = ImportJob.STATE_RUNNING
+        job.attempts += 1
+        job.last_error = None
+        job.save(update_fields=['state', 'attempts', 'last_error', 'updated_at'])
+    return job
+
+
+def hold_job(job):
+    """
+    Lock a claimed job's row until the transaction ends, or raise
+    JobTakenOver if another worker has claimed it since. attempts, counted
+    up by every claim, tells the claims apart.
+    """
+    if not ImportJob.objects.select_for_update().filter(pk=job.pk, attempts=job.attempts).exists():
+        raise JobTakenOver(f'Import job #{job.pk} was taken over by another worker')
+
+
+def save_job(job, *fields):
+    """Save fields of a claimed job, and its heartbeat, as long as this worker still holds it (see hold_job)"""
+    with transaction.atomic():
+        hold_job(job)
+        job.save(update_fields=[*fields, 'updated_at'])
+
+
+def with_heartbeat(job, chunks):
+    """chunks, saving the job's heartbeat at least every JOB_HEARTBEAT_INTERVAL while they are read"""
+    beat = timezone.now()
+    try:
+        for chunk in chunks:
+            if timezone.now() - beat >= JOB_HEARTBEAT_INTERVAL:
+                save_job(job)
+                beat = timezone.now()
+            yield chunk
+    finally:
+        chunks.close()
+
+
+def load_preview(job, columns=None):
+    """The stored preview of a dry-run job as one frame, optionally only some columns; see preview_chunks"""
+    import pyarrow.parquet as pq
+
+    with job.preview.open('rb') as file:
+        return preview_frame(pq.read_table(file, columns=columns))
+
+
+def job_chunks(job, spec, chunk_size, workers=PARSE_WORKERS):
+    """(last row number, validated rows, rejected rows report) for each chunk of a job left after its checkpoint"""
+    if job.preview:
+        with job.preview.open('rb') as file:
+            for preview in preview_batches(file, chunk_size):
+                rows = preview_values(preview)
+                rows = rows[rows.index > job.checkpoint_row]
+                if len(rows):
+                    yield rows.index[-1], rows, None
+        return
+
+    # Read from the first row even when resuming, so a key repeated after
+    # the checkpoint is still recognized as a duplicate
+    with job.file.open('rb') as file:
+        # Closed before the file, so the readers can finish with it open
+        # when the job stops early
+        chunks = drop_repeated_keys(file_chunks(job.kind, file, job.file_name, chunk_size, workers=workers), spec['key'])
+        with closing(chunks):
+            for last_row, rows, report in chunks:
+                if last_row <= job.checkpoint_row:
+                    continue
+                yield last_row, rows[rows.index > job.checkpoint_row], report[report['row'] > job.checkpoint_row]
+
+
+def build_job_preview(job, chunk_size=CHUNK_SIZE, workers=PARSE_WORKERS):
+    """Store the diff a dry-run job would apply and wait for it to be committed; see preview_chunks"""
+    with job.file.open('rb') as file, tempfile.TemporaryFile() as preview:
+        chunks = with_heartbeat(job, file_chunks(job.kind, file, job.file_name, chunk_size, validate=False, workers=workers))
+        counts = write_preview(IMPORT_SPECS[job.kind], preview_chunks(job.kind, chunks, job.mode), preview)
+        preview.seek(0)
+        with transaction.atomic():
+            hold_job(job)
+            job.preview.save(f'job-{job.pk}.parquet', File(preview), save=False)
+            job.preview_counts = counts
+            job.state = ImportJob.STATE_PREVIEW
+            job.save(update_fields=['preview', 'preview_counts', 'state', 'updated_at'])
+
+
+def run_job(job, chunk_size=CHUNK_SIZE, workers=PARSE_WORKERS):
+    """
+    Import a claimed job's file from its checkpoint on, or for a dry run
+    store its preview. Each chunk is committed together with the new
+    checkpoint and counts, so whatever is committed is never imported twice
+    and an interrupted job loses at most the chunk in progress. A committed
+    preview is applied as previewed, without reading the file again.
+
+    Every save first checks that no other worker has taken the job over
+    (see hold_job); if one has, this one stops where it is and leaves the
+    job to it.
+    """
+    spec = IMPORT_SPECS[job.kind]
+    try:
+        if job.total_rows is None:
+            with job.file.open('rb') as file:
+                job.total_rows = count_rows(file, job.file_name)
+            save_job(job, 'total_rows')
+
+        if job.dry_run:
+            build_job_preview(job, chunk_size, workers)
+            return job
+
+        for last_row, rows, report in job_chunks(job, spec, chunk_size, workers):
+            with transaction.atomic():
+                hold_job(job)
+                result = {name: getattr(job, field) for name, field in JOB_RESULT_FIELDS.items()}
+                if report is not None:
+                    add_report(report, result)
+                write_rows(spec, rows, result, job.mode)
+                for name, field in JOB_RESULT_FIELDS.items():
+                    setattr(job, field, result[name])
+                job.checkpoint_row = last_row
+                job.save(update_fields=[*JOB_RESULT_FIELDS.values(), 'checkpoint_row', 'updated_at'])
+                # bulk_create and bulk_update send no post_save, so invalidate the cached lists here
+                transaction.on_commit(lambda: bump_version(spec['model']))
+
+        job.state = ImportJob.STATE_DONE
+        job.checkpoint_row = max(job.checkpoint_row, (job.total_rows or 0) + 1)
+        job.finished_at = timezone.now()
+        save_job(job, 'state', 'checkpoint_row', 'finished_at')
+    except JobTakenOver:
+        logger.warning(f"Import job #{job.pk} was taken over by another worker after row {job.checkpoint_row}")
+    except Exception as e:
+        logger.exception(f"Import job #{job.pk} failed after row {job.checkpoint_row}")
+        job.state = ImportJob.STATE_FAILED
+        job.last_error = str(e)
+        try:
+            save_job(job, 'state', 'last_error')
+        except JobTakenOver:
+            pass
+    return job
+
+
+def commit_preview(job):
+    """
+    Queue a previewed job to apply its stored diff. The rows committing does
+    not write (unchanged, existing, duplicate and invalid) are counted now.
+    """
+    if job.state != ImportJob.STATE_PREVIEW:
+        return job
+    with job.preview.open('rb') as file:
+        result = preview_result(preview_batches(file, columns=['row', 'action', 'message']))
+    for name, field in JOB_RESULT_FIELDS.items():
+        setattr(job, field, result[name])
+    job.dry_run = False
+    job.state = ImportJob.STATE_PENDING
+    job.save(update_fields=[*JOB_RESULT_FIELDS.values(), 'dry_run', 'state', 'updated_at'])
+    return job
+
+
+def resume_job(job):
+    """Queue a failed job again; it continues after its checkpoint"""
+    if job.state == ImportJob.STATE_FAILED:
+        job.state = ImportJob.STATE_PENDING
+        job.save(update_fields=['state', 'updated_at'])
+    return job
+
+
+def process_next_job(chunk_size=CHUNK_SIZE, workers=PARSE_WORKERS):
+    """Claim and run one job; returns it, or None if there was none"""
+    job = claim_job()
+    if job is not None:
+        run_job(job, chunk_size, workers)
+    return job
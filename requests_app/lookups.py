@@ -0,0 +1,88 @@
+"""
+Fuzzy lookups over reference data (antibodies, probes, studies, requestors, tissues)
+"""
+from functools import reduce
+from operator import or_
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db.models import Case, Q, Value, When
+from django.db.models.functions import Greatest
+from .models import Antibody, Probe, Study, Requestor, Tissue
+
+# Fields matched for each model. Every field except Tissue.name has a
+# gin_trgm_ops index, so matching is an index scan however large the catalog
+# gets; the tissue list is small enough to scan.
+LOOKUP_FIELDS = {
+    Antibody: ['name'],
+    Probe: ['name', 'target_gene'],
+    Study: ['study_id', 'title'],
+    Requestor: ['name'],
+    Tissue: ['name'],
+}
+
+# Models served by the autocomplete endpoint, keyed by the name used in its URL
+AUTOCOMPLETE_MODELS = {model._meta.model_name: model for model in LOOKUP_FIELDS}
+
+DEFAULT_LOOKUP_LIMIT = 20
+MAX_LOOKUP_LIMIT = 100
+
+# Shorter input has too few trigrams to match fuzzily, so it is only
+# matched as a prefix
+MIN_FUZZY_LENGTH = 3
+
+
+def has_archived_field(model):
+    return any(field.name == 'archived' for field in model._meta.get_fields())
+
+
+def fuzzy_lookup(model, text, limit=DEFAULT_LOOKUP_LIMIT, include_archived=False, queryset=None):
+    """
+    Return rows of model whose lookup fields resemble text, most similar first.
+
+    Uses pg_trgm word similarity, so misspellings and partial words match
+    ('vimentn' finds 'Vimentin'). Archived rows are left out unless
+    include_archived is set. Pass limit=None for an unsliced queryset.
+    """
+    fields = LOOKUP_FIELDS[model]
+    if queryset is None:
+        queryset = model.objects.all()
+
+    text = (text or '').strip()
+    if not text:
+        return queryset.none()
+
+    if not include_archived and has_archived_field(model):
+        queryset = queryset.filter(archived=False)
+
+    match = reduce(or_, (Q(**{f'{field}__trigram_word_similar': text}) for field in fields))
+    similarities = [TrigramWordSimilarity(text, field) for field in fields]
+    similarity = similarities[0] if len(similarities) == 1 else Greatest(*similarities)
+
+    queryset = queryset.filter(match).annotate(similarity=similarity).order_by('-similarity', fields[0])
+    if limit is not None:
+        queryset = queryset[:limit]
+    return queryset
+
+
+def autocomplete_lookup(model, text, limit=DEFAULT_LOOKUP_LIMIT, include_archived=False):
+    """
+    Matches for a typeahead: rows whose lookup fields start with text come
+    first, then the remaining fuzzy matches by similarity. With no text, the
+    first rows in name order, so an empty picker still has something to show.
+    """
+    fields = LOOKUP_FIELDS[model]
+    queryset = model.objects.all()
+    if not include_archived and has_archived_field(model):
+        queryset = queryset.filter(archived=False)
+
+    text = (text or '').strip()
+    if not text:
+        return queryset.order_by(fields[0])[:limit]
+
+    prefix = reduce(or_, (Q(**{f'{field}__istartswith': text}) for field in fields))
+    if len(text) < MIN_FUZZY_LENGTH:
+        return queryset.filter(prefix).order_by(fields[0])[:limit]
+
+    return fuzzy_lookup(model, text, limit=None, include_archived=include_archived, queryset=queryset).alias(
+        prefix_match=Case(When(prefix, then=Value(True)), default=Value(False))
+    ).order_by('-prefix_match', '-similarity', fields[0])[:limit]
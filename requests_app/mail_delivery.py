@@ -0,0 +1,115 @@
+"""
+Batched email delivery over one reused SMTP connection
+"""
+import smtplib
+import time
+
+from django.core.mail import get_connection
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean the connection itself is broken, as opposed to the server
+# rejecting one message; after these the connection is reopened and the
+# message tried again
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError)
+
+# Errors that mean the server cannot be used at all, including failing to
+# open the connection (unknown host, refused login, TLS failure); every
+# message left in the batch fails with the same error
+UNREACHABLE_ERRORS = (OSError, smtplib.SMTPException)
+
+
+class BatchMailer:
+    """
+    Sends groups of messages over a single connection instead of opening
+    (and TLS-negotiating) a new one per message the way send_mail does.
+
+    The connection is opened on first use and kept until close(). If the
+    server drops it, it is reopened once and the message retried. Timing of
+    the most recent batch is kept in last_batch.
+    """
+
+    def __init__(self, connection=None):
+        self.connection = connection or get_connection(fail_silently=False)
+        self.is_open = False
+        self.last_batch = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def open(self):
+        if not self.is_open:
+            self.connection.open()
+            self.is_open = True
+
+    def close(self):
+        if self.is_open:
+            self.is_open = False
+            try:
+                self.connection.close()
+            except Exception as e:
+                logger.warning(f"Error closing mail connection: {str(e)}")
+
+    def reconnect(self):
+        self.close()
+        self.open()
+
+    def send_batch(self, messages):
+        """
+        Send messages in order. Returns one entry per message: None if it was
+        sent, otherwise the exception that stopped it.
+        """
+        start = time.monotonic()
+        results = []
+        down = None
+        for message in messages:
+            if down is not None:
+                # The server could not be reached; don't wait on it again for every message
+                results.append(down)
+                continue
+            try:
+                results.append(self.send(message))
+            except UNREACHABLE_ERRORS as e:
+                logger.error(f"Mail server unavailable: {str(e)}")
+                down = e
+                results.append(e)
+
+        elapsed = time.monotonic() - start
+        sent = sum(1 for error in results if error is None)
+        self.last_batch = {
+            'messages': len(results),
+            'sent': sent,
+            'failed': len(results) - sent,
+            'seconds': elapsed,
+        }
+        if results:
+            logger.info(f"Sent {sent} of {len(results)} email(s) in {elapsed:.3f}s")
+        return results
+
+    def send(self, message):
+        """
+        Send one message, reconnecting once if the connection has dropped.
+        Returns None if it was sent or the exception if the server rejected
+        it; raises one of UNREACHABLE_ERRORS if the server cannot be reached.
+        """
+        try:
+            self.open()
+            return self._send(message)
+        except CONNECTION_ERRORS as e:
+            logger.warning(f"Mail connection lost ({str(e)}), reconnecting")
+        self.reconnect()
+        return self._send(message)
+
+    def _send(self, message):
+        message.connection = self.connection
+        try:
+            message.send(fail_silently=False)
+        except CONNECTION_ERRORS:
+            raise
+        except Exception as e:
+            return e
+        return None
@@ -0,0 +1,79 @@
+"""
+Measure email throughput with a new SMTP connection per message (what
+send_mail does) against one reused connection (BatchMailer).
+
+Run it against a local SMTP sink rather than a real mail server, e.g.
+
+    python -m aiosmtpd -n -l localhost:8025
+    python manage.py benchmark_email_delivery --port 8025
+"""
+import time
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.management.base import BaseCommand, CommandError
+
+from requests_app.mail_delivery import BatchMailer
+
+
+class Command(BaseCommand):
+    help = 'Compare messages per second for per-message SMTP connections and one pooled connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='localhost', help='SMTP host to send to')
+        parser.add_argument('--port', type=int, default=8025, help='SMTP port to send to')
+        parser.add_argument('--use-tls', action='store_true', help='Use STARTTLS, as the production settings do')
+        parser.add_argument('--messages', type=int, default=50, help='Messages sent in each mode')
+
+    def get_connection(self, options):
+        return get_connection(
+            'django.core.mail.backends.smtp.EmailBackend',
+            host=options['host'],
+            port=options['port'],
+            username='',
+            password='',
+            use_tls=options['use_tls'],
+            fail_silently=False,
+        )
+
+    def build_messages(self, count):
+        messages = []
+        for number in range(count):
+            message = EmailMultiAlternatives(
+                subject=f'Benchmark message {number}',
+                body='Plain text body',
+                from_email='benchmark@example.com',
+                to=['recipient@example.com'],
+            )
+            message.attach_alternative('<p>HTML body</p>', 'text/html')
+            messages.append(message)
+        return messages
+
+    def report(self, label, count, elapsed):
+        rate = count / elapsed if elapsed else float('inf')
+        self.stdout.write(f'{label:<26} {count} messages in {elapsed:.3f}s ({rate:.1f} msg/s)')
+        return rate
+
+    def handle(self, *args, **options):
+        count = options['messages']
+        # Built up front so that both timings cover only opening connections and sending
+        messages = self.build_messages(count)
+
+        start = time.monotonic()
+        try:
+            for message in messages:
+                # Like send_mail: a fresh connection is opened and closed for every message
+                self.get_connection(options).send_messages([message])
+        except OSError as e:
+            raise CommandError(f"Cannot send to {options['host']}:{options['port']}: {str(e)}")
+        per_message = self.report('Connection per message', count, time.monotonic() - start)
+
+        start = time.monotonic()
+        with BatchMailer(self.get_connection(options)) as mailer:
+            errors = mailer.send_batch(messages)
+        elapsed = time.monotonic() - start
+        failed = [error for error in errors if error is not None]
+        if failed:
+            raise CommandError(f'{len(failed)} message(s) failed over the pooled connection: {failed[0]}')
+        pooled = self.report('Pooled connection', count, elapsed)
+
+        self.stdout.write(self.style.SUCCESS(f'Pooled connection is {pooled / per_message:.1f}x faster'))
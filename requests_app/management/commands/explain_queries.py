@@ -0,0 +1,86 @@
+"""
+Run EXPLAIN on the querysets behind the request list and search views and
+report sequential scans, so missing or unused indexes show up early.
+"""
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+
+from requests_app import views
+from requests_app.models import Status
+
+SEQ_SCAN_RE = re.compile(r'Seq Scan on (\w+)')
+
+
+def get_view_cases():
+    """(label, view class, GET params) for every list and search view worth checking"""
+    status_name = Status.objects.exclude(status='Complete').values_list('status', flat=True).first() or 'Submitted'
+    date_range = {'date_from': '2000-01-01', 'date_to': '2100-01-01'}
+    filtered = dict(date_range, status=status_name)
+    return [
+        ('staining list', views.StainingRequestsView, filtered),
+        ('staining current', views.StainingRequestsCurrentView, date_range),
+        ('staining search', views.StainingRequestSearchView, dict(date_range, special_request='stain')),
+        ('staining delete', views.StainingRequestsDeleteView, {}),
+        ('request search', views.RequestSearchView, dict(date_range, notes='stain')),
+        ('embedding list', views.EmbeddingRequestsView, filtered),
+        ('embedding current', views.EmbeddingRequestsCurrentView, date_range),
+        ('embedding search', views.EmbeddingRequestSearchView, dict(date_range, currently_in='etoh')),
+        ('embedding delete', views.EmbeddingRequestsDeleteView, {}),
+        ('sectioning list', views.SectioningRequestsView, filtered),
+        ('sectioning current', views.SectioningRequestsCurrentView, date_range),
+        ('sectioning search', views.SectioningRequestSearchView, dict(date_range, other='ihc')),
+        ('sectioning delete', views.SectioningRequestsDeleteView, {}),
+        ('antibody list', views.AntibodyListView, {}),
+        ('probe list', views.ProbeListView, {}),
+        ('study list', views.StudyListView, {}),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the list and search view querysets and report sequential scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--analyze', action='store_true', help='Use EXPLAIN ANALYZE (executes the queries)')
+        parser.add_argument('--force-index', action='store_true',
+                            help='Disable seq scans in the planner so any remaining ones mean no usable index exists. '
+                                 'Useful on small development databases where seq scans are always cheapest.')
+        parser.add_argument('--show-plans', action='store_true', help='Print the full plan for every query')
+        parser.add_argument('--fail-on-seq-scan', action='store_true', help='Exit with an error if any seq scan is found')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('explain_queries requires PostgreSQL')
+
+        factory = RequestFactory()
+        offenders = []
+
+        for label, view_class, params in get_view_cases():
+            view = view_class()
+            view.setup(factory.get('/', params))
+            queryset = view.get_queryset()
+            page_size = getattr(view, 'paginate_by', None)
+            if page_size:
+                queryset = queryset[:page_size]
+
+            with transaction.atomic():
+                if options['force_index']:
+                    with connection.cursor() as cursor:
+                        cursor.execute('SET LOCAL enable_seqscan = off')
+                plan = queryset.explain(analyze=options['analyze'])
+
+            tables = sorted(set(SEQ_SCAN_RE.findall(plan)))
+            if tables:
+                offenders.append(label)
+                self.stdout.write(self.style.WARNING(f'{label}: seq scan on {", ".join(tables)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{label}: OK'))
+
+            if options['show_plans']:
+                self.stdout.write(plan)
+                self.stdout.write('')
+
+        if offenders and options['fail_on_seq_scan']:
+            raise CommandError(f'Sequential scans found in: {", ".join(offenders)}')
@@ -0,0 +1,66 @@
+"""
+Import a catalog file from the command line in one pass, e.g. for a
+nightly vendor catalog sync:
+
+    manage.py import_catalog probes probes.parquet --mode upsert
+
+Unlike the import pages it runs the import directly, as one transaction,
+instead of queueing a job.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from requests_app.imports import (
+    CHUNK_SIZE, IMPORT_SPECS, PARSE_WORKERS, PREVIEW_ACTIONS, ImportFileError, import_file, preview_counts, preview_file,
+)
+from requests_app.models import ImportJob
+
+
+class Command(BaseCommand):
+    help = 'Import studies, antibodies or probes from an .xlsx, .csv, .tsv or .parquet file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(IMPORT_SPECS))
+        parser.add_argument('path')
+        parser.add_argument('--mode', choices=[value for value, _ in ImportJob.MODE_CHOICES], default=ImportJob.MODE_INSERT,
+                            help='insert skips rows whose key exists; upsert updates them')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Rows validated and written per chunk')
+        parser.add_argument('--workers', type=int, default=PARSE_WORKERS,
+                            help='Processes parsing a large .xlsx file; 1 parses it in this process')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what the import would change')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            return self.preview(options)
+        try:
+            with open(options['path'], 'rb') as file:
+                result = import_file(
+                    options['kind'], file, options['chunk_size'], options['mode'], options['workers'],
+                )
+        except (OSError, ImportFileError) as e:
+            raise CommandError(str(e))
+
+        for error in result['errors']:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['imported']}, updated {result['updated']}, unchanged {result['unchanged']}, "
+            f"skipped {result['skipped']}, invalid {result['invalid']} {options['kind']}"
+        ))
+
+    def preview(self, options):
+        counts = dict.fromkeys(PREVIEW_ACTIONS, 0)
+        try:
+            with open(options['path'], 'rb') as file:
+                for preview in preview_file(
+                    options['kind'], file, mode=options['mode'], chunk_size=options['chunk_size'],
+                    workers=options['workers'],
+                ):
+                    for row_number, message in preview.loc[preview['action'] == 'invalid', ['row', 'message']].itertuples(index=False):
+                        self.stderr.write(f'Row {row_number}: {message}')
+                    for action, count in preview_counts(preview).items():
+                        counts[action] += count
+        except (OSError, ImportFileError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(', '.join(f'{action} {count}' for action, count in counts.items() if count) or 'No rows')
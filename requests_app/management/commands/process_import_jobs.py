@@ -0,0 +1,45 @@
+"""
+Import the catalog files queued as ImportJob rows by the import pages.
+
+Run it from cron to work through the queue, or with --loop as a
+long-running worker. Several workers can run at once; each claims its own
+job, and a job left running by a worker that died is resumed from its
+checkpoint.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from requests_app.imports import CHUNK_SIZE, PARSE_WORKERS, process_next_job
+
+
+class Command(BaseCommand):
+    help = 'Process queued catalog import jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Rows imported and committed per transaction')
+        parser.add_argument('--workers', type=int, default=PARSE_WORKERS,
+                            help='Processes parsing a large .xlsx file; 1 parses it in this process')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for new jobs instead of exiting once the queue is empty')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep between polls when the queue is empty (with --loop)')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            job = process_next_job(options['chunk_size'], options['workers'])
+            if job is not None:
+                total += 1
+                if options['verbosity'] >= 2:
+                    self.stdout.write(
+                        f"Job #{job.pk} ({job.file_name}): {job.state}, imported {job.imported_count}, "
+                        f"skipped {job.skipped_count}, invalid {job.invalid_count}"
+                    )
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} import job(s)'))
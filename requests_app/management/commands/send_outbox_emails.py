@@ -0,0 +1,49 @@
+"""
+Deliver the notification emails queued in the EmailOutbox table.
+
+Run it from cron to drain the outbox, or with --loop as a long-running
+worker. Several workers can run at once; each claims its own rows.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from requests_app.mail_delivery import BatchMailer
+from requests_app.outbox import DEFAULT_BATCH_SIZE, DEFAULT_MAX_ATTEMPTS, process_batch
+
+
+class Command(BaseCommand):
+    help = 'Send pending notification emails from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Rows claimed per transaction')
+        parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                            help='Failed tries before a row is marked failed')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for new rows instead of exiting once the outbox is drained')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep between polls when the outbox is empty (with --loop)')
+
+    def handle(self, *args, **options):
+        total = 0
+        # One SMTP connection for the whole run, reopened if the server drops it
+        with BatchMailer() as mailer:
+            while True:
+                processed = process_batch(options['batch_size'], options['max_attempts'], mailer)
+                total += processed
+                if processed:
+                    if options['verbosity'] >= 2 and mailer.last_batch['messages']:
+                        batch = mailer.last_batch
+                        self.stdout.write(
+                            f"Batch of {processed}: sent {batch['sent']}, failed {batch['failed']} "
+                            f"in {batch['seconds']:.3f}s"
+                        )
+                    continue
+                if not options['loop']:
+                    break
+                # Don't hold an idle connection open between polls
+                mailer.close()
+                time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} outbox email(s)'))
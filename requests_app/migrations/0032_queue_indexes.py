@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requests_app', '0031_change_currently_in_to_text'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='antibody',
+            index=models.Index(condition=models.Q(('archived', False)), fields=['name'], name='antibody_active_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='embeddingrequest',
+            index=models.Index(fields=['status', '-created_at'], name='emb_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='embeddingrequest',
+            index=models.Index(fields=['status', '-status_timestamp'], name='emb_status_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='embeddingrequest',
+            index=models.Index(fields=['-created_at', '-key'], name='emb_created_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='embeddingrequest',
+            index=models.Index(fields=['-status_timestamp', '-key'], name='emb_ts_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='probe',
+            index=models.Index(condition=models.Q(('archived', False)), fields=['name'], name='probe_active_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['status', '-created_at'], name='req_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['status', '-status_timestamp'], name='req_status_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['-created_at', '-key'], name='req_created_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['-status_timestamp', '-key'], name='req_ts_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sectioningrequest',
+            index=models.Index(fields=['status', '-created_at'], name='sec_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sectioningrequest',
+            index=models.Index(fields=['status', '-status_timestamp'], name='sec_status_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sectioningrequest',
+            index=models.Index(fields=['-created_at', '-key'], name='sec_created_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sectioningrequest',
+            index=models.Index(fields=['-status_timestamp', '-key'], name='sec_ts_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='study',
+            index=models.Index(condition=models.Q(('archived', False)), fields=['study_id'], name='study_active_id_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:04
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requests_app', '0032_queue_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='embeddingrequest',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('special_request', config='english', weight='A'), '||', django.contrib.postgres.search.SearchVector('currently_in', config='english', weight='B'), django.contrib.postgres.search.SearchConfig('english')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('description', config='english', weight='A'), '||', django.contrib.postgres.search.SearchVector('special_request', config='english', weight='B'), django.contrib.postgres.search.SearchConfig('english')), '||', django.contrib.postgres.search.SearchVector('notes', config='english', weight='C'), django.contrib.postgres.search.SearchConfig('english')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddField(
+            model_name='sectioningrequest',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('special_request', config='english', weight='A'), '||', django.contrib.postgres.search.SearchVector('other', config='english', weight='B'), django.contrib.postgres.search.SearchConfig('english')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='embeddingrequest',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='emb_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='req_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sectioningrequest',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='sec_search_vector_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:06
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requests_app', '0033_request_search_vectors'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='antibody',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='antibody_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='probe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='probe_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='probe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['target_gene'], name='probe_target_gene_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='requestor',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='requestor_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='study',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['study_id'], name='study_id_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='study',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='study_title_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:11
+
+import django.db.models.deletion
+import requests_app.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requests_app', '0034_trigram_name_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='embeddingrequest',
+            name='status',
+            field=models.ForeignKey(default=requests_app.models.Status.get_default_status_id, on_delete=django.db.models.deletion.CASCADE, to='requests_app.status'),
+        ),
+        migrations.AlterField(
+            model_name='request',
+            name='priority',
+            field=models.ForeignKey(default=requests_app.models.Priority.get_default_priority_id, on_delete=django.db.models.deletion.CASCADE, to='requests_app.priority'),
+        ),
+        migrations.AlterField(
+            model_name='request',
+            name='status',
+            field=models.ForeignKey(default=requests_app.models.Status.get_default_status_id, on_delete=django.db.models.deletion.CASCADE, to='requests_app.status'),
+        ),
+        migrations.AlterField(
+            model_name='sectioningrequest',
+            name='status',
+            field=models.ForeignKey(default=requests_app.models.Status.get_default_status_id, on_delete=django.db.models.deletion.CASCADE, to='requests_app.status'),
+        ),
+    ]
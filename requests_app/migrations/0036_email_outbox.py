@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:13
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requests_app', '0035_status_priority_default_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.CharField(choices=[('created', 'Request Created'), ('status_changed', 'Status Changed')], max_length=20)),
+                ('request_type', models.CharField(choices=[('staining', 'Staining Request'), ('embedding', 'Embedding Request'), ('sectioning', 'Sectioning Request')], max_length=20)),
+                ('request_id', models.IntegerField()),
+                ('old_status_id', models.IntegerField(blank=True, null=True)),
+                ('new_status_id', models.IntegerField(blank=True, null=True)),
+                ('state', models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('skipped', 'Skipped'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Outbox Email',
+                'verbose_name_plural': 'Outbox Emails',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(condition=models.Q(('state', 'pending')), fields=['next_attempt_at', 'id'], name='outbox_pending_due_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requests_app', '0036_email_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationDigestSettings',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('request_type', models.CharField(choices=[('staining', 'Staining Request'), ('embedding', 'Embedding Request'), ('sectioning', 'Sectioning Request')], help_text='Type of request these digest settings apply to', max_length=20, unique=True)),
+                ('digest_enabled', models.BooleanField(default=False, help_text='Send one summary email per recipient per window instead of one email per change')),
+                ('window_minutes', models.PositiveIntegerField(default=15, help_text='How long notifications are collected before the summary is sent')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Notification Digest Setting',
+                'verbose_name_plural': 'Notification Digest Settings',
+                'ordering': ['request_type'],
+            },
+        ),
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='digest',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='recipient',
+            field=models.EmailField(blank=True, max_length=254, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='emailoutbox',
+            index=models.Index(condition=models.Q(('digest', True), ('state', 'pending')), fields=['recipient', 'next_attempt_at'], name='outbox_pending_digest_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requests_app', '0037_notification_digests'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='embeddingrequestchangelog',
+            name='snapshot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='requests_app.embeddingrequestchangelog'),
+        ),
+        migrations.AddField(
+            model_name='embeddingrequestchangelog',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='sectioningrequestchangelog',
+            name='snapshot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='requests_app.sectioningrequestchangelog'),
+        ),
+        migrations.AddField(
+            model_name='sectioningrequestchangelog',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='stainingrequestchangelog',
+            name='snapshot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='requests_app.stainingrequestchangelog'),
+        ),
+        migrations.AddField(
+            model_name='stainingrequestchangelog',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
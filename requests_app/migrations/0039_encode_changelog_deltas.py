@@ -0,0 +1,102 @@
+from django.db import migrations
+
+# Matches CHANGE_LOG_SNAPSHOT_INTERVAL at the time of this migration
+SNAPSHOT_INTERVAL = 10
+
+BATCH_SIZE = 500
+
+# Logged fields per change log model; related fields were stored as primary keys
+LOGGED_FIELDS = {
+    'StainingRequestChangeLog': [
+        'requestor', 'study', 'tissue', 'antibody', 'probe', 'status', 'assigned_to', 'priority',
+        'special_request', 'notes',
+    ],
+    'EmbeddingRequestChangeLog': [
+        'requestor', 'study', 'tissues', 'status', 'assigned_to', 'special_request', 'number_of_animals',
+        'take_down_date', 'currently_in', 'date_of_xylene_etoh_change', 'length_of_time_in_etoh',
+    ],
+    'SectioningRequestChangeLog': [
+        'requestor', 'study', 'tissues', 'status', 'assigned_to', 'special_request', 'cut_surface_down',
+        'sections_per_slide', 'slides_per_block', 'other', 'for_what',
+    ],
+}
+
+
+def state_from_columns(log, fields):
+    """Rebuild the data dict of a log written before data was stored, from its copied columns"""
+    state = {}
+    for name in fields:
+        if name == 'tissues':
+            state[name] = sorted(tissue.pk for tissue in log.tissues.all())
+            continue
+        field = log._meta.get_field(name)
+        value = getattr(log, field.attname)
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        state[name] = value
+    return state
+
+
+def encode_deltas(apps, schema_editor):
+    """Number each request's logs and keep a full snapshot only every SNAPSHOT_INTERVAL versions"""
+    for model_name, fields in LOGGED_FIELDS.items():
+        ChangeLog = apps.get_model('requests_app', model_name)
+        logs = ChangeLog.objects.order_by('request_id', 'changed_at', 'id')
+        if 'tissues' in fields:
+            logs = logs.prefetch_related('tissues')
+
+        pending = []
+        request_id = None
+        for log in logs.iterator(chunk_size=BATCH_SIZE):
+            state = log.data if log.data else state_from_columns(log, fields)
+            if 'tissues' in state:
+                state['tissues'] = sorted(state['tissues'] or [])
+
+            if log.request_id != request_id:
+                request_id = log.request_id
+                version = 0
+                snapshot = None
+            version += 1
+
+            log.version = version
+            if snapshot is None or version - snapshot.version >= SNAPSHOT_INTERVAL:
+                snapshot = log
+                snapshot_state = state
+                log.snapshot = None
+                log.data = state
+            else:
+                log.snapshot = snapshot
+                log.data = {
+                    name: value for name, value in state.items()
+                    if name not in snapshot_state or snapshot_state[name] != value
+                }
+
+            pending.append(log)
+            if len(pending) >= BATCH_SIZE:
+                ChangeLog.objects.bulk_update(pending, ['version', 'snapshot', 'data'])
+                pending = []
+        ChangeLog.objects.bulk_update(pending, ['version', 'snapshot', 'data'])
+
+
+def decode_deltas(apps, schema_editor):
+    """Turn every log back into a full snapshot"""
+    for model_name in LOGGED_FIELDS:
+        ChangeLog = apps.get_model('requests_app', model_name)
+        pending = []
+        for log in ChangeLog.objects.filter(snapshot__isnull=False).select_related('snapshot').iterator(chunk_size=BATCH_SIZE):
+            log.data = {**(log.snapshot.data or {}), **(log.data or {})}
+            log.snapshot = None
+            pending.append(log)
+            if len(pending) >= BATCH_SIZE:
+                ChangeLog.objects.bulk_update(pending, ['snapshot', 'data'])
+                pending = []
+        ChangeLog.objects.bulk_update(pending, ['snapshot', 'data'])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('requests_app', '0038_changelog_versions'),
+    ]
+    operations = [
+        migrations.RunPython(encode_deltas, reverse_code=decode_deltas),
+    ]
@@ -0,0 +1,153 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requests_app', '0039_encode_changelog_deltas'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='embeddingrequestchangelog',
+            name='assigned_to',
+        ),
+        migrations.RemoveField(
+            model_name='embeddingrequestchangelog',
+            name='currently_in',
+        ),
+        migrations.RemoveField(
+            model_name='embeddingrequestchangelog',
+            name='date_of_xylene_etoh_change',
+        ),
+        migrations.RemoveField(
+            model_name='embeddingrequestchangelog',
+            name='length_of_time_in_etoh',
+        ),
+        migrations.RemoveField(
+            model_name='embeddingrequestchangelog',
+            name='number_of_animals',
+        ),
+        migrations.RemoveField(
+            model_name='embeddingrequestchangelog',
+            name='requestor',
+        ),
+        migrations.RemoveField(
+            model_name='embeddingrequestchangelog',
+            name='special_request',
+        ),
+        migrations.RemoveField(
+            model_name='embeddingrequestchangelog',
+            name='status',
+        ),
+        migrations.RemoveField(
+            model_name='embeddingrequestchangelog',
+            name='study',
+        ),
+        migrations.RemoveField(
+            model_name='embeddingrequestchangelog',
+            name='take_down_date',
+        ),
+        migrations.RemoveField(
+            model_name='embeddingrequestchangelog',
+            name='tissues',
+        ),
+        migrations.RemoveField(
+            model_name='sectioningrequestchangelog',
+            name='assigned_to',
+        ),
+        migrations.RemoveField(
+            model_name='sectioningrequestchangelog',
+            name='cut_surface_down',
+        ),
+        migrations.RemoveField(
+            model_name='sectioningrequestchangelog',
+            name='for_what',
+        ),
+        migrations.RemoveField(
+            model_name='sectioningrequestchangelog',
+            name='other',
+        ),
+        migrations.RemoveField(
+            model_name='sectioningrequestchangelog',
+            name='requestor',
+        ),
+        migrations.RemoveField(
+            model_name='sectioningrequestchangelog',
+            name='sections_per_slide',
+        ),
+        migrations.RemoveField(
+            model_name='sectioningrequestchangelog',
+            name='slides_per_block',
+        ),
+        migrations.RemoveField(
+            model_name='sectioningrequestchangelog',
+            name='special_request',
+        ),
+        migrations.RemoveField(
+            model_name='sectioningrequestchangelog',
+            name='status',
+        ),
+        migrations.RemoveField(
+            model_name='sectioningrequestchangelog',
+            name='study',
+        ),
+        migrations.RemoveField(
+            model_name='sectioningrequestchangelog',
+            name='tissues',
+        ),
+        migrations.RemoveField(
+            model_name='stainingrequestchangelog',
+            name='antibody',
+        ),
+        migrations.RemoveField(
+            model_name='stainingrequestchangelog',
+            name='assigned_to',
+        ),
+        migrations.RemoveField(
+            model_name='stainingrequestchangelog',
+            name='notes',
+        ),
+        migrations.RemoveField(
+            model_name='stainingrequestchangelog',
+            name='priority',
+        ),
+        migrations.RemoveField(
+            model_name='stainingrequestchangelog',
+            name='probe',
+        ),
+        migrations.RemoveField(
+            model_name='stainingrequestchangelog',
+            name='requestor',
+        ),
+        migrations.RemoveField(
+            model_name='stainingrequestchangelog',
+            name='special_request',
+        ),
+        migrations.RemoveField(
+            model_name='stainingrequestchangelog',
+            name='status',
+        ),
+        migrations.RemoveField(
+            model_name='stainingrequestchangelog',
+            name='study',
+        ),
+        migrations.RemoveField(
+            model_name='stainingrequestchangelog',
+            name='tissue',
+        ),
+        migrations.AddConstraint(
+            model_name='embeddingrequestchangelog',
+            constraint=models.UniqueConstraint(fields=('request', 'version'), name='embedding_changelog_version_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='sectioningrequestchangelog',
+            constraint=models.UniqueConstraint(fields=('request', 'version'), name='sectioning_changelog_version_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='stainingrequestchangelog',
+            constraint=models.UniqueConstraint(fields=('request', 'version'), name='staining_changelog_version_uniq'),
+        ),
+    ]
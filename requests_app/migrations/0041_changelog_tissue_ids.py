@@ -0,0 +1,66 @@
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+MODEL_NAMES = ['EmbeddingRequestChangeLog', 'SectioningRequestChangeLog']
+
+
+def move_tissues_to_column(apps, schema_editor):
+    """Store every version's full tissue list in tissue_ids and drop it from data"""
+    for model_name in MODEL_NAMES:
+        ChangeLog = apps.get_model('requests_app', model_name)
+        pending = []
+        for log in ChangeLog.objects.select_related('snapshot').iterator(chunk_size=BATCH_SIZE):
+            state = dict(log.snapshot.data or {}) if log.snapshot_id else {}
+            state.update(log.data or {})
+            log.tissue_ids = sorted(state.get('tissues') or [])
+            pending.append(log)
+            if len(pending) >= BATCH_SIZE:
+                ChangeLog.objects.bulk_update(pending, ['tissue_ids'])
+                pending = []
+        ChangeLog.objects.bulk_update(pending, ['tissue_ids'])
+
+        # Only now, as deltas above still needed their snapshot's tissues
+        pending = []
+        for log in ChangeLog.objects.filter(data__has_key='tissues').iterator(chunk_size=BATCH_SIZE):
+            del log.data['tissues']
+            pending.append(log)
+            if len(pending) >= BATCH_SIZE:
+                ChangeLog.objects.bulk_update(pending, ['data'])
+                pending = []
+        ChangeLog.objects.bulk_update(pending, ['data'])
+
+
+def move_tissues_to_data(apps, schema_editor):
+    """Put tissues back into snapshots, and into deltas whose tissues differ from their snapshot's"""
+    for model_name in MODEL_NAMES:
+        ChangeLog = apps.get_model('requests_app', model_name)
+        pending = []
+        for log in ChangeLog.objects.select_related('snapshot').iterator(chunk_size=BATCH_SIZE):
+            if log.snapshot_id is None or log.tissue_ids != log.snapshot.tissue_ids:
+                log.data = {**(log.data or {}), 'tissues': list(log.tissue_ids)}
+                pending.append(log)
+            if len(pending) >= BATCH_SIZE:
+                ChangeLog.objects.bulk_update(pending, ['data'])
+                pending = []
+        ChangeLog.objects.bulk_update(pending, ['data'])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('requests_app', '0040_remove_changelog_columns'),
+    ]
+    operations = [
+        migrations.AddField(
+            model_name='embeddingrequestchangelog',
+            name='tissue_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None),
+        ),
+        migrations.AddField(
+            model_name='sectioningrequestchangelog',
+            name='tissue_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None),
+        ),
+        migrations.RunPython(move_tissues_to_column, reverse_code=move_tissues_to_data),
+    ]
@@ -0,0 +1,53 @@
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requests_app', '0041_changelog_tissue_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('request_type', models.CharField(choices=[('staining', 'Staining Request'), ('embedding', 'Embedding Request'), ('sectioning', 'Sectioning Request')], max_length=20)),
+                ('request_id', models.IntegerField()),
+                ('change_type', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted')], max_length=20)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('description', models.CharField(blank=True, max_length=256, null=True)),
+                ('changed_fields', models.JSONField(blank=True, default=list)),
+                ('change_summary', models.TextField(blank=True, null=True)),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('tissue_ids', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None)),
+                ('snapshot', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='requests_app.requestchangelog')),
+            ],
+            options={
+                'verbose_name': 'Request Change Log',
+                'verbose_name_plural': 'Request Change Logs',
+                'ordering': ['-changed_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='requestchangelog',
+            index=models.Index(fields=['request_type', 'request_id', 'changed_at'], name='changelog_request_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='requestchangelog',
+            index=models.Index(fields=['changed_at'], name='changelog_changed_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='requestchangelog',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['data'], name='changelog_data_gin'),
+        ),
+        migrations.AddConstraint(
+            model_name='requestchangelog',
+            constraint=models.UniqueConstraint(fields=('request_type', 'request_id', 'version'), name='changelog_version_uniq'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+# Old per-type change log model behind each request_type
+OLD_MODELS = {
+    'staining': 'StainingRequestChangeLog',
+    'embedding': 'EmbeddingRequestChangeLog',
+    'sectioning': 'SectioningRequestChangeLog',
+}
+
+COPIED_FIELDS = ['request_id', 'change_type', 'changed_at', 'description', 'changed_fields', 'change_summary', 'version']
+
+
+def copy_logs(source, target, **fields):
+    """
+    Copy every row of the source queryset into the target model with the
+    given extra fields, snapshots first so the deltas can point at their copies
+    """
+    # Staining logs never had tissue_ids
+    has_tissues = all(
+        any(field.name == 'tissue_ids' for field in model._meta.get_fields())
+        for model in (source.model, target)
+    )
+    copied_ids = {}
+
+    def flush(rows):
+        copies = target.objects.bulk_create([
+            target(
+                snapshot_id=copied_ids.get(row.snapshot_id),
+                data=row.data or {},
+                **({'tissue_ids': row.tissue_ids} if has_tissues else {}),
+                **{name: getattr(row, name) for name in COPIED_FIELDS},
+                **fields,
+            )
+            for row in rows
+        ])
+        for row, copy in zip(rows, copies):
+            copied_ids[row.pk] = copy.pk
+
+    for snapshots in (True, False):
+        rows = []
+        for row in source.filter(snapshot__isnull=snapshots).order_by('request_id', 'version').iterator(chunk_size=BATCH_SIZE):
+            rows.append(row)
+            if len(rows) >= BATCH_SIZE:
+                flush(rows)
+                rows = []
+        flush(rows)
+
+
+def merge_change_logs(apps, schema_editor):
+    """Copy the three per-type change logs into RequestChangeLog"""
+    RequestChangeLog = apps.get_model('requests_app', 'RequestChangeLog')
+    for request_type, model_name in OLD_MODELS.items():
+        ChangeLog = apps.get_model('requests_app', model_name)
+        copy_logs(ChangeLog.objects.all(), RequestChangeLog, request_type=request_type)
+
+
+def split_change_logs(apps, schema_editor):
+    """Copy RequestChangeLog back into the per-type change logs, except the logs of deleted requests"""
+    RequestChangeLog = apps.get_model('requests_app', 'RequestChangeLog')
+    for request_type, model_name in OLD_MODELS.items():
+        ChangeLog = apps.get_model('requests_app', model_name)
+        request_model = ChangeLog._meta.get_field('request').related_model
+        logs = RequestChangeLog.objects.filter(
+            request_type=request_type, request_id__in=request_model.objects.values('pk')
+        )
+        copy_logs(logs, ChangeLog)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('requests_app', '0042_request_change_log'),
+    ]
+    operations = [
+        migrations.RunPython(merge_change_logs, reverse_code=split_change_logs),
+    ]
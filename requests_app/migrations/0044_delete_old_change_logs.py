@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('requests_app', '0043_copy_change_logs'),
+    ]
+    operations = [
+        migrations.DeleteModel(
+            name='EmbeddingRequestChangeLog',
+        ),
+        migrations.DeleteModel(
+            name='SectioningRequestChangeLog',
+        ),
+        migrations.DeleteModel(
+            name='StainingRequestChangeLog',
+        ),
+    ]
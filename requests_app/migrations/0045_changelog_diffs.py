@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requests_app', '0044_delete_old_change_logs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='requestchangelog',
+            name='diff',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
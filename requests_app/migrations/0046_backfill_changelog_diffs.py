@@ -0,0 +1,36 @@
+from django.db import migrations
+
+# Diff every version's full state against the previous version's, taken
+# with LAG() over each request's versions. The first version has no diff.
+BACKFILL_DIFFS = """
+    WITH states AS (
+        SELECT log.id,
+               COALESCE(snapshot.data, '{}'::jsonb) || log.data
+                   || jsonb_build_object('tissues', to_jsonb(log.tissue_ids)) AS state
+        FROM requests_app_requestchangelog AS log
+        LEFT JOIN requests_app_requestchangelog AS snapshot ON snapshot.id = log.snapshot_id
+    ),
+    versions AS (
+        SELECT states.id, states.state,
+               LAG(states.state) OVER (PARTITION BY log.request_type, log.request_id ORDER BY log.version) AS previous
+        FROM states
+        JOIN requests_app_requestchangelog AS log ON log.id = states.id
+    )
+    UPDATE requests_app_requestchangelog AS log
+    SET diff = (
+        SELECT COALESCE(jsonb_object_agg(field.key, jsonb_build_array(versions.previous -> field.key, field.value)), '{}'::jsonb)
+        FROM jsonb_each(versions.state) AS field
+        WHERE versions.previous -> field.key IS DISTINCT FROM field.value
+    )
+    FROM versions
+    WHERE versions.id = log.id AND versions.previous IS NOT NULL
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('requests_app', '0045_changelog_diffs'),
+    ]
+    operations = [
+        migrations.RunSQL(BACKFILL_DIFFS, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,16 @@
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    """Create the table of the database cache in settings.CACHES; does nothing if it exists"""
+    call_command('createcachetable', database=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('requests_app', '0049_import_previews'),
+    ]
+    operations = [
+        migrations.RunPython(create_cache_table, reverse_code=migrations.RunPython.noop),
+    ]
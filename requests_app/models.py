@@ -1,9 +1,29 @@
-from django.db import models
+from django.db import connection, models, transaction
+from django.contrib.auth.models import User
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.utils import timezone
+from django.utils.functional import cached_property
 import json
 
 # Create your models here.
 
+# Text search configuration used by the request search vectors and queries
+SEARCH_CONFIG = 'english'
+
+# A change log stores a full snapshot of the request once every this many versions
+CHANGE_LOG_SNAPSHOT_INTERVAL = 10
+
+
+def request_search_vector(*weighted_fields):
+    """Weighted tsvector expression over the given (field, weight) pairs"""
+    vector = None
+    for field, weight in weighted_fields:
+        part = SearchVector(field, weight=weight, config=SEARCH_CONFIG)
+        vector = part if vector is None else vector + part
+    return vector
+
 PRIORITY_CHOICES = [
     (1, '1 - Low'),
     (2, '2'),
@@ -17,6 +37,11 @@ class Requestor(models.Model):
     name = models.CharField(max_length=255)
     email = models.EmailField(blank=True, null=True, help_text="Email address for notifications")
 
+    class Meta:
+        indexes = [
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='requestor_name_trgm_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -39,6 +64,12 @@ class Status(models.Model):
         status, _ = cls.objects.get_or_create(status='Submitted')
         return status
 
+    @classmethod
+    def get_default_status_id(cls):
+        """Model field default; resolved from the in-memory registry, so building a request runs no query"""
+        from .reference_data import default_status_id
+        return default_status_id()
+
 class Assignee(models.Model):
     key = models.AutoField(primary_key=True)
     name = models.CharField(max_length=255)
@@ -68,6 +99,12 @@ class Priority(models.Model):
         priority, _ = cls.objects.get_or_create(value=3, defaults={'label': '3 - Medium'})
         return priority
 
+    @classmethod
+    def get_default_priority_id(cls):
+        """Model field default; resolved from the in-memory registry, so building a request runs no query"""
+        from .reference_data import default_priority_id
+        return default_priority_id()
+
     @classmethod
     def initialize_defaults(cls):
         """Initialize default priority values if they don't exist"""
@@ -98,6 +135,15 @@ class Probe(models.Model):
     number_of_pairs = models.IntegerField(blank=True, null=True)
     archived = models.BooleanField(default=False, verbose_name="Archived")
 
+    class Meta:
+        indexes = [
+            # Pickers and forms only list active probes, ordered by name
+            models.Index(fields=['name'], condition=models.Q(archived=False), name='probe_active_name_idx'),
+            # Trigram indexes back the fuzzy lookups in lookups.py
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='probe_name_trgm_idx'),
+            GinIndex(fields=['target_gene'], opclasses=['gin_trgm_ops'], name='probe_target_gene_trgm_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.description}"
 
@@ -117,6 +163,14 @@ class Antibody(models.Model):
     vendor = models.CharField(max_length=255)
     archived = models.BooleanField(default=False, verbose_name="Archived")
 
+    class Meta:
+        indexes = [
+            # Pickers and forms only list active antibodies, ordered by name
+            models.Index(fields=['name'], condition=models.Q(archived=False), name='antibody_active_name_idx'),
+            # Trigram index backs the fuzzy lookups in lookups.py
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='antibody_name_trgm_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.description}"
 
@@ -133,6 +187,13 @@ class Study(models.Model):
     status = models.ForeignKey(Status, on_delete=models.CASCADE, null=True, blank=True)
     archived = models.BooleanField(default=False, verbose_name="Archived")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['study_id'], condition=models.Q(archived=False), name='study_active_id_idx'),
+            GinIndex(fields=['study_id'], opclasses=['gin_trgm_ops'], name='study_id_trgm_idx'),
+            GinIndex(fields=['title'], opclasses=['gin_trgm_ops'], name='study_title_trgm_idx'),
+        ]
+
     def __str__(self):
         return f"{self.study_id} - {self.title}"
 
@@ -146,7 +207,60 @@ class Tissue(models.Model):
     def get_display_fields(self):
         return [self.name]
 
-class Request(models.Model):
+class TrackedFieldsMixin:
+    """
+    Remembers the values of tracked_fields as loaded from the database, so a
+    save can tell what changed without re-reading the row.
+    """
+    tracked_fields = ('status',)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_tracked_fields()
+        return instance
+
+    def _snapshot_tracked_fields(self, fields=None):
+        loaded = self.__dict__.setdefault('_loaded_values', {})
+        for name in self.tracked_fields:
+            attname = self._meta.get_field(name).attname
+            if fields is not None and name not in fields and attname not in fields:
+                continue
+            # Deferred fields were never loaded, so there is nothing to compare against
+            if attname in self.__dict__:
+                loaded[name] = self.__dict__[attname]
+
+    def has_changed(self, field_name):
+        """True if field_name differs from the value last loaded from or saved to the database"""
+        loaded = self.__dict__.get('_loaded_values', {})
+        if field_name not in loaded:
+            return False
+        return getattr(self, self._meta.get_field(field_name).attname) != loaded[field_name]
+
+    def get_old_value(self, field_name):
+        """Value of field_name as last loaded or saved (the id for foreign keys), or None if unknown"""
+        return self.__dict__.get('_loaded_values', {}).get(field_name)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._snapshot_tracked_fields(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._snapshot_tracked_fields(fields)
+
+class AtomicSaveMixin:
+    """
+    Runs save() and its post_save handlers in one transaction, so rows the
+    handlers write (such as EmailOutbox entries) commit or roll back with it.
+    """
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
+class Request(AtomicSaveMixin, TrackedFieldsMixin, models.Model):
     key = models.AutoField(primary_key=True)
     data = models.JSONField()
     requestor = models.ForeignKey(Requestor, on_delete=models.CASCADE)
@@ -156,9 +270,9 @@ class Request(models.Model):
     tissue = models.ForeignKey(Tissue, on_delete=models.CASCADE)
     description = models.CharField(max_length=256, blank=True, null=True)
     special_request = models.TextField(blank=True, null=True)
-    status = models.ForeignKey(Status, on_delete=models.CASCADE, default=Status.get_default_status)
+    status = models.ForeignKey(Status, on_delete=models.CASCADE, default=Status.get_default_status_id)
     notes = models.TextField(blank=True, null=True)
-    priority = models.ForeignKey(Priority, on_delete=models.CASCADE, default=3)
+    priority = models.ForeignKey(Priority, on_delete=models.CASCADE, default=Priority.get_default_priority_id)
     assigned_to = models.ForeignKey(Assignee, on_delete=models.SET_NULL, null=True, blank=True)
     request_type = models.CharField(
         choices=[
@@ -173,6 +287,23 @@ class Request(models.Model):
     links = models.JSONField(blank=True, null=True, verbose_name="Links")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by PostgreSQL on every write, used for ranked keyword search
+    search_vector = models.GeneratedField(
+        expression=request_search_vector(('description', 'A'), ('special_request', 'B'), ('notes', 'C')),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='req_search_vector_idx'),
+            # Queue filters: status + created_at range, status exclusion + status_timestamp range
+            models.Index(fields=['status', '-created_at'], name='req_status_created_idx'),
+            models.Index(fields=['status', '-status_timestamp'], name='req_status_ts_idx'),
+            # Default ordering and keyset pagination
+            models.Index(fields=['-created_at', '-key'], name='req_created_key_idx'),
+            models.Index(fields=['-status_timestamp', '-key'], name='req_ts_key_idx'),
+        ]
 
     def __str__(self):
         return f"Request {self.key} - {self.antibody.name}"
@@ -188,7 +319,7 @@ class StainingRequest(Request):
         return f"Staining Request {self.key} - {self.antibody.name}"
 
 # Embedding Request Model (existing model)
-class EmbeddingRequest(models.Model):
+class EmbeddingRequest(AtomicSaveMixin, TrackedFieldsMixin, models.Model):
     key = models.AutoField(primary_key=True)
     date_created = models.DateTimeField(auto_now_add=True)
     special_request = models.TextField(blank=True, null=True)
@@ -205,20 +336,32 @@ class EmbeddingRequest(models.Model):
     # Foreign Keys
     assigned_to = models.ForeignKey(Assignee, blank=True, null=True, on_delete=models.SET_NULL)
     requestor = models.ForeignKey(Requestor, on_delete=models.CASCADE)
-    status = models.ForeignKey(Status, default=Status.get_default_status, on_delete=models.CASCADE)
+    status = models.ForeignKey(Status, default=Status.get_default_status_id, on_delete=models.CASCADE)
     study = models.ForeignKey(Study, on_delete=models.CASCADE)
     tissues = models.ManyToManyField(Tissue, blank=True)
+    search_vector = models.GeneratedField(
+        expression=request_search_vector(('special_request', 'A'), ('currently_in', 'B')),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
     
     class Meta:
         verbose_name = "Embedding Request"
         verbose_name_plural = "Embedding Requests"
         ordering = ["-created_at"]
+        indexes = [
+            GinIndex(fields=['search_vector'], name='emb_search_vector_idx'),
+            models.Index(fields=['status', '-created_at'], name='emb_status_created_idx'),
+            models.Index(fields=['status', '-status_timestamp'], name='emb_status_ts_idx'),
+            models.Index(fields=['-created_at', '-key'], name='emb_created_key_idx'),
+            models.Index(fields=['-status_timestamp', '-key'], name='emb_ts_key_idx'),
+        ]
 
     def __str__(self):
         return f"Embedding Request {self.key} - {self.requestor.name}"
 
 # Sectioning Request Model (existing model)
-class SectioningRequest(models.Model):
+class SectioningRequest(AtomicSaveMixin, TrackedFieldsMixin, models.Model):
     key = models.AutoField(primary_key=True)
     date_created = models.DateTimeField(auto_now_add=True)
     special_request = models.TextField(blank=True, null=True)
@@ -235,168 +378,31 @@ class SectioningRequest(models.Model):
     # Foreign Keys
     assigned_to = models.ForeignKey(Assignee, blank=True, null=True, on_delete=models.SET_NULL)
     requestor = models.ForeignKey(Requestor, on_delete=models.CASCADE)
-    status = models.ForeignKey(Status, default=Status.get_default_status, on_delete=models.CASCADE)
+    status = models.ForeignKey(Status, default=Status.get_default_status_id, on_delete=models.CASCADE)
     study = models.ForeignKey(Study, on_delete=models.CASCADE)
     tissues = models.ManyToManyField(Tissue, blank=True)
+    search_vector = models.GeneratedField(
+        expression=request_search_vector(('special_request', 'A'), ('other', 'B')),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
     
     class Meta:
         verbose_name = "Sectioning Request"
         verbose_name_plural = "Sectioning Requests"
         ordering = ["-created_at"]
+        indexes = [
+            GinIndex(fields=['search_vector'], name='sec_search_vector_idx'),
+            models.Index(fields=['status', '-created_at'], name='sec_status_created_idx'),
+            models.Index(fields=['status', '-status_timestamp'], name='sec_status_ts_idx'),
+            models.Index(fields=['-created_at', '-key'], name='sec_created_key_idx'),
+            models.Index(fields=['-status_timestamp', '-key'], name='sec_ts_key_idx'),
+        ]
 
     def __str__(self):
         return f"Sectioning Request {self.key} - {self.requestor.name}"
 
 
-# Change Log Models
-class BaseChangeLog(models.Model):
-    """Base model for all change logs"""
-    change_type = models.CharField(
-        choices=[
-            ('created', 'Created'),
-            ('updated', 'Updated'),
-            ('deleted', 'Deleted'),
-        ],
-        max_length=20
-    )
-    changed_at = models.DateTimeField(auto_now_add=True)
-    description = models.CharField(blank=True, max_length=256, null=True)
-    changed_fields = models.JSONField(blank=True, default=list)
-    change_summary = models.TextField(blank=True, null=True)
-    data = models.JSONField(blank=True, null=True)  # Store the complete request data at time of change
-    
-    class Meta:
-        abstract = True
-        ordering = ['-changed_at']
-
-
-class StainingRequestChangeLog(BaseChangeLog):
-    """Change log for StainingRequest"""
-    request = models.ForeignKey(StainingRequest, on_delete=models.CASCADE, related_name='change_logs')
-    requestor = models.ForeignKey(Requestor, blank=True, null=True, on_delete=models.SET_NULL)
-    study = models.ForeignKey(Study, blank=True, null=True, on_delete=models.SET_NULL)
-    tissue = models.ForeignKey(Tissue, blank=True, null=True, on_delete=models.SET_NULL)
-    antibody = models.ForeignKey(Antibody, blank=True, null=True, on_delete=models.SET_NULL)
-    probe = models.ForeignKey(Probe, blank=True, null=True, on_delete=models.SET_NULL)
-    status = models.ForeignKey(Status, blank=True, null=True, on_delete=models.SET_NULL)
-    assigned_to = models.ForeignKey(Assignee, blank=True, null=True, on_delete=models.SET_NULL)
-    priority = models.ForeignKey(Priority, blank=True, null=True, on_delete=models.SET_NULL)
-    special_request = models.TextField(blank=True, null=True)
-    notes = models.TextField(blank=True, null=True)
-    
-    class Meta:
-        verbose_name = "Staining Request Change Log"
-        verbose_name_plural = "Staining Request Change Logs"
-        ordering = ['-changed_at']
-    
-    @classmethod
-    def get_request_history(cls, request_id):
-        """Get all versions of a request ordered by change time"""
-        return cls.objects.filter(request_id=request_id).order_by('changed_at')
-    
-    @classmethod
-    def log_change(cls, request, change_type, changed_fields=None, description=None):
-        """Log a change to a StainingRequest"""
-        # Store current state of the request
-        data = {
-            'requestor': request.requestor.key if request.requestor else None,
-            'study': request.study.key if request.study else None,
-            'tissue': request.tissue.key if request.tissue else None,
-            'antibody': request.antibody.key if request.antibody else None,
-            'probe': request.probe.key if request.probe else None,
-            'status': request.status.key if request.status else None,
-            'assigned_to': request.assigned_to.key if request.assigned_to else None,
-            'priority': request.priority.key if request.priority else None,
-            'special_request': request.special_request,
-            'notes': request.notes,
-        }
-        
-        return cls.objects.create(
-            request=request,
-            change_type=change_type,
-            description=description,
-            changed_fields=changed_fields or [],
-            data=data,
-            requestor=request.requestor,
-            study=request.study,
-            tissue=request.tissue,
-            antibody=request.antibody,
-            probe=request.probe,
-            status=request.status,
-            assigned_to=request.assigned_to,
-            priority=request.priority,
-            special_request=request.special_request,
-            notes=request.notes,
-        )
-
-
-class EmbeddingRequestChangeLog(BaseChangeLog):
-    """Change log for EmbeddingRequest"""
-    request = models.ForeignKey(EmbeddingRequest, on_delete=models.CASCADE, related_name='change_logs')
-    requestor = models.ForeignKey(Requestor, blank=True, null=True, on_delete=models.SET_NULL)
-    study = models.ForeignKey(Study, blank=True, null=True, on_delete=models.SET_NULL)
-    tissues = models.ManyToManyField(Tissue, blank=True)
-    status = models.ForeignKey(Status, blank=True, null=True, on_delete=models.SET_NULL)
-    assigned_to = models.ForeignKey(Assignee, blank=True, null=True, on_delete=models.SET_NULL)
-    special_request = models.TextField(blank=True, null=True)
-    number_of_animals = models.IntegerField(blank=True, null=True)
-    take_down_date = models.DateField(blank=True, null=True)
-    currently_in = models.CharField(max_length=255, blank=True, null=True)
-    date_of_xylene_etoh_change = models.DateField(blank=True, null=True)
-    length_of_time_in_etoh = models.CharField(blank=True, max_length=40, null=True)
-    
-    class Meta:
-        verbose_name = "Embedding Request Change Log"
-        verbose_name_plural = "Embedding Request Change Logs"
-        ordering = ['-changed_at']
-    
-    @classmethod
-    def get_request_history(cls, request_id):
-        """Get all versions of a request ordered by change time"""
-        return cls.objects.filter(request_id=request_id).order_by('changed_at')
-    
-    @classmethod
-    def log_change(cls, request, change_type, changed_fields=None, description=None):
-        """Log a change to an EmbeddingRequest"""
-        # Store current state of the request
-        data = {
-            'requestor': request.requestor.key if request.requestor else None,
-            'study': request.study.key if request.study else None,
-            'tissues': [t.key for t in request.tissues.all()],
-            'status': request.status.key if request.status else None,
-            'assigned_to': request.assigned_to.key if request.assigned_to else None,
-            'special_request': request.special_request,
-            'number_of_animals': request.number_of_animals,
-            'take_down_date': request.take_down_date.isoformat() if request.take_down_date else None,
-            'currently_in': request.currently_in,
-            'date_of_xylene_etoh_change': request.date_of_xylene_etoh_change.isoformat() if request.date_of_xylene_etoh_change else None,
-            'length_of_time_in_etoh': request.length_of_time_in_etoh,
-        }
-        
-        changelog = cls.objects.create(
-            request=request,
-            change_type=change_type,
-            description=description,
-            changed_fields=changed_fields or [],
-            data=data,
-            requestor=request.requestor,
-            study=request.study,
-            status=request.status,
-            assigned_to=request.assigned_to,
-            special_request=request.special_request,
-            number_of_animals=request.number_of_animals,
-            take_down_date=request.take_down_date,
-            currently_in=request.currently_in,
-            date_of_xylene_etoh_change=request.date_of_xylene_etoh_change,
-            length_of_time_in_etoh=request.length_of_time_in_etoh,
-        )
-        
-        # Handle ManyToMany field separately
-        changelog.tissues.set(request.tissues.all())
-        
-        return changelog
-
-
 # Notification Settings Model
 class NotificationSettings(models.Model):
     """Model to store notification preferences for different request types and statuses"""
@@ -440,12 +446,13 @@ class NotificationSettings(models.Model):
     
     @classmethod
     def is_notification_enabled(cls, request_type, status):
-        """Check if notifications are enabled for a specific request type and status"""
-        try:
-            setting = cls.objects.get(request_type=request_type, status=status)
-            return setting.notify_enabled
-        except cls.DoesNotExist:
-            return False  # Default to disabled if no setting exists
+        """
+        Check if notifications are enabled for a specific request type and status
+        (a Status or its pk). Answered from the cached settings matrix, so it
+        runs no query; disabled if no setting exists.
+        """
+        from .notification_cache import is_notification_enabled
+        return is_notification_enabled(request_type, status)
     
     @classmethod
     def update_settings(cls, request_type, status_settings):
@@ -467,138 +474,510 @@ class NotificationSettings(models.Model):
                 setting.save()
 
 
-class SectioningRequestChangeLog(BaseChangeLog):
-    """Change log for SectioningRequest"""
-    request = models.ForeignKey(SectioningRequest, on_delete=models.CASCADE, related_name='change_logs')
-    requestor = models.ForeignKey(Requestor, blank=True, null=True, on_delete=models.SET_NULL)
-    study = models.ForeignKey(Study, blank=True, null=True, on_delete=models.SET_NULL)
-    tissues = models.ManyToManyField(Tissue, blank=True)
-    status = models.ForeignKey(Status, blank=True, null=True, on_delete=models.SET_NULL)
-    assigned_to = models.ForeignKey(Assignee, blank=True, null=True, on_delete=models.SET_NULL)
-    special_request = models.TextField(blank=True, null=True)
-    cut_surface_down = models.BooleanField(blank=True, null=True)
-    sections_per_slide = models.IntegerField(blank=True, null=True)
-    slides_per_block = models.IntegerField(blank=True, null=True)
-    other = models.TextField(blank=True, null=True)
-    for_what = models.CharField(blank=True, max_length=20, null=True)
-    
-    class Meta:
-        verbose_name = "Sectioning Request Change Log"
-        verbose_name_plural = "Sectioning Request Change Logs"
-        ordering = ['-changed_at']
-    
-    @classmethod
-    def get_request_history(cls, request_id):
-        """Get all versions of a request ordered by change time"""
-        return cls.objects.filter(request_id=request_id).order_by('changed_at')
-    
-    @classmethod
-    def log_change(cls, request, change_type, changed_fields=None, description=None):
-        """Log a change to a SectioningRequest"""
-        # Store current state of the request
-        data = {
-            'requestor': request.requestor.key if request.requestor else None,
-            'study': request.study.key if request.study else None,
-            'tissues': [t.key for t in request.tissues.all()],
-            'status': request.status.key if request.status else None,
-            'assigned_to': request.assigned_to.key if request.assigned_to else None,
-            'special_request': request.special_request,
-            'cut_surface_down': request.cut_surface_down,
-            'sections_per_slide': request.sections_per_slide,
-            'slides_per_block': request.slides_per_block,
-            'other': request.other,
-            'for_what': request.for_what,
-        }
-        
-        changelog = cls.objects.create(
-            request=request,
-            change_type=change_type,
-            description=description,
-            changed_fields=changed_fields or [],
-            data=data,
-            requestor=request.requestor,
-            study=request.study,
-            status=request.status,
-            assigned_to=request.assigned_to,
-            special_request=request.special_request,
-            cut_surface_down=request.cut_surface_down,
-            sections_per_slide=request.sections_per_slide,
-            slides_per_block=request.slides_per_block,
-            other=request.other,
-            for_what=request.for_what,
-        )
-        
-        # Handle ManyToMany field separately
-        changelog.tissues.set(request.tissues.all())
-        
-        return changelog
+# Notification Digest Settings Model
+class NotificationDigestSettings(models.Model):
+    """
+    Optional digest mode for one request type. When enabled, notifications
+    for that type are held for window_minutes and each recipient gets a
+    single summary email per window instead of one email per event.
+    """
 
+    DEFAULT_WINDOW_MINUTES = 15
 
-# Notification Settings Model
-class NotificationSettings(models.Model):
-    """Model to store notification preferences for different request types and statuses"""
-    
-    REQUEST_TYPE_CHOICES = [
-        ('staining', 'Staining Request'),
-        ('embedding', 'Embedding Request'),
-        ('sectioning', 'Sectioning Request'),
-    ]
-    
     request_type = models.CharField(
         max_length=20,
-        choices=REQUEST_TYPE_CHOICES,
-        help_text="Type of request for these notification settings"
+        choices=NotificationSettings.REQUEST_TYPE_CHOICES,
+        unique=True,
+        help_text="Type of request these digest settings apply to"
     )
-    status = models.ForeignKey(
-        Status,
-        on_delete=models.CASCADE,
-        help_text="Status that triggers notifications"
+    digest_enabled = models.BooleanField(
+        default=False,
+        help_text="Send one summary email per recipient per window instead of one email per change"
     )
-    notify_enabled = models.BooleanField(
-        default=True,
-        help_text="Whether to send notifications for this status"
+    window_minutes = models.PositiveIntegerField(
+        default=DEFAULT_WINDOW_MINUTES,
+        help_text="How long notifications are collected before the summary is sent"
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Notification Digest Setting"
+        verbose_name_plural = "Notification Digest Settings"
+        ordering = ['request_type']
+
+    def __str__(self):
+        return f"{self.get_request_type_display()} - {'Digest every ' + str(self.window_minutes) + ' min' if self.digest_enabled else 'Immediate'}"
+
+    @classmethod
+    def get_window(cls, request_type):
+        """Digest window for a request type as a timedelta, or None if emails are sent immediately"""
+        from .notification_cache import digest_windows
+        return digest_windows().get(request_type)
+
+    @classmethod
+    def update_settings(cls, request_type, digest_enabled, window_minutes):
+        """Turn digest mode on or off for a request type"""
+        cls.objects.update_or_create(
+            request_type=request_type,
+            defaults={'digest_enabled': digest_enabled, 'window_minutes': window_minutes}
+        )
+
+
+# Email Outbox Model
+class EmailOutbox(models.Model):
+    """
+    Notification email waiting to be sent. Rows are written by the post_save
+    signals in the same transaction as the request, and delivered by the
+    send_outbox_emails management command.
+    """
+
+    EVENT_CHOICES = [
+        ('created', 'Request Created'),
+        ('status_changed', 'Status Changed'),
+    ]
+
+    STATE_PENDING = 'pending'
+    STATE_SENT = 'sent'
+    STATE_SKIPPED = 'skipped'
+    STATE_FAILED = 'failed'
+    STATE_CHOICES = [
+        (STATE_PENDING, 'Pending'),
+        (STATE_SENT, 'Sent'),
+        (STATE_SKIPPED, 'Skipped'),
+        (STATE_FAILED, 'Failed'),
+    ]
+
+    event = models.CharField(max_length=20, choices=EVENT_CHOICES)
+    request_type = models.CharField(max_length=20, choices=NotificationSettings.REQUEST_TYPE_CHOICES)
+    request_id = models.IntegerField()
+    old_status_id = models.IntegerField(blank=True, null=True)
+    new_status_id = models.IntegerField(blank=True, null=True)
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default=STATE_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # Digest rows are collected per recipient and sent as one summary email
+    digest = models.BooleanField(default=False)
+    recipient = models.EmailField(blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "Outbox Email"
+        verbose_name_plural = "Outbox Emails"
+        ordering = ['-created_at']
+        indexes = [
+            # The worker only ever scans pending rows that are due
+            models.Index(fields=['next_attempt_at', 'id'], condition=models.Q(state='pending'), name='outbox_pending_due_idx'),
+            models.Index(fields=['recipient', 'next_attempt_at'], condition=models.Q(state='pending', digest=True), name='outbox_pending_digest_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_event_display()} - {self.request_type} #{self.request_id} ({self.state})"
+
+
+# Import Job Model
+class ImportJob(models.Model):
+    """
+    A catalog file uploaded for import. Jobs are processed in the background
+    by the process_import_jobs management command, one committed chunk at a
+    time; checkpoint_row is the last row of the last committed chunk, so a
+    failed or interrupted job resumes after it instead of starting over.
+    """
+
+    KIND_CHOICES = [
+        ('studies', 'Studies'),
+        ('antibodies', 'Antibodies'),
+        ('probes', 'Probes'),
+    ]
+
+    STATE_PENDING = 'pending'
+    STATE_RUNNING = 'running'
+    STATE_DONE = 'done'
+    STATE_FAILED = 'failed'
+    STATE_PREVIEW = 'preview'
+    STATE_CHOICES = [
+        (STATE_PENDING, 'Pending'),
+        (STATE_RUNNING, 'Running'),
+        (STATE_PREVIEW, 'Awaiting confirmation'),
+        (STATE_DONE, 'Done'),
+        (STATE_FAILED, 'Failed'),
+    ]
+
+    # What happens to rows whose key already exists
+    MODE_INSERT = 'insert'
+    MODE_UPSERT = 'upsert'
+    MODE_CHOICES = [
+        (MODE_INSERT, 'Add new rows only'),
+        (MODE_UPSERT, 'Add new rows and update existing ones'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES, default=MODE_INSERT)
+    # A dry run only computes the diff the import would apply (preview, a
+    # Parquet file with a row group per chunk, see imports.write_preview) and
+    # waits in the preview state until it is committed
+    dry_run = models.BooleanField(default=False)
+    preview = models.FileField(upload_to='imports/previews/', blank=True)
+    preview_counts = models.JSONField(blank=True, default=dict)
+    file = models.FileField(upload_to='imports/')
+    file_name = models.CharField(max_length=255)
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default=STATE_PENDING)
+    # Data rows in the file, read when the job starts; None until then or if the file does not say
+    total_rows = models.PositiveIntegerField(blank=True, null=True)
+    checkpoint_row = models.PositiveIntegerField(default=1)  # Row 1 is the header
+    imported_count = models.PositiveIntegerField(default=0)
+    updated_count = models.PositiveIntegerField(default=0)
+    unchanged_count = models.PositiveIntegerField(default=0)
+    skipped_count = models.PositiveIntegerField(default=0)
+    invalid_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(blank=True, default=list)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Also a heartbeat: saved with every checkpoint and at least every
+    # imports.JOB_HEARTBEAT_INTERVAL, so a running job that stops updating
+    # belongs to a worker that died
     updated_at = models.DateTimeField(auto_now=True)
-    
+    finished_at = models.DateTimeField(blank=True, null=True)
+
     class Meta:
-        unique_together = ['request_type', 'status']
-        verbose_name = "Notification Setting"
-        verbose_name_plural = "Notification Settings"
-        ordering = ['request_type', 'status__status']
-    
+        verbose_name = "Import Job"
+        verbose_name_plural = "Import Jobs"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], condition=models.Q(state__in=['pending', 'running']), name='importjob_open_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.get_request_type_display()} - {self.status.status} ({'Enabled' if self.notify_enabled else 'Disabled'})"
-    
+        return f"{self.get_kind_display()} import of {self.file_name} ({self.state})"
+
+    @property
+    def rows_processed(self):
+        return self.checkpoint_row - 1
+
+    @property
+    def percent_done(self):
+        if self.state == self.STATE_DONE:
+            return 100
+        if not self.total_rows:
+            return None
+        return min(100, round(100 * self.rows_processed / self.total_rows))
+
+    @property
+    def is_finished(self):
+        return self.state in (self.STATE_DONE, self.STATE_FAILED)
+
+    @property
+    def awaits_confirmation(self):
+        return self.state == self.STATE_PREVIEW
+
+
+# Change Log Model
+class RequestChangeLog(models.Model):
+    """
+    Append-only change log of every request type, keyed by (request_type,
+    request_id, changed_at). request_id is not a foreign key, so the history
+    of a deleted request is kept.
+
+    Every CHANGE_LOG_SNAPSHOT_INTERVAL versions of a request, data holds a full
+    snapshot of its logged fields. The versions in between reference that
+    snapshot and store only the fields that differ from it, so any version is
+    rebuilt from two rows: the snapshot's data updated with its own.
+    """
+
+    CHANGE_TYPE_CHOICES = [
+        ('created', 'Created'),
+        ('updated', 'Updated'),
+        ('deleted', 'Deleted'),
+    ]
+
+    # Request model behind each request_type
+    REQUEST_MODELS = {
+        'staining': Request,
+        'embedding': EmbeddingRequest,
+        'sectioning': SectioningRequest,
+    }
+    REQUEST_TYPES = {model: request_type for request_type, model in REQUEST_MODELS.items()}
+
+    # Fields logged in data for each request_type; related fields as primary keys
+    LOGGED_FIELDS = {
+        'staining': [
+            'requestor', 'study', 'tissue', 'antibody', 'probe', 'status', 'assigned_to', 'priority',
+            'special_request', 'notes',
+        ],
+        'embedding': [
+            'requestor', 'study', 'status', 'assigned_to', 'special_request', 'number_of_animals',
+            'take_down_date', 'currently_in', 'date_of_xylene_etoh_change', 'length_of_time_in_etoh',
+        ],
+        'sectioning': [
+            'requestor', 'study', 'status', 'assigned_to', 'special_request', 'cut_surface_down',
+            'sections_per_slide', 'slides_per_block', 'other', 'for_what',
+        ],
+    }
+    # Request types with several tissues, logged in tissue_ids rather than data
+    MULTI_TISSUE_TYPES = ('embedding', 'sectioning')
+
+    # Logged fields holding primary keys of reference rows, and their models
+    REFERENCE_FIELDS = {
+        'requestor': Requestor,
+        'study': Study,
+        'tissue': Tissue,
+        'tissues': Tissue,
+        'antibody': Antibody,
+        'probe': Probe,
+        'status': Status,
+        'assigned_to': Assignee,
+        'priority': Priority,
+    }
+
+    request_type = models.CharField(max_length=20, choices=NotificationSettings.REQUEST_TYPE_CHOICES)
+    request_id = models.IntegerField()
+    change_type = models.CharField(choices=CHANGE_TYPE_CHOICES, max_length=20)
+    changed_at = models.DateTimeField(default=timezone.now)
+    description = models.CharField(blank=True, max_length=256, null=True)
+    changed_fields = models.JSONField(blank=True, default=list)
+    change_summary = models.TextField(blank=True, null=True)
+    version = models.PositiveIntegerField(default=1)
+    # Null for snapshots; for other versions, the snapshot data is relative to
+    snapshot = models.ForeignKey('self', blank=True, null=True, on_delete=models.PROTECT, related_name='+')
+    data = models.JSONField(blank=True, default=dict)  # Full request data for snapshots, changed fields otherwise
+    tissue_ids = ArrayField(models.IntegerField(), blank=True, default=list)
+    # {field: [old, new]} for the logged fields that differ from the previous version
+    diff = models.JSONField(blank=True, default=dict)
+
+    class Meta:
+        verbose_name = "Request Change Log"
+        verbose_name_plural = "Request Change Logs"
+        ordering = ['-changed_at']
+        indexes = [
+            models.Index(fields=['request_type', 'request_id', 'changed_at'], name='changelog_request_idx'),
+            models.Index(fields=['changed_at'], name='changelog_changed_at_idx'),
+            GinIndex(fields=['data'], name='changelog_data_gin'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['request_type', 'request_id', 'version'], name='changelog_version_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_request_type_display()} #{self.request_id} v{self.version} ({self.change_type})"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Change log entries are append-only and cannot be modified")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Change log entries are append-only and cannot be deleted")
+
+    @property
+    def is_snapshot(self):
+        return self.snapshot_id is None
+
+    def get_state(self):
+        """The request's logged fields as of this version, with primary keys for related rows"""
+        state = dict(self.snapshot.data or {}) if self.snapshot_id else {}
+        state.update(self.data or {})
+        if self.request_type in self.MULTI_TISSUE_TYPES:
+            state['tissues'] = list(self.tissue_ids)
+        return state
+
     @classmethod
-    def get_settings_for_request_type(cls, request_type):
-        """Get all notification settings for a specific request type"""
-        return cls.objects.filter(request_type=request_type)
-    
+    def resolve(cls, name, value):
+        """A logged value with related rows resolved from the reference data cache, for display"""
+        from .reference_data import get_reference
+
+        model = cls.REFERENCE_FIELDS.get(name)
+        if model is None:
+            return value
+        if isinstance(value, list):
+            return [get_reference(model, pk) for pk in value]
+        return get_reference(model, value)
+
+    @cached_property
+    def state(self):
+        """get_state() resolved for display"""
+        return {name: self.resolve(name, value) for name, value in self.get_state().items()}
+
+    @cached_property
+    def changes(self):
+        """diff resolved for display, as a list of {'field', 'label', 'old', 'new'} in field name order"""
+        return [
+            {
+                'field': name,
+                'label': name.replace('_', ' ').capitalize(),
+                'old': self.resolve(name, old),
+                'new': self.resolve(name, new),
+            }
+            for name, (old, new) in sorted((self.diff or {}).items())
+        ]
+
     @classmethod
-    def is_notification_enabled(cls, request_type, status):
-        """Check if notifications are enabled for a specific request type and status"""
-        try:
-            setting = cls.objects.get(request_type=request_type, status=status)
-            return setting.notify_enabled
-        except cls.DoesNotExist:
-            return False  # Default to disabled if no setting exists
-    
+    def request_type_of(cls, request):
+        return cls.REQUEST_TYPES[request._meta.concrete_model]
+
     @classmethod
-    def update_settings(cls, request_type, status_settings):
-        """Update notification settings for a request type
-        
-        Args:
-            request_type (str): The type of request (staining, embedding, sectioning)
-            status_settings (dict): Dictionary mapping status IDs to enabled/disabled
+    def for_request(cls, request_type, request_id):
+        """All versions of a request, with the snapshots their state is rebuilt from"""
+        return cls.objects.filter(request_type=request_type, request_id=request_id).select_related('snapshot')
+
+    @classmethod
+    def get_request_history(cls, request_type, request_id):
+        """Get all versions of a request ordered by change time"""
+        return cls.for_request(request_type, request_id).order_by('version')
+
+    @classmethod
+    def state_q(cls, name, value):
         """
-        for status_id, enabled in status_settings.items():
-            status = Status.objects.get(pk=status_id)
-            setting, created = cls.objects.get_or_create(
-                request_type=request_type,
-                status=status,
-                defaults={'notify_enabled': enabled}
-            )
-            if not created:
-                setting.notify_enabled = enabled
-                setting.save()
+        Q matching versions whose state has value for the logged field name.
+        The value is either in the version's own data or, if that does not
+        mention the field, in its snapshot's; both are looked up through the
+        GIN index on data.
+        """
+        in_snapshots = cls.objects.filter(snapshot__isnull=True, data__contains={name: value})
+        return (
+            models.Q(data__contains={name: value})
+            | models.Q(snapshot__in=in_snapshots) & ~models.Q(data__has_key=name)
+        )
+
+    @classmethod
+    def with_state(cls, **fields):
+        """Versions, of any request type, whose state has each of the given logged field values, e.g. with_state(assigned_to=3)"""
+        queryset = cls.objects.all()
+        for name, value in fields.items():
+            queryset = queryset.filter(cls.state_q(name, value))
+        return queryset
+
+    @classmethod
+    def as_of(cls, when, request_type=None, study=None):
+        """
+        The version of every request that was current at when, i.e. the state
+        of all requests at that moment, optionally only those of one request
+        type or (as of then) one study. Requests deleted by then are left out.
+
+        The versions are picked in one pass with DISTINCT ON (request_type,
+        request_id) ... ORDER BY version DESC, walking the changelog_version_uniq
+        index backwards, rather than with a lookup per request. changed_at only
+        bounds the versions: it is set before the INSERT that numbers the
+        version, so concurrent changes can commit their times out of order.
+        """
+        current = cls.objects.filter(changed_at__lte=when)
+        if request_type:
+            current = current.filter(request_type=request_type)
+        current = current.order_by('-request_type', '-request_id', '-version').distinct('request_type', 'request_id')
+
+        queryset = cls.objects.filter(pk__in=current.values('pk')).exclude(change_type='deleted')
+        if study is not None:
+            queryset = queryset.filter(cls.state_q('study', getattr(study, 'pk', study)))
+        return queryset.select_related('snapshot').order_by('request_type', '-request_id')
+
+    @classmethod
+    def capture_state(cls, request):
+        """JSON-serializable values of the logged fields of request"""
+        state = {}
+        for name in cls.LOGGED_FIELDS[cls.request_type_of(request)]:
+            value = getattr(request, request._meta.get_field(name).attname)
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            state[name] = value
+        return state
+
+    @classmethod
+    def capture_columns(cls, request):
+        """Values of logged fields stored in their own columns rather than in data"""
+        if cls.request_type_of(request) not in cls.MULTI_TISSUE_TYPES:
+            return {'tissue_ids': []}
+        # Iterating .all() reuses prefetched tissues instead of querying again
+        return {'tissue_ids': sorted(tissue.pk for tissue in request.tissues.all())}
+
+    # Numbers the new version, starts a new snapshot every
+    # CHANGE_LOG_SNAPSHOT_INTERVAL versions and otherwise keeps only the
+    # fields that differ from the current snapshot, and diffs the new state
+    # against the previous version's, all in the INSERT
+    LOG_CHANGE_SQL = """
+        INSERT INTO {table} ({columns}, changed_fields, version, snapshot_id, data, diff)
+        SELECT {values},
+               COALESCE(%s::jsonb, (
+                   SELECT COALESCE(jsonb_agg(name ORDER BY name), '[]'::jsonb)
+                   FROM jsonb_object_keys(changes.diff) AS name
+               )),
+               COALESCE(latest.version, 0) + 1,
+               CASE WHEN decide.new_snapshot THEN NULL ELSE base.id END,
+               CASE WHEN decide.new_snapshot THEN state.data ELSE (
+                   SELECT COALESCE(jsonb_object_agg(field.key, field.value), '{{}}'::jsonb)
+                   FROM jsonb_each(state.data) AS field
+                   WHERE base.data -> field.key IS DISTINCT FROM field.value
+               ) END,
+               changes.diff
+        FROM (SELECT %s::jsonb AS data) AS state
+        LEFT JOIN LATERAL (
+            SELECT version, COALESCE(snapshot_id, id) AS base_id, data, tissue_ids FROM {table}
+            WHERE request_type = %s AND request_id = %s ORDER BY version DESC LIMIT 1
+        ) AS latest ON true
+        LEFT JOIN {table} AS base ON base.id = latest.base_id
+        CROSS JOIN LATERAL (
+            SELECT latest.version IS NULL OR latest.version + 1 - base.version >= %s AS new_snapshot
+        ) AS decide
+        CROSS JOIN LATERAL (
+            SELECT COALESCE(
+                jsonb_object_agg(field.key, jsonb_build_array(previous.state -> field.key, field.value)), '{{}}'::jsonb
+            ) AS diff
+            FROM (
+                SELECT base.data || latest.data || jsonb_build_object('tissues', to_jsonb(latest.tissue_ids)) AS state
+            ) AS previous,
+            jsonb_each(state.data || jsonb_build_object('tissues', to_jsonb(%s::integer[]))) AS field
+            WHERE latest.version IS NOT NULL AND previous.state -> field.key IS DISTINCT FROM field.value
+        ) AS changes
+        RETURNING *
+    """
+
+    # Taken in its own statement: the INSERT's snapshot must be taken after
+    # the lock is granted to see the version the previous holder committed
+    LOCK_REQUEST_SQL = 'SELECT pg_advisory_xact_lock(hashtext(%s), %s)'
+
+    @classmethod
+    def log_change(cls, request, change_type, changed_fields=None, description=None):
+        """
+        Log a change to request, as a snapshot or as the fields that differ
+        from the last one, along with the diff against the previous version.
+        changed_fields defaults to the fields in that diff. Costs a single
+        INSERT (plus reading the tissues of requests that have several,
+        unless they were prefetched) after taking the request's lock; being
+        raw SQL, it sends no pre_save/post_save signals.
+
+        The lock (see LOCK_REQUEST_SQL) makes concurrent changes to one
+        request take turns, so they cannot number the same version. It is
+        held until the surrounding transaction ends.
+        """
+        request_type = cls.request_type_of(request)
+        columns = {
+            'request_type': request_type,
+            'request_id': request.pk,
+            'change_type': change_type,
+            'changed_at': timezone.now(),
+            'description': description,
+        }
+        columns.update(cls.capture_columns(request))
+
+        quote_name = connection.ops.quote_name
+        sql = cls.LOG_CHANGE_SQL.format(
+            table=quote_name(cls._meta.db_table),
+            columns=', '.join(quote_name(cls._meta.get_field(name).column) for name in columns),
+            values=', '.join(
+                f'%s::{cls._meta.get_field(name).db_type(connection)}' for name in columns
+            ),
+        )
+        params = [
+            *columns.values(),
+            json.dumps(changed_fields) if changed_fields is not None else None,
+            json.dumps(cls.capture_state(request)),
+            request_type,
+            request.pk,
+            CHANGE_LOG_SNAPSHOT_INTERVAL,
+            columns['tissue_ids'],
+        ]
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(cls.LOCK_REQUEST_SQL, [request_type, request.pk])
+            return list(cls.objects.raw(sql, params))[0]
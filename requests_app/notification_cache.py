@@ -0,0 +1,67 @@
+"""
+Process-local cache of the notification settings and recipients consulted
+for every notification, so deciding whether and to whom to send costs no
+queries. Invalidated through the same version keys as reference_data, which
+live in the shared cache: a settings or staff change made in the web
+process reaches the other web workers with their next request and a
+long-running send_outbox_emails worker within VERSION_CHECK_INTERVAL.
+"""
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from .models import NotificationSettings, NotificationDigestSettings, Status
+from .reference_data import get_version
+
+# Models whose post_save/post_delete must bump their version (Status is
+# already bumped as reference data)
+NOTIFICATION_CACHE_MODELS = (NotificationSettings, NotificationDigestSettings, User)
+
+# name -> (versions of the models it was built from, value). Values are
+# shared between requests and must be treated as read-only.
+_entries = {}
+
+
+def _cached(name, models, build):
+    """Value from build(), rebuilt only after one of models changed"""
+    versions = tuple(get_version(model) for model in models)
+    if None in versions:
+        # No usable cache backend (e.g. DummyCache), so nothing can invalidate a stored value
+        return build()
+
+    entry = _entries.get(name)
+    if entry is None or entry[0] != versions:
+        entry = (versions, build())
+        _entries[name] = entry
+    return entry[1]
+
+
+def notification_matrix():
+    """{(request_type, status_id): notify_enabled} for every NotificationSettings row"""
+    return _cached('matrix', (NotificationSettings, Status), lambda: {
+        (request_type, status_id): enabled
+        for request_type, status_id, enabled in NotificationSettings.objects.values_list(
+            'request_type', 'status_id', 'notify_enabled'
+        )
+    })
+
+
+def is_notification_enabled(request_type, status):
+    """Whether status (a Status or its pk) notifies for request_type; disabled if there is no setting"""
+    return notification_matrix().get((request_type, getattr(status, 'pk', status)), False)
+
+
+def digest_windows():
+    """{request_type: window timedelta} for the request types in digest mode"""
+    return _cached('digest_windows', (NotificationDigestSettings,), lambda: {
+        request_type: timedelta(minutes=minutes)
+        for request_type, minutes in NotificationDigestSettings.objects.filter(
+            digest_enabled=True
+        ).values_list('request_type', 'window_minutes')
+    })
+
+
+def staff_emails():
+    """Email addresses of active staff users, who are copied on request emails"""
+    return _cached('staff_emails', (User,), lambda: tuple(
+        User.objects.filter(is_staff=True, is_active=True).exclude(email='').values_list('email', flat=True)
+    ))
@@ -0,0 +1,262 @@
+"""
+Transactional outbox for notification emails.
+
+The post_save signals only insert an EmailOutbox row, inside the transaction
+that saves the request, so a save that rolls back never produces an email and
+a slow or unreachable SMTP server never delays a web request. The
+send_outbox_emails management command delivers the rows.
+
+For request types in digest mode (NotificationDigestSettings) rows are held
+for the digest window instead, and each recipient gets one summary email
+per window listing the net change to every request they were notified about.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from .models import EmailOutbox, NotificationDigestSettings, NotificationSettings, Request, EmbeddingRequest, SectioningRequest, Status
+from .email_notifications import (
+    build_digest_message, build_request_created_message, build_status_change_message,
+    get_recipient_email, get_request_url,
+)
+from .mail_delivery import BatchMailer
+from .reference_data import SUBMITTED_STATUS, get_reference, status_id
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Request model behind each outbox request_type
+OUTBOX_MODELS = {
+    'staining': Request,
+    'embedding': EmbeddingRequest,
+    'sectioning': SectioningRequest,
+}
+OUTBOX_REQUEST_TYPES = {model: request_type for request_type, model in OUTBOX_MODELS.items()}
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_MAX_ATTEMPTS = 8
+
+# Retries wait 1, 2, 4, ... minutes, never more than an hour
+RETRY_BASE_DELAY = timedelta(minutes=1)
+RETRY_MAX_DELAY = timedelta(hours=1)
+
+
+def _request_type(instance):
+    return OUTBOX_REQUEST_TYPES[instance._meta.concrete_model]
+
+
+def enqueue(instance, **fields):
+    """
+    Insert the outbox row for an event on instance. In digest mode the row
+    joins the recipient's open digest, or opens a new one.
+    """
+    request_type = _request_type(instance)
+    window = NotificationDigestSettings.get_window(request_type)
+    if window is not None:
+        recipient = get_recipient_email(instance)
+        fields.update(digest=True, recipient=recipient, next_attempt_at=digest_due_at(recipient, window))
+    return EmailOutbox.objects.create(request_type=request_type, request_id=instance.pk, **fields)
+
+
+def enqueue_request_created(instance):
+    """Queue the 'request created' email for instance; call from post_save"""
+    return enqueue(instance, event='created', new_status_id=instance.status_id)
+
+
+def enqueue_status_change(instance, old_status_id, new_status_id):
+    """Queue the 'status changed' email for instance; call from post_save"""
+    return enqueue(instance, event='status_changed', old_status_id=old_status_id, new_status_id=new_status_id)
+
+
+def digest_due_at(recipient, window):
+    """When recipient's pending digest goes out; the first event for a recipient starts a new window"""
+    due = EmailOutbox.objects.filter(
+        state=EmailOutbox.STATE_PENDING, digest=True, recipient=recipient
+    ).order_by('next_attempt_at').values_list('next_attempt_at', flat=True).first()
+    return due or timezone.now() + window
+
+
+def retry_delay(attempts):
+    """How long to wait before the next try after attempts failed tries"""
+    return min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+
+
+def load_request(entry):
+    """The request an outbox row is about, or None if it has been deleted since"""
+    model = OUTBOX_MODELS[entry.request_type]
+    return model.objects.select_related('requestor', 'assigned_to').filter(pk=entry.request_id).first()
+
+
+def build_entry_message(entry):
+    """
+    The email for one outbox row, or None if none is due (the request is
+    gone, notifications are off or there is no recipient)
+    """
+    request = load_request(entry)
+    if request is None:
+        return None
+    if entry.event == 'created':
+        return build_request_created_message(request)
+    old_status = get_reference(Status, entry.old_status_id)
+    new_status = get_reference(Status, entry.new_status_id)
+    return build_status_change_message(request, old_status, new_status)
+
+
+def record_failure(entry, error, max_attempts):
+    """Schedule a retry for a row that could not be sent, or give up on it"""
+    entry.last_error = str(error)
+    if entry.attempts >= max_attempts:
+        entry.state = EmailOutbox.STATE_FAILED
+        logger.error(f"Giving up on outbox email #{entry.pk} after {entry.attempts} attempts: {str(error)}")
+    else:
+        entry.next_attempt_at = timezone.now() + retry_delay(entry.attempts)
+
+
+def collapse_digest(entries):
+    """
+    Reduce a recipient's digest rows to the net change per request, in the
+    order the requests were first touched: whether it was created in the
+    window and its status before the first and after the last transition.
+    Requests that ended up back where they started are left out.
+    """
+    changes = {}
+    for entry in sorted(entries, key=lambda entry: (entry.created_at, entry.pk)):
+        change = changes.setdefault((entry.request_type, entry.request_id), {
+            'created': False,
+            'old_status_id': entry.old_status_id,
+            'new_status_id': entry.new_status_id,
+            'transitions': 0,
+        })
+        if entry.event == 'created':
+            change['created'] = True
+        else:
+            change['transitions'] += 1
+        change['new_status_id'] = entry.new_status_id
+    return [
+        (key, change) for key, change in changes.items()
+        if change['created'] or change['old_status_id'] != change['new_status_id']
+    ]
+
+
+def build_digest_entries_message(recipient, entries):
+    """
+    One summary email for all of a recipient's digest rows, or None if
+    nothing in them is still worth telling (requests deleted, back in their
+    original status or with notifications off for their new status)
+    """
+    changes = collapse_digest(entries)
+
+    # Load every request in the digest with one query per request type
+    requests = {}
+    for request_type, model in OUTBOX_MODELS.items():
+        ids = [request_id for (change_type, request_id), _ in changes if change_type == request_type]
+        if ids:
+            for request in model.objects.select_related('requestor', 'assigned_to').filter(pk__in=ids):
+                requests[(request_type, request.pk)] = request
+
+    submitted_status_id = status_id(SUBMITTED_STATUS)
+    items = []
+    for key, change in changes:
+        request = requests.get(key)
+        if request is None:
+            continue
+        request_type = key[0]
+        enabled = NotificationSettings.is_notification_enabled(request_type, change['new_status_id'])
+        if change['created'] and submitted_status_id:
+            enabled = enabled or NotificationSettings.is_notification_enabled(request_type, submitted_status_id)
+        if not enabled:
+            continue
+        items.append({
+            'request': request,
+            'request_type': request_type,
+            'request_url': get_request_url(request),
+            'created': change['created'],
+            'old_status': get_reference(Status, change['old_status_id']),
+            'new_status': get_reference(Status, change['new_status_id']),
+            'transitions': change['transitions'],
+        })
+
+    if not items:
+        return None
+    return build_digest_message(recipient, items)
+
+
+def group_entries(entries):
+    """Rows sharing an email: each immediate row on its own, digest rows per recipient"""
+    groups = [[entry] for entry in entries if not entry.digest]
+    digests = {}
+    for entry in entries:
+        if entry.digest:
+            digests.setdefault(entry.recipient, []).append(entry)
+    return groups + list(digests.values())
+
+
+def _claim_due_entries(batch_size):
+    """Lock up to batch_size due rows, plus the rest of the due digest rows of any recipient among them"""
+    now = timezone.now()
+    entries = list(
+        EmailOutbox.objects.select_for_update(skip_locked=True)
+        .filter(state=EmailOutbox.STATE_PENDING, next_attempt_at__lte=now)
+        .order_by('next_attempt_at', 'id')[:batch_size]
+    )
+    recipients = {entry.recipient for entry in entries if entry.digest}
+    if recipients:
+        # A digest must go out whole, even if batch_size cut it in two
+        entries.extend(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(state=EmailOutbox.STATE_PENDING, digest=True, recipient__in=recipients, next_attempt_at__lte=now)
+            .exclude(pk__in=[entry.pk for entry in entries])
+        )
+    return entries
+
+
+def process_batch(batch_size=DEFAULT_BATCH_SIZE, max_attempts=DEFAULT_MAX_ATTEMPTS, mailer=None):
+    """
+    Claim up to batch_size due rows and try to deliver them. Rows are locked
+    with SELECT ... FOR UPDATE SKIP LOCKED, so several workers can run at once
+    without sending an email twice. The emails go out together over the
+    mailer's connection; pass the same BatchMailer to every call to keep one
+    connection open across batches. Returns the number of rows processed.
+    """
+    if mailer is None:
+        with BatchMailer() as mailer:
+            return process_batch(batch_size, max_attempts, mailer)
+
+    with transaction.atomic():
+        entries = _claim_due_entries(batch_size)
+
+        # (rows, email) pairs; a digest email covers several rows
+        outgoing = []
+        for rows in group_entries(entries):
+            for entry in rows:
+                entry.attempts += 1
+            try:
+                if rows[0].digest:
+                    message = build_digest_entries_message(rows[0].recipient, rows)
+                else:
+                    message = build_entry_message(rows[0])
+            except Exception as e:
+                for entry in rows:
+                    record_failure(entry, e, max_attempts)
+                continue
+            if message is None:
+                for entry in rows:
+                    entry.state = EmailOutbox.STATE_SKIPPED
+                    entry.sent_at = timezone.now()
+            else:
+                outgoing.append((rows, message))
+
+        errors = mailer.send_batch([message for _, message in outgoing])
+        for (rows, _), error in zip(outgoing, errors):
+            for entry in rows:
+                if error is None:
+                    entry.state = EmailOutbox.STATE_SENT
+                    entry.sent_at = timezone.now()
+                    entry.last_error = None
+                else:
+                    record_failure(entry, error, max_attempts)
+
+        EmailOutbox.objects.bulk_update(
+            entries, ['state', 'attempts', 'next_attempt_at', 'last_error', 'sent_at']
+        )
+    return len(entries)
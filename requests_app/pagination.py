@@ -0,0 +1,134 @@
+"""
+Keyset (cursor) pagination for the request queues
+"""
+from django.core import signing
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+CURSOR_SALT = 'requests_app.pagination.cursor'
+
+# Sorts that can be paginated by seeking on (field, pk) instead of OFFSET
+KEYSET_SORT_FIELDS = ('created_at', 'status_timestamp')
+
+
+def encode_cursor(value, pk, direction):
+    """Build an opaque, signed token pointing before/after the given row"""
+    return signing.dumps([value.isoformat() if value else None, pk, direction], salt=CURSOR_SALT)
+
+
+def decode_cursor(token):
+    """Return (value, pk, direction) for a token, or None if it is missing or tampered with"""
+    if not token:
+        return None
+    try:
+        value, pk, direction = signing.loads(token, salt=CURSOR_SALT)
+    except (signing.BadSignature, ValueError, TypeError):
+        return None
+    if direction not in ('next', 'prev', 'last'):
+        return None
+    return (parse_datetime(value) if value else None), pk, direction
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset, with cursors to its neighbours"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, last_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.last_cursor = last_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def paginate_keyset(queryset, sort_by, token, page_size):
+    """
+    Return the KeysetPage of queryset for the given cursor token.
+
+    sort_by is one of KEYSET_SORT_FIELDS, optionally prefixed with '-'. Rows are
+    ordered by (sort field, pk) so ties on the timestamp stay stable, and each
+    page is a bounded index seek, so page N costs the same as page 1.
+    """
+    descending = sort_by.startswith('-')
+    field = sort_by.lstrip('-')
+    cursor = decode_cursor(token)
+    direction = cursor[2] if cursor else 'next'
+    backwards = direction in ('prev', 'last')
+
+    if cursor and direction != 'last':
+        value, pk = cursor[0], cursor[1]
+        # Walking backwards through a descending list seeks towards larger values
+        if descending != backwards:
+            queryset = queryset.filter(**{f'{field}__lte': value}).filter(
+                Q(**{f'{field}__lt': value}) | Q(pk__lt=pk)
+            )
+        else:
+            queryset = queryset.filter(**{f'{field}__gte': value}).filter(
+                Q(**{f'{field}__gt': value}) | Q(pk__gt=pk)
+            )
+
+    if descending != backwards:
+        ordering = [f'-{field}', '-pk']
+    else:
+        ordering = [field, 'pk']
+
+    rows = list(queryset.order_by(*ordering)[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    if backwards:
+        has_next = direction == 'prev'
+        has_previous = has_more
+    else:
+        has_next = has_more
+        has_previous = cursor is not None
+
+    next_cursor = None
+    previous_cursor = None
+    if rows and has_next:
+        next_cursor = encode_cursor(getattr(rows[-1], field), rows[-1].pk, 'next')
+    if rows and has_previous:
+        previous_cursor = encode_cursor(getattr(rows[0], field), rows[0].pk, 'prev')
+    last_cursor = encode_cursor(None, None, 'last') if has_next else None
+
+    return KeysetPage(rows, next_cursor, previous_cursor, last_cursor)
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin that uses cursor pagination whenever the active sort is
+    keyset-capable, and falls back to Django's page-number pagination otherwise.
+    """
+    cursor_param = 'cursor'
+    default_sort = '-created_at'
+
+    def get_sort(self):
+        return self.request.GET.get('sort', self.default_sort)
+
+    def paginate_queryset(self, queryset, page_size):
+        sort_by = self.get_sort()
+        if sort_by.lstrip('-') not in KEYSET_SORT_FIELDS:
+            return super().paginate_queryset(queryset, page_size)
+
+        page = paginate_keyset(queryset, sort_by, self.request.GET.get(self.cursor_param), page_size)
+        return (None, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['cursor_pagination'] = isinstance(context.get('page_obj'), KeysetPage)
+        return context
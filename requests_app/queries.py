@@ -0,0 +1,86 @@
+"""
+Query shaping for request list, search and delete views
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, Prefetch
+from .models import Request, EmbeddingRequest, SectioningRequest, Tissue, SEARCH_CONFIG
+
+
+# Columns and relations read by the request table templates, per request model.
+# Every relation listed in 'only' must also be in 'select_related', otherwise
+# Django raises when the queryset is evaluated.
+REQUEST_LIST_SHAPES = {
+    Request: {
+        'select_related': ['requestor', 'antibody', 'probe', 'study', 'tissue', 'status', 'priority', 'assigned_to'],
+        'prefetch_related': [],
+        'only': [
+            'key', 'data', 'description', 'special_request', 'request_type',
+            'status_timestamp', 'created_at',
+            'requestor__name',
+            'antibody__name', 'antibody__description',
+            'probe__name', 'probe__description',
+            'study__study_id', 'study__title',
+            'tissue__name',
+            'status__status',
+            'priority__value', 'priority__label',
+            'assigned_to__name',
+        ],
+    },
+    EmbeddingRequest: {
+        'select_related': ['requestor', 'study', 'status', 'assigned_to'],
+        'prefetch_related': ['tissues'],
+        'only': [
+            'key', 'special_request', 'number_of_animals', 'take_down_date', 'currently_in',
+            'date_of_xylene_etoh_change', 'length_of_time_in_etoh',
+            'status_timestamp', 'created_at',
+            'requestor__name',
+            'study__study_id', 'study__title',
+            'status__status',
+            'assigned_to__name',
+        ],
+    },
+    SectioningRequest: {
+        'select_related': ['requestor', 'study', 'status', 'assigned_to'],
+        'prefetch_related': ['tissues'],
+        'only': [
+            'key', 'special_request', 'cut_surface_down', 'other', 'sections_per_slide',
+            'slides_per_block', 'for_what',
+            'status_timestamp', 'created_at',
+            'requestor__name',
+            'study__study_id', 'study__title',
+            'status__status',
+            'assigned_to__name',
+        ],
+    },
+}
+
+
+def shape_request_list(queryset):
+    """
+    Apply the list shape for the queryset's request type so that rendering a
+    page costs a fixed number of queries regardless of page size.
+
+    Works for StainingRequest as well, since it is a proxy of Request.
+    """
+    shape = REQUEST_LIST_SHAPES[queryset.model._meta.concrete_model]
+
+    queryset = queryset.select_related(*shape['select_related'])
+    for lookup in shape['prefetch_related']:
+        # Only the tissue name is rendered, so keep the prefetched rows narrow
+        queryset = queryset.prefetch_related(
+            Prefetch(lookup, queryset=Tissue.objects.only('key', 'name').order_by('name'))
+        )
+    return queryset.only(*shape['only'])
+
+
+def keyword_search(queryset, text):
+    """
+    Filter a request queryset by the indexed search_vector and order it by
+    relevance, newest first among equally ranked rows.
+
+    Accepts web-search syntax: quoted phrases, 'or' and -excluded words.
+    """
+    query = SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+    return queryset.filter(search_vector=query).annotate(
+        rank=SearchRank(F('search_vector'), query)
+    ).order_by('-rank', '-created_at')
@@ -0,0 +1,213 @@
+"""
+Process-local cache of the reference data lists shown in forms and views, and
+of the canonical statuses and priorities the code looks up by name. Each list
+is checked against a version kept in the shared 'reference_data' cache
+(settings.CACHES), so a change made by any process invalidates it everywhere.
+"""
+import time
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.core.signals import request_started
+from django.db import transaction
+from django.dispatch import receiver
+from .models import Tissue, Assignee, Status, Priority, Study, Antibody, Probe, Requestor
+
+# Order each list is cached in, matching what the forms and views display
+REFERENCE_ORDERING = {
+    Tissue: 'name',
+    Assignee: 'name',
+    Status: 'status',
+    Priority: 'value',
+    Study: 'study_id',
+    Antibody: 'name',
+    Probe: 'name',
+    Requestor: 'name',
+}
+
+# Cache alias the versions live in; it must be shared by all processes
+VERSION_CACHE = 'reference_data'
+VERSION_KEY_PREFIX = 'reference_data_version:'
+
+# The versions are read from the shared cache once per web request, all of
+# them with one query, and trusted for the rest of it. Outside requests
+# (management commands) they are trusted for this many seconds. Changes
+# made by this process are seen at once.
+VERSION_CHECK_INTERVAL = 1.0
+
+# Canonical rows the code refers to by name
+SUBMITTED_STATUS = 'Submitted'
+COMPLETE_STATUS = 'Complete'
+DEFAULT_PRIORITY_VALUE = 3
+DEFAULT_PRIORITY_LABEL = '3 - Medium'
+
+# model -> (version, rows). Rows are shared between requests and must be
+# treated as read-only.
+_lists = {}
+
+# model -> (rows, {pk: row}) for the cached list the index was built from
+_indexes = {}
+
+# (model, lookup) -> (version, pk) for the canonical statuses and priorities
+_canonical_pks = {}
+
+# model -> version, as last read from the shared cache
+_versions = {}
+
+# time.monotonic() when _versions was last read; None to read it again on
+# the next lookup
+_checked_at = None
+
+
+def _version_key(model):
+    return VERSION_KEY_PREFIX + model._meta.label_lower
+
+
+@receiver(request_started)
+def check_versions_again(**kwargs):
+    """Read the versions again in each request, so it sees every change committed before it started"""
+    global _checked_at
+    _checked_at = None
+
+
+def _read_versions(models):
+    """Read the versions of models from the shared cache with one query, starting those that have none"""
+    cache = caches[VERSION_CACHE]
+    keys = {_version_key(model): model for model in models}
+    found = cache.get_many(list(keys))
+    for key, model in keys.items():
+        version = found.get(key)
+        if version is None:
+            cache.add(key, uuid4().hex, timeout=None)
+            version = cache.get(key)
+        if version is None:
+            _versions.pop(model, None)
+        else:
+            _versions[model] = version
+
+
+def get_version(model):
+    """
+    Current version of a model's list. Versions live in the 'reference_data'
+    cache, which settings configures as a database cache shared by all
+    processes, so a change made by one process (a web worker, an import job)
+    also invalidates the lists held by every other one. Whenever they are
+    due (see VERSION_CHECK_INTERVAL), the versions of every model looked up
+    so far are read together.
+    """
+    global _checked_at
+    now = time.monotonic()
+    if _checked_at is None or now - _checked_at >= VERSION_CHECK_INTERVAL:
+        _read_versions({*_versions, model})
+        _checked_at = now
+    elif model not in _versions:
+        _read_versions([model])
+    return _versions.get(model)
+
+
+def bump_version(model):
+    """
+    Invalidate the cached list for model; called from the post_save/post_delete
+    signals. Inside a transaction the version changes once, on commit, however
+    many rows were saved or deleted: each change costs several queries on the
+    database cache. A bump queued in a savepoint that is still open does not
+    count, as rolling the savepoint back drops it.
+    """
+    connection = transaction.get_connection()
+    if connection.in_atomic_block and any(
+        getattr(func, 'bumps_version_of', None) is model and set(sids) <= set(connection.savepoint_ids)
+        for sids, func, _ in connection.run_on_commit
+    ):
+        return
+
+    def bump():
+        version = uuid4().hex
+        caches[VERSION_CACHE].set(_version_key(model), version, timeout=None)
+        _versions[model] = version
+    bump.bumps_version_of = model
+    transaction.on_commit(bump)
+
+
+def reference_list(model):
+    """All rows of a reference model in display order, queried only when the list changed"""
+    queryset = model.objects.order_by(REFERENCE_ORDERING[model])
+    version = get_version(model)
+    if version is None:
+        # No usable cache backend (e.g. DummyCache), so nothing can invalidate a stored list
+        return tuple(queryset)
+
+    entry = _lists.get(model)
+    if entry is None or entry[0] != version:
+        entry = (version, tuple(queryset))
+        _lists[model] = entry
+    return entry[1]
+
+
+def get_reference(model, pk):
+    """One row of a reference model by primary key, from the cached list when possible"""
+    if pk is None:
+        return None
+    rows = reference_list(model)
+    entry = _indexes.get(model)
+    if entry is None or entry[0] is not rows:
+        entry = (rows, {row.pk: row for row in rows})
+        _indexes[model] = entry
+    row = entry[1].get(pk)
+    if row is None:
+        row = model.objects.filter(pk=pk).first()
+    return row
+
+
+def active_list(model):
+    """Rows of an archivable model (antibodies, probes, studies) that are not archived"""
+    return [row for row in reference_list(model) if not row.archived]
+
+
+def selectable_statuses():
+    """Statuses offered when editing or filtering requests; 'submitted' is set automatically"""
+    return [status for status in reference_list(Status) if status.status != 'submitted']
+
+
+def use_cached_choices(field, rows):
+    """
+    Give a ModelChoiceField its choices from cached rows so rendering it runs
+    no query. Submitted values are still validated against field.queryset.
+    """
+    choices = [] if field.empty_label is None else [('', field.empty_label)]
+    choices.extend((row.pk, field.label_from_instance(row)) for row in rows)
+    field.choices = choices
+
+
+def _canonical_pk(model, lookup, create_defaults=None):
+    """
+    Primary key of the row matching lookup, or None if there is none. When
+    create_defaults is given the row is created if missing. Resolved once per
+    process and again only after the model's version changes.
+    """
+    version = get_version(model)
+    key = (model, tuple(sorted(lookup.items())))
+    entry = _canonical_pks.get(key)
+    if entry is not None and version is not None and entry[0] == version:
+        return entry[1]
+
+    if create_defaults is None:
+        pk = model.objects.filter(**lookup).values_list('pk', flat=True).first()
+    else:
+        pk = model.objects.get_or_create(**lookup, defaults=create_defaults)[0].pk
+    _canonical_pks[key] = (version, pk)
+    return pk
+
+
+def status_id(name):
+    """Primary key of the status called name, or None if it does not exist"""
+    return _canonical_pk(Status, {'status': name})
+
+
+def default_status_id():
+    """Primary key of the status new requests start in, created if missing"""
+    return _canonical_pk(Status, {'status': SUBMITTED_STATUS}, create_defaults={})
+
+
+def default_priority_id():
+    """Primary key of the priority new staining requests get, created if missing"""
+    return _canonical_pk(Priority, {'value': DEFAULT_PRIORITY_VALUE}, create_defaults={'label': DEFAULT_PRIORITY_LABEL})
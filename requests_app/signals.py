@@ -1,130 +1,111 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Request, EmbeddingRequest, SectioningRequest, Status
-from .email_notifications import send_request_created_notification, send_status_change_notification
+from .models import Request, EmbeddingRequest, SectioningRequest, RequestChangeLog, Status
+from .outbox import enqueue_request_created, enqueue_status_change
+from .reference_data import REFERENCE_ORDERING, bump_version, get_reference
+from .notification_cache import NOTIFICATION_CACHE_MODELS
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Store original status for comparison
-_original_status = {}
-
-@receiver(pre_save, sender=Request)
-def store_original_status_request(sender, instance, **kwargs):
-    """Store the original status before saving"""
-    if instance.pk:
-        try:
-            original = Request.objects.get(pk=instance.pk)
-            _original_status[instance.pk] = original.status
-        except Request.DoesNotExist:
-            _original_status[instance.pk] = None
+def status_was_saved(instance, created, update_fields):
+    """True if this save wrote a different status; compares against the tracked value, so it runs no query"""
+    if created:
+        return False
+    if update_fields is not None and 'status' not in update_fields and 'status_id' not in update_fields:
+        return False
+    return instance.has_changed('status')
 
 @receiver(post_save, sender=Request)
 def request_created_handler(sender, instance, created, **kwargs):
     """
-    Send email notification when a new request is created
+    Queue an email notification when a new request is created
     """
     if created:
         logger.info(f"New request created: #{instance.key}")
-        try:
-            send_request_created_notification(instance)
-        except Exception as e:
-            logger.error(f"Failed to send creation email for request #{instance.key}: {str(e)}")
+        enqueue_request_created(instance)
 
 @receiver(post_save, sender=Request)
-def request_status_changed_handler(sender, instance, **kwargs):
+def request_status_changed_handler(sender, instance, created, update_fields=None, **kwargs):
     """
-    Send email notification when a request status changes
+    Queue an email notification when a request status changes
     """
-    if instance.pk in _original_status:
-        old_status = _original_status[instance.pk]
-        new_status = instance.status
-        
-        # Only send notification if status actually changed
-        if old_status != new_status and old_status is not None:
-            logger.info(f"Request #{instance.key} status changed from {old_status} to {new_status}")
-            try:
-                send_status_change_notification(instance, old_status, new_status)
-            except Exception as e:
-                logger.error(f"Failed to send status change email for request #{instance.key}: {str(e)}")
-        
-        # Clean up
-        del _original_status[instance.pk]
+    # Only send notification if status actually changed since the request was loaded
+    if status_was_saved(instance, created, update_fields):
+        old_status = get_reference(Status, instance.get_old_value('status'))
+        new_status = get_reference(Status, instance.status_id)
+        logger.info(f"Request #{instance.key} status changed from {old_status} to {new_status}")
+        enqueue_status_change(instance, instance.get_old_value('status'), instance.status_id)
 
 # Embedding Request Signals
-@receiver(pre_save, sender=EmbeddingRequest)
-def store_original_status_embedding(sender, instance, **kwargs):
-    """Store the original status before saving"""
-    if instance.pk:
-        try:
-            original = EmbeddingRequest.objects.get(pk=instance.pk)
-            _original_status[instance.pk] = original.status
-        except EmbeddingRequest.DoesNotExist:
-            _original_status[instance.pk] = None
-
 @receiver(post_save, sender=EmbeddingRequest)
 def embedding_request_created_handler(sender, instance, created, **kwargs):
-    """Send email notification when a new embedding request is created"""
+    """Queue an email notification when a new embedding request is created"""
     if created:
         logger.info(f"New embedding request created: #{instance.key}")
-        try:
-            send_request_created_notification(instance)
-        except Exception as e:
-            logger.error(f"Failed to send creation email for embedding request #{instance.key}: {str(e)}")
+        enqueue_request_created(instance)
 
 @receiver(post_save, sender=EmbeddingRequest)
-def embedding_request_status_changed_handler(sender, instance, **kwargs):
-    """Send email notification when embedding request status changes"""
-    if instance.pk in _original_status:
-        old_status = _original_status[instance.pk]
-        new_status = instance.status
-        
-        if old_status != new_status and old_status is not None:
-            logger.info(f"Embedding request #{instance.key} status changed from {old_status} to {new_status}")
-            try:
-                send_status_change_notification(instance, old_status, new_status)
-            except Exception as e:
-                logger.error(f"Failed to send status change email for embedding request #{instance.key}: {str(e)}")
-        
-        del _original_status[instance.pk]
+def embedding_request_status_changed_handler(sender, instance, created, update_fields=None, **kwargs):
+    """Queue an email notification when embedding request status changes"""
+    if status_was_saved(instance, created, update_fields):
+        old_status = get_reference(Status, instance.get_old_value('status'))
+        new_status = get_reference(Status, instance.status_id)
+        logger.info(f"Embedding request #{instance.key} status changed from {old_status} to {new_status}")
+        enqueue_status_change(instance, instance.get_old_value('status'), instance.status_id)
 
 # Sectioning Request Signals
-@receiver(pre_save, sender=SectioningRequest)
-def store_original_status_sectioning(sender, instance, **kwargs):
-    """Store the original status before saving"""
-    if instance.pk:
-        try:
-            original = SectioningRequest.objects.get(pk=instance.pk)
-            _original_status[instance.pk] = original.status
-        except SectioningRequest.DoesNotExist:
-            _original_status[instance.pk] = None
-
 @receiver(post_save, sender=SectioningRequest)
 def sectioning_request_created_handler(sender, instance, created, **kwargs):
-    """Send email notification when a new sectioning request is created"""
+    """Queue an email notification when a new sectioning request is created"""
     if created:
         logger.info(f"New sectioning request created: #{instance.key}")
-        try:
-            send_request_created_notification(instance)
-        except Exception as e:
-            logger.error(f"Failed to send creation email for sectioning request #{instance.key}: {str(e)}")
+        enqueue_request_created(instance)
 
 @receiver(post_save, sender=SectioningRequest)
-def sectioning_request_status_changed_handler(sender, instance, **kwargs):
-    """Send email notification when sectioning request status changes"""
-    if instance.pk in _original_status:
-        old_status = _original_status[instance.pk]
-        new_status = instance.status
-        
-        if old_status != new_status and old_status is not None:
-            logger.info(f"Sectioning request #{instance.key} status changed from {old_status} to {new_status}")
-            try:
-                send_status_change_notification(instance, old_status, new_status)
-            except Exception as e:
-                logger.error(f"Failed to send status change email for sectioning request #{instance.key}: {str(e)}")
-        
-        del _original_status[instance.pk]
+def sectioning_request_status_changed_handler(sender, instance, created, update_fields=None, **kwargs):
+    """Queue an email notification when sectioning request status changes"""
+    if status_was_saved(instance, created, update_fields):
+        old_status = get_reference(Status, instance.get_old_value('status'))
+        new_status = get_reference(Status, instance.status_id)
+        logger.info(f"Sectioning request #{instance.key} status changed from {old_status} to {new_status}")
+        enqueue_status_change(instance, instance.get_old_value('status'), instance.status_id)
+
+# Change Log Signals
+@receiver(pre_delete)
+def request_deleted_handler(sender, instance, **kwargs):
+    """
+    Log the deletion of a request of any type, however it is deleted (delete
+    views, the admin, cascades from a study or requestor). Logged before the
+    delete, in its transaction, while the tissues of the request can still be
+    read; the change log keeps the history once the request is gone.
+    """
+    if sender._meta.concrete_model not in RequestChangeLog.REQUEST_TYPES:
+        return
+    request_type = RequestChangeLog.request_type_of(instance)
+    RequestChangeLog.log_change(
+        request=instance,
+        change_type='deleted',
+        description=f'{request_type.capitalize()} request deleted',
+    )
+
+# Reference Data Signals
+@receiver([post_save, post_delete])
+def reference_data_changed_handler(sender, **kwargs):
+    """Invalidate the cached list when a tissue, status, antibody or other reference row changes"""
+    if sender in REFERENCE_ORDERING:
+        bump_version(sender)
+
+@receiver([post_save, post_delete])
+def notification_settings_changed_handler(sender, update_fields=None, **kwargs):
+    """Invalidate the cached notification matrix, digest windows or staff recipients"""
+    if sender not in NOTIFICATION_CACHE_MODELS:
+        return
+    # Logging in only updates last_login, which doesn't affect who gets emails
+    if sender is User and update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    bump_version(sender)
 
 def send_test_notification():
     """
@@ -136,61 +136,92 @@ function hideSearchInterface(select, searchInput, optionsContainer, dropdownCont
     updateSelectDisplay(select);
 }
 
+// Wait this long after the last keystroke before asking the server for matches
+const AUTOCOMPLETE_DELAY_MS = 200;
+
 function filterOptions(select, container, searchTerm) {
-    container.innerHTML = '';
+    // Reference data selects only hold their selected value; matches come from the server
+    if (select.dataset.autocompleteUrl) {
+        fetchOptions(select, container, searchTerm);
+        return;
+    }
     
-    const options = select.querySelectorAll('option');
     const term = searchTerm.toLowerCase();
-    let hasVisibleOptions = false;
-    
-    options.forEach(option => {
-        const text = option.textContent.toLowerCase();
-        if (text.includes(term)) {
-            const optionDiv = document.createElement('div');
-            optionDiv.className = 'searchable-dropdown-option';
-            optionDiv.textContent = option.textContent;
-            optionDiv.dataset.value = option.value;
-            
-            // Highlight if this is the currently selected option
-            if (option.selected) {
-                optionDiv.classList.add('selected');
-            }
-            
-            optionDiv.addEventListener('click', function() {
-                console.log('Option clicked:', this.dataset.value, this.textContent);
-                
-                // Set the select value
-                select.value = this.dataset.value;
-                console.log('Select value set to:', select.value);
-                
-                // Update the select to show the selected option
-                const selectedOption = select.querySelector(`option[value="${this.dataset.value}"]`);
-                if (selectedOption) {
-                    selectedOption.selected = true;
+    const choices = Array.from(select.querySelectorAll('option'))
+        .filter(option => option.textContent.toLowerCase().includes(term))
+        .map(option => ({ value: option.value, text: option.textContent }));
+    renderOptions(select, container, choices);
+}
+
+function fetchOptions(select, container, searchTerm) {
+    clearTimeout(select.autocompleteTimer);
+    select.autocompleteTimer = setTimeout(() => {
+        // Drop any slower response for an older search term
+        if (select.autocompleteController) {
+            select.autocompleteController.abort();
+        }
+        const controller = new AbortController();
+        select.autocompleteController = controller;
+        
+        const url = new URL(select.dataset.autocompleteUrl, window.location.origin);
+        url.searchParams.set('q', searchTerm);
+        
+        fetch(url, { signal: controller.signal, headers: { 'Accept': 'application/json' } })
+            .then(response => response.json())
+            .then(data => {
+                const choices = data.results.map(result => ({ value: String(result.id), text: result.text }));
+                // Offer the empty choice so the selection can be cleared
+                const emptyOption = select.querySelector('option[value=""]');
+                if (emptyOption && !searchTerm) {
+                    choices.unshift({ value: '', text: emptyOption.textContent });
+                }
+                renderOptions(select, container, choices);
+            })
+            .catch(error => {
+                if (error.name !== 'AbortError') {
+                    console.error('Error fetching options for', select.name, error);
                 }
-                
-                // Trigger change event
-                select.dispatchEvent(new Event('change'));
-                console.log('Change event triggered');
-                
-                // Hide search interface
-                hideSearchInterface(select, 
-                    container.parentElement.querySelector('.searchable-dropdown-input'),
-                    container, 
-                    container.parentElement);
             });
+    }, searchTerm ? AUTOCOMPLETE_DELAY_MS : 0);
+}
+
+function renderOptions(select, container, choices) {
+    container.innerHTML = '';
+    
+    choices.forEach(choice => {
+        const optionDiv = document.createElement('div');
+        optionDiv.className = 'searchable-dropdown-option';
+        optionDiv.textContent = choice.text;
+        optionDiv.dataset.value = choice.value;
+        
+        // Highlight if this is the currently selected option
+        if (choice.value === select.value) {
+            optionDiv.classList.add('selected');
+        }
+        
+        optionDiv.addEventListener('click', function() {
+            console.log('Option clicked:', this.dataset.value, this.textContent);
+            setSelectValue(select, this.dataset.value, this.textContent);
             
-            optionDiv.addEventListener('mouseenter', function() {
-                container.querySelectorAll('.searchable-dropdown-option').forEach(opt => opt.classList.remove('hover'));
-                this.classList.add('hover');
-            });
+            // Trigger change event
+            select.dispatchEvent(new Event('change'));
             
-            container.appendChild(optionDiv);
-            hasVisibleOptions = true;
-        }
+            // Hide search interface
+            hideSearchInterface(select, 
+                container.parentElement.querySelector('.searchable-dropdown-input'),
+                container, 
+                container.parentElement);
+        });
+        
+        optionDiv.addEventListener('mouseenter', function() {
+            container.querySelectorAll('.searchable-dropdown-option').forEach(opt => opt.classList.remove('hover'));
+            this.classList.add('hover');
+        });
+        
+        container.appendChild(optionDiv);
     });
     
-    if (!hasVisibleOptions) {
+    if (!choices.length) {
         const noResults = document.createElement('div');
         noResults.className = 'searchable-dropdown-option text-muted';
         noResults.textContent = 'No matches found';
@@ -198,6 +229,31 @@ function filterOptions(select, container, searchTerm) {
     }
 }
 
+function setSelectValue(select, value, text) {
+    let selectedOption = Array.from(select.options).find(option => option.value === value);
+    
+    if (select.dataset.autocompleteUrl) {
+        // Keep only the empty choice and the new selection in the page
+        Array.from(select.options).forEach(option => {
+            if (option.value !== '' && option !== selectedOption) {
+                option.remove();
+            }
+        });
+        if (!selectedOption) {
+            selectedOption = document.createElement('option');
+            selectedOption.value = value;
+            selectedOption.textContent = text;
+            select.appendChild(selectedOption);
+        }
+    }
+    
+    select.value = value;
+    if (selectedOption) {
+        selectedOption.selected = true;
+    }
+    console.log('Select value set to:', select.value);
+}
+
 function handleKeyboardNavigation(e, container, select, searchInput, dropdownContainer) {
     const visibleOptions = Array.from(container.querySelectorAll('.searchable-dropdown-option')).filter(option => 
         !option.classList.contains('text-muted')
@@ -1,3 +1,1400 @@
-from django.test import TestCase
+import importlib
+import io
+import re
+import shutil
+import tempfile
+import zipfile
+from datetime import date, timedelta
+from smtplib import SMTPException, SMTPRecipientsRefused, SMTPServerDisconnected
+from unittest import mock
+from xml.etree import ElementTree
 
-# Create your tests here.
+import openpyxl
+import pandas as pd
+
+from django.contrib.auth.models import User
+from django.core import mail, signing
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.signals import request_started
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import imports, notification_cache, outbox, reference_data, views
+from .forms import RequestEditForm
+from .lookups import fuzzy_lookup
+from .mail_delivery import BatchMailer
+from .models import (
+    CHANGE_LOG_SNAPSHOT_INTERVAL, Antibody, Assignee, EmailOutbox, EmbeddingRequest, ImportJob,
+    NotificationDigestSettings, NotificationSettings, Priority, Probe, Request, RequestChangeLog, Requestor,
+    SectioningRequest, Status, Study, Tissue,
+)
+from .pagination import CURSOR_SALT, encode_cursor, paginate_keyset
+from .queries import keyword_search
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        status = Status.objects.create(status='Submitted')
+        priority = Priority.objects.create(value=3, label='3 - Medium')
+        requestor = Requestor.objects.create(name='Requestor')
+        study = Study.objects.create(study_id='S-1', title='Study 1')
+        antibody = Antibody.objects.create(name='CD3', description='', antigen='CD3', species='Rabbit', recognizes='Human', vendor='Vendor')
+        tissue = Tissue.objects.create(name='Liver')
+        start = timezone.now()
+        # Three requests share a timestamp, so pages have to break ties on the key
+        for minutes in [0, 1, 1, 1, 2, 3]:
+            Request.objects.create(
+                requestor=requestor, study=study, tissue=tissue, antibody=antibody, status=status, priority=priority,
+                data={}, status_timestamp=start + timedelta(minutes=minutes),
+            )
+
+    def walk(self, sort_by, direction='next', token=None):
+        """The pks of every page from token on, following direction's cursors"""
+        pages = []
+        while True:
+            page = paginate_keyset(Request.objects.all(), sort_by, token, 2)
+            pages.append([request.pk for request in page])
+            token = page.next_cursor if direction == 'next' else page.previous_cursor
+            if token is None:
+                return pages
+
+    def test_pages_follow_sort_order(self):
+        for sort_by in ['-status_timestamp', 'status_timestamp', '-created_at']:
+            with self.subTest(sort_by=sort_by):
+                ordering = [sort_by, '-pk' if sort_by.startswith('-') else 'pk']
+                expected = list(Request.objects.order_by(*ordering).values_list('pk', flat=True))
+                self.assertEqual(self.walk(sort_by), [expected[0:2], expected[2:4], expected[4:6]])
+
+                first = paginate_keyset(Request.objects.all(), sort_by, None, 2)
+                last = paginate_keyset(Request.objects.all(), sort_by, first.last_cursor, 2)
+                self.assertEqual([request.pk for request in last], expected[4:6])
+                self.assertFalse(last.has_next())
+                self.assertEqual(self.walk(sort_by, 'previous', last.previous_cursor), [expected[2:4], expected[0:2]])
+
+    def test_bad_cursor_shows_first_page(self):
+        token = encode_cursor(timezone.now(), 1, 'next')
+        for bad in [token[:-2] + 'xx', signing.dumps(['2024-01-01T00:00:00', 1, 'sideways'], salt=CURSOR_SALT)]:
+            page = paginate_keyset(Request.objects.all(), '-created_at', bad, 2)
+            self.assertFalse(page.has_previous())
+            self.assertEqual(len(page), 2)
+
+    def test_queue_view(self):
+        with mock.patch.object(views.StainingRequestsView, 'paginate_by', 4):
+            response = self.client.get(reverse('staining_requests'), {'sort': '-status_timestamp'})
+            self.assertTrue(response.context['cursor_pagination'])
+            response = self.client.get(reverse('staining_requests'), {'sort': '-status_timestamp', 'cursor': response.context['page_obj'].next_cursor})
+            self.assertEqual(len(response.context['requests']), 2)
+            self.assertTrue(response.context['page_obj'].has_previous())
+
+            # Other sorts keep page numbers
+            response = self.client.get(reverse('staining_requests'), {'sort': 'priority', 'page': 2})
+            self.assertFalse(response.context['cursor_pagination'])
+            self.assertEqual(response.context['page_obj'].number, 2)
+
+
+class KeywordSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        status = Status.objects.create(status='Submitted')
+        priority = Priority.objects.create(value=3, label='3 - Medium')
+        requestor = Requestor.objects.create(name='Requestor')
+        study = Study.objects.create(study_id='S-1', title='Study 1')
+        antibody = Antibody.objects.create(name='CD3', description='', antigen='CD3', species='Rabbit', recognizes='Human', vendor='Vendor')
+        tissue = Tissue.objects.create(name='Liver')
+        fields = dict(requestor=requestor, study=study, tissue=tissue, antibody=antibody, status=status, priority=priority, data={})
+        cls.in_notes = Request.objects.create(notes='Stain the kidney sections', **fields)
+        cls.in_description = Request.objects.create(description='Kidney panel', **fields)
+        cls.frozen = Request.objects.create(description='Frozen kidney panel', special_request='Keep frozen', **fields)
+        cls.other = Request.objects.create(description='Liver panel', **fields)
+
+    def search(self, text):
+        return [request.pk for request in keyword_search(Request.objects.all(), text)]
+
+    def test_ranks_by_field_weight(self):
+        self.assertEqual(self.search('kidneys'), [self.frozen.pk, self.in_description.pk, self.in_notes.pk])
+
+    def test_web_search_syntax(self):
+        self.assertEqual(self.search('kidney -frozen'), [self.in_description.pk, self.in_notes.pk])
+        self.assertEqual(self.search('"kidney panel"'), [self.frozen.pk, self.in_description.pk])
+        self.assertEqual(sorted(self.search('frozen or liver')), [self.frozen.pk, self.other.pk])
+
+    def test_search_view(self):
+        response = self.client.get(reverse('staining_request_search'), {'q': 'kidney -frozen'})
+        self.assertEqual([request.pk for request in response.context['requests']], [self.in_description.pk, self.in_notes.pk])
+
+
+class ExplainQueriesTests(TestCase):
+    def test_views_use_indexes(self):
+        Status.objects.create(status='Submitted')
+        out = io.StringIO()
+        call_command('explain_queries', '--force-index', '--fail-on-seq-scan', stdout=out)
+        self.assertIn('staining current: OK', out.getvalue())
+
+    def test_reports_seq_scans(self):
+        plan = 'Limit\n  ->  Seq Scan on requests_app_request'
+        with mock.patch('django.db.models.query.QuerySet.explain', return_value=plan):
+            out = io.StringIO()
+            with self.assertRaisesMessage(CommandError, 'Sequential scans found in: staining list'):
+                call_command('explain_queries', '--fail-on-seq-scan', stdout=out)
+        self.assertIn('staining list: seq scan on requests_app_request', out.getvalue())
+
+
+def create_antibody(name, **fields):
+    return Antibody.objects.create(
+        name=name, description='', antigen=name, species='Rabbit', recognizes='Human', vendor='Vendor', **fields,
+    )
+
+
+def require_trigrams(test):
+    # The trigram operators come from pg_trgm, which not every server has
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            test.skipTest('pg_trgm is not installed')
+
+
+class FuzzyLookupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.vimentin = create_antibody('Vimentin')
+        cls.old_vimentin = create_antibody('Vimentin (old lot)', archived=True)
+        create_antibody('CD3')
+        cls.probe = Probe.objects.create(name='Hs-PR-1', target_gene='GAPDH')
+
+    def test_misspelled_name(self):
+        require_trigrams(self)
+        self.assertEqual(list(fuzzy_lookup(Antibody, 'vimentn')), [self.vimentin])
+        self.assertEqual(list(fuzzy_lookup(Antibody, ' vimentn ', include_archived=True)), [self.vimentin, self.old_vimentin])
+
+    def test_matches_any_lookup_field(self):
+        require_trigrams(self)
+        self.assertEqual(list(fuzzy_lookup(Probe, 'gapd')), [self.probe])
+
+    def test_blank_text_matches_nothing(self):
+        self.assertFalse(fuzzy_lookup(Antibody, '  ').exists())
+        self.assertFalse(fuzzy_lookup(Antibody, None).exists())
+
+
+class AutocompleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cd3 = create_antibody('CD3')
+        cls.cd34 = create_antibody('CD34')
+        cls.archived = create_antibody('CD4', archived=True)
+        cls.vimentin = create_antibody('Vimentin')
+        cls.vim = create_antibody('Anti-vim')
+
+    def lookup(self, name='antibody', **params):
+        response = self.client.get(reverse('reference_autocomplete', args=[name]), params)
+        return response.status_code, [result['id'] for result in response.json().get('results', [])]
+
+    def test_first_rows_without_query(self):
+        self.assertEqual(self.lookup(), (200, [self.vim.pk, self.cd3.pk, self.cd34.pk, self.vimentin.pk]))
+        self.assertEqual(self.lookup(archived='1', limit='3'), (200, [self.vim.pk, self.cd3.pk, self.cd34.pk]))
+
+    def test_short_query_matches_prefix(self):
+        self.assertEqual(self.lookup(q='cd'), (200, [self.cd3.pk, self.cd34.pk]))
+        self.assertEqual(self.lookup(q='cd', archived='1'), (200, [self.cd3.pk, self.cd34.pk, self.archived.pk]))
+
+    def test_prefix_matches_before_fuzzy_ones(self):
+        require_trigrams(self)
+        self.assertEqual(self.lookup(q='vim')[1][:2], [self.vimentin.pk, self.vim.pk])
+
+    def test_limit(self):
+        self.assertEqual(len(self.lookup(limit='1')[1]), 1)
+        self.assertEqual(len(self.lookup(limit='0')[1]), 1)
+        with mock.patch.object(views, 'DEFAULT_LOOKUP_LIMIT', 2):
+            self.assertEqual(len(self.lookup(limit='many')[1]), 2)
+        with mock.patch.object(views, 'MAX_LOOKUP_LIMIT', 3):
+            self.assertEqual(len(self.lookup(limit='1000')[1]), 3)
+
+    def test_unknown_lookup(self):
+        self.assertEqual(self.lookup('status'), (404, []))
+
+    def test_widget_renders_only_selected_choice(self):
+        form = RequestEditForm(initial={'antibody': self.cd34.pk})
+        html = str(form['antibody'])
+        self.assertIn(reverse('reference_autocomplete', args=['antibody']), html)
+        self.assertEqual(re.findall(r'<option value="(\d*)"', html), ['', str(self.cd34.pk)])
+
+
+class RequestChangeLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.submitted = Status.objects.create(status='Submitted')
+        cls.in_progress = Status.objects.create(status='In Progress')
+        cls.priority = Priority.objects.create(value=3, label='3 - Medium')
+        cls.requestor = Requestor.objects.create(name='Requestor')
+        cls.study = Study.objects.create(study_id='S-1', title='Study 1')
+        cls.other_study = Study.objects.create(study_id='S-2', title='Study 2')
+        cls.antibody = Antibody.objects.create(
+            name='CD3', description='', antigen='CD3', species='Rabbit', recognizes='Human', vendor='Vendor',
+        )
+        cls.liver = Tissue.objects.create(name='Liver')
+        cls.kidney = Tissue.objects.create(name='Kidney')
+
+    def create_request(self, **fields):
+        fields = {
+            'requestor': self.requestor, 'study': self.study, 'tissue': self.liver, 'antibody': self.antibody,
+            'status': self.submitted, 'priority': self.priority, 'data': {}, **fields,
+        }
+        return Request.objects.create(**fields)
+
+    def create_embedding_request(self, tissues=()):
+        request = EmbeddingRequest.objects.create(requestor=self.requestor, study=self.study, status=self.submitted)
+        request.tissues.set(tissues)
+        return request
+
+    def test_versions_are_numbered_per_request(self):
+        first = self.create_request()
+        second = self.create_request()
+        versions = [RequestChangeLog.log_change(first, 'created').version]
+        versions.append(RequestChangeLog.log_change(second, 'created').version)
+        versions.append(RequestChangeLog.log_change(first, 'updated').version)
+        self.assertEqual(versions, [1, 1, 2])
+
+    def test_logged_with_one_insert(self):
+        request = self.create_request()
+        embedding = EmbeddingRequest.objects.prefetch_related('tissues').get(pk=self.create_embedding_request(tissues=[self.liver]).pk)
+        for logged in [request, embedding]:
+            RequestChangeLog.log_change(logged, 'created')
+            with CaptureQueriesContext(connection) as queries:
+                entry = RequestChangeLog.log_change(logged, 'updated', description='Updated')
+            # Taking the request's lock, then the INSERT
+            sqls = [query['sql'] for query in queries.captured_queries if 'SAVEPOINT' not in query['sql']]
+            self.assertEqual(len(sqls), 2)
+            self.assertTrue(sqls[1].lstrip().startswith('INSERT'))
+            self.assertEqual((entry.version, entry.description), (2, 'Updated'))
+
+    def test_snapshot_every_interval(self):
+        request = self.create_request()
+        entries = []
+        for number in range(2 * CHANGE_LOG_SNAPSHOT_INTERVAL + 1):
+            request.notes = f'note {number}'
+            entries.append(RequestChangeLog.log_change(request, 'created' if number == 0 else 'updated'))
+
+        snapshots = [entry.version for entry in entries if entry.is_snapshot]
+        self.assertEqual(snapshots, [1, CHANGE_LOG_SNAPSHOT_INTERVAL + 1, 2 * CHANGE_LOG_SNAPSHOT_INTERVAL + 1])
+        # Versions in between store only what differs from their snapshot
+        second = entries[1]
+        self.assertEqual(second.snapshot_id, entries[0].pk)
+        self.assertEqual(second.data, {'notes': 'note 1'})
+        for number, entry in enumerate(RequestChangeLog.get_request_history('staining', request.pk)):
+            self.assertEqual(entry.get_state()['notes'], f'note {number}')
+
+    def test_history_rebuilt_with_one_query(self):
+        request = self.create_request()
+        for number in range(CHANGE_LOG_SNAPSHOT_INTERVAL + 2):
+            request.notes = f'note {number}'
+            RequestChangeLog.log_change(request, 'created' if number == 0 else 'updated')
+
+        with self.assertNumQueries(1):
+            states = [entry.get_state() for entry in RequestChangeLog.get_request_history('staining', request.pk)]
+        self.assertEqual([state['notes'] for state in states], [f'note {number}' for number in range(CHANGE_LOG_SNAPSHOT_INTERVAL + 2)])
+        self.assertEqual({state['study'] for state in states}, {self.study.pk})
+
+    def test_one_table_for_every_request_type(self):
+        staining = self.create_request(notes='x')
+        embedding = self.create_embedding_request(tissues=[self.liver])
+        RequestChangeLog.log_change(staining, 'created')
+        RequestChangeLog.log_change(embedding, 'created')
+        # Versions after the first only store the fields that changed, so the study comes from the snapshot
+        staining.notes = 'y'
+        RequestChangeLog.log_change(staining, 'updated')
+
+        self.assertEqual(
+            sorted(RequestChangeLog.with_state(study=self.study.pk).values_list('request_type', 'version')),
+            [('embedding', 1), ('staining', 1), ('staining', 2)],
+        )
+        self.assertEqual(list(RequestChangeLog.with_state(notes='y').values_list('request_type', 'version')), [('staining', 2)])
+        self.assertEqual(
+            [entry.request_type for entry in RequestChangeLog.for_request('embedding', embedding.pk)], ['embedding'],
+        )
+
+    def test_diff_against_previous_version(self):
+        request = self.create_request(notes='first')
+        created = RequestChangeLog.log_change(request, 'created')
+        self.assertEqual(created.diff, {})
+
+        request.status = self.in_progress
+        request.notes = 'second'
+        updated = RequestChangeLog.log_change(request, 'updated')
+        self.assertEqual(updated.diff, {
+            'status': [self.submitted.pk, self.in_progress.pk],
+            'notes': ['first', 'second'],
+        })
+        self.assertEqual(updated.changed_fields, ['notes', 'status'])
+        self.assertNotIn('tissues', updated.diff)
+
+        unchanged = RequestChangeLog.log_change(request, 'updated', changed_fields=['notes'])
+        self.assertEqual(unchanged.diff, {})
+        self.assertEqual(unchanged.changed_fields, ['notes'])
+
+    def test_diff_includes_tissues(self):
+        request = self.create_embedding_request(tissues=[self.liver])
+        created = RequestChangeLog.log_change(request, 'created')
+        self.assertEqual(created.tissue_ids, [self.liver.pk])
+
+        request.tissues.add(self.kidney)
+        request = EmbeddingRequest.objects.get(pk=request.pk)
+        updated = RequestChangeLog.log_change(request, 'updated')
+        self.assertEqual(updated.diff, {'tissues': [[self.liver.pk], sorted([self.liver.pk, self.kidney.pk])]})
+        self.assertEqual(updated.get_state()['tissues'], sorted([self.liver.pk, self.kidney.pk]))
+
+    def test_as_of(self):
+        first = self.create_request(notes='v1')
+        second = self.create_request(notes='v1')
+        RequestChangeLog.log_change(first, 'created')
+        RequestChangeLog.log_change(second, 'created')
+        before_update = timezone.now()
+
+        first.notes = 'v2'
+        first.study = self.other_study
+        RequestChangeLog.log_change(first, 'updated')
+        RequestChangeLog.log_change(second, 'deleted')
+        after_update = timezone.now()
+
+        def states(when, **filters):
+            return {
+                entry.request_id: (entry.version, entry.get_state()['notes'])
+                for entry in RequestChangeLog.as_of(when, **filters)
+            }
+
+        self.assertEqual(states(before_update - timedelta(days=1)), {})
+        self.assertEqual(states(before_update), {first.pk: (1, 'v1'), second.pk: (1, 'v1')})
+        self.assertEqual(states(after_update), {first.pk: (2, 'v2')})
+        self.assertEqual(states(after_update, request_type='embedding'), {})
+        self.assertEqual(states(before_update, study=self.study), {first.pk: (1, 'v1'), second.pk: (1, 'v1')})
+        self.assertEqual(states(after_update, study=self.study), {})
+        self.assertEqual(states(after_update, study=self.other_study), {first.pk: (2, 'v2')})
+
+    def test_as_of_views(self):
+        request = self.create_request(notes='v1')
+        RequestChangeLog.log_change(request, 'created')
+        when = timezone.localtime().replace(tzinfo=None).isoformat()
+
+        response = self.client.get(reverse('requests_as_of_api'), {'at': when, 'request_type': 'staining', 'study': self.study.pk})
+        [result] = response.json()['results']
+        self.assertEqual((result['request_id'], result['version'], result['state']['notes']), (request.pk, 1, 'v1'))
+
+        for params in [{'at': 'yesterday'}, {'request_type': 'dissection'}]:
+            response = self.client.get(reverse('requests_as_of_api'), params)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.json())
+
+        response = self.client.get(reverse('requests_as_of'), {'at': 'yesterday'})
+        self.assertEqual(response.context['error'], 'Invalid date and time: yesterday')
+        self.assertEqual([log.request_id for log in response.context['change_logs']], [request.pk])
+
+    def test_as_of_picks_highest_version(self):
+        # Concurrent changes can commit their changed_at out of order
+        request = self.create_request(notes='v1')
+        RequestChangeLog.log_change(request, 'created')
+        request.notes = 'v2'
+        RequestChangeLog.log_change(request, 'updated')
+        RequestChangeLog.objects.filter(request_id=request.pk, version=2).update(
+            changed_at=RequestChangeLog.objects.get(request_id=request.pk, version=1).changed_at - timedelta(seconds=1),
+        )
+
+        [current] = RequestChangeLog.as_of(timezone.now())
+        self.assertEqual(current.version, 2)
+
+    def test_deleting_a_request_logs_it(self):
+        request = self.create_request(notes='v1')
+        embedding = self.create_embedding_request(tissues=[self.liver])
+        RequestChangeLog.log_change(request, 'created')
+        RequestChangeLog.log_change(embedding, 'created')
+        before_delete = timezone.now()
+
+        response = self.client.post(reverse('staining_request_delete', args=[request.pk]))
+        self.assertRedirects(response, reverse('staining_requests'), fetch_redirect_response=False)
+        self.client.post(reverse('embedding_request_delete', args=[embedding.pk]))
+
+        self.assertFalse(Request.objects.filter(pk=request.pk).exists())
+        deleted = RequestChangeLog.get_request_history('staining', request.pk).last()
+        self.assertEqual((deleted.version, deleted.change_type), (2, 'deleted'))
+        self.assertEqual(deleted.get_state()['notes'], 'v1')
+        # Logged while the tissues could still be read, so they are not diffed away
+        deleted = RequestChangeLog.get_request_history('embedding', embedding.pk).last()
+        self.assertEqual((deleted.change_type, deleted.tissue_ids, deleted.diff), ('deleted', [self.liver.pk], {}))
+
+        self.assertEqual(
+            {(entry.request_type, entry.request_id) for entry in RequestChangeLog.as_of(before_delete)},
+            {('staining', request.pk), ('embedding', embedding.pk)},
+        )
+        self.assertFalse(RequestChangeLog.as_of(timezone.now()).exists())
+
+    def test_backfill_diffs_migration(self):
+        migration = importlib.import_module('requests_app.migrations.0046_backfill_changelog_diffs')
+        request = self.create_request(notes='v1')
+        embedding = self.create_embedding_request(tissues=[self.liver])
+        for number in range(CHANGE_LOG_SNAPSHOT_INTERVAL + 2):
+            request.notes = f'v{number}'
+            RequestChangeLog.log_change(request, 'updated')
+            if number == 3:
+                embedding.tissues.add(self.kidney)
+                embedding = EmbeddingRequest.objects.get(pk=embedding.pk)
+            RequestChangeLog.log_change(embedding, 'updated')
+        logged = dict(RequestChangeLog.objects.values_list('pk', 'diff'))
+
+        RequestChangeLog.objects.update(diff={})
+        with connection.cursor() as cursor:
+            cursor.execute(migration.BACKFILL_DIFFS)
+        self.assertEqual(dict(RequestChangeLog.objects.values_list('pk', 'diff')), logged)
+
+
+class ImportJobTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+    def create_job(self, rows=5, **options):
+        lines = ['study_id,title', *(f'S-{number},Study {number}' for number in range(rows))]
+        return imports.create_job('studies', ContentFile('\n'.join(lines).encode(), name='studies.csv'), **options)
+
+    def take_over(self, job):
+        ImportJob.objects.filter(pk=job.pk).update(attempts=F('attempts') + 1)
+
+    def test_live_job_is_not_claimed_twice(self):
+        job = self.create_job()
+        self.assertEqual(imports.claim_job(), job)
+        self.assertIsNone(imports.claim_job())
+
+    def test_stale_job_is_taken_over(self):
+        job = self.create_job()
+        first = imports.claim_job()
+        ImportJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - imports.STALE_JOB_AFTER)
+        second = imports.claim_job()
+        self.assertEqual((second.pk, second.attempts), (job.pk, 2))
+
+        # The slow worker stops at its first save and leaves the job alone
+        with self.assertLogs('requests_app.imports', 'WARNING'):
+            imports.run_job(first, chunk_size=2, workers=1)
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.checkpoint_row, job.total_rows), (ImportJob.STATE_RUNNING, 1, None))
+        self.assertFalse(Study.objects.exists())
+
+        imports.run_job(second, chunk_size=2, workers=1)
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.imported_count, job.checkpoint_row), (ImportJob.STATE_DONE, 5, 6))
+        self.assertEqual(Study.objects.count(), 5)
+
+    def test_failed_job_resumes_after_checkpoint(self):
+        job = self.create_job()
+        write_rows = imports.write_rows
+        calls = []
+
+        def fail_second_chunk(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError('Lost the database')
+            return write_rows(*args, **kwargs)
+
+        with mock.patch.object(imports, 'write_rows', side_effect=fail_second_chunk), self.assertLogs('requests_app.imports', 'ERROR'):
+            imports.process_next_job(chunk_size=2, workers=1)
+        job.refresh_from_db()
+        self.assertEqual(
+            (job.state, job.checkpoint_row, job.imported_count, job.last_error),
+            (ImportJob.STATE_FAILED, 3, 2, 'Lost the database'),
+        )
+
+        self.client.force_login(User.objects.create(username='staff', is_staff=True))
+        progress = self.client.get(reverse('import_job_status', args=[job.pk])).json()
+        self.assertEqual((progress['state'], progress['rows_processed'], progress['total_rows'], progress['percent']), ('failed', 2, 5, 40))
+
+        self.client.post(reverse('resume_import_job', args=[job.pk]))
+        job.refresh_from_db()
+        self.assertEqual(job.state, ImportJob.STATE_PENDING)
+        imports.process_next_job(chunk_size=2, workers=1)
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.imported_count, job.skipped_count), (ImportJob.STATE_DONE, 5, 0))
+        self.assertEqual(Study.objects.count(), 5)
+
+        # Only failed jobs go back in the queue
+        imports.resume_job(job)
+        self.assertEqual(job.state, ImportJob.STATE_DONE)
+
+    def test_job_pages_are_for_staff(self):
+        job = self.create_job()
+        self.client.force_login(User.objects.create(username='user'))
+        for name in ['import_job', 'import_job_status', 'resume_import_job', 'commit_import_job']:
+            with self.subTest(name=name):
+                self.assertEqual(self.client.get(reverse(name, args=[job.pk])).status_code, 302)
+
+    def test_taken_over_between_chunks(self):
+        job = self.create_job()
+        first = imports.claim_job()
+        write_rows = imports.write_rows
+
+        def write_then_lose_job(*args, **kwargs):
+            result = write_rows(*args, **kwargs)
+            self.take_over(job)
+            return result
+
+        with mock.patch.object(imports, 'write_rows', side_effect=write_then_lose_job), self.assertLogs('requests_app.imports', 'WARNING'):
+            imports.run_job(first, chunk_size=2, workers=1)
+        job.refresh_from_db()
+        # The first chunk was committed before the takeover; nothing after it was
+        self.assertEqual((job.state, job.checkpoint_row, job.imported_count), (ImportJob.STATE_RUNNING, 3, 2))
+
+        imports.run_job(job, chunk_size=2, workers=1)
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.imported_count, job.skipped_count), (ImportJob.STATE_DONE, 5, 0))
+        self.assertEqual(Study.objects.count(), 5)
+
+    def test_heartbeat_while_reading(self):
+        job = self.create_job()
+        claimed = imports.claim_job()
+        ImportJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(minutes=5))
+        chunks = (chunk for chunk in [1, 2])
+        with mock.patch.object(imports, 'JOB_HEARTBEAT_INTERVAL', timedelta(0)):
+            beating = imports.with_heartbeat(claimed, chunks)
+            self.assertEqual(next(beating), 1)
+            job.refresh_from_db()
+            self.assertGreater(job.updated_at, timezone.now() - timedelta(minutes=1))
+
+            self.take_over(job)
+            with self.assertRaises(imports.JobTakenOver):
+                next(beating)
+
+    def test_preview_stops_when_taken_over(self):
+        job = self.create_job(dry_run=True)
+        ImportJob.objects.filter(pk=job.pk).update(total_rows=5)
+        claimed = imports.claim_job()
+        self.take_over(job)
+        with mock.patch.object(imports, 'JOB_HEARTBEAT_INTERVAL', timedelta(0)), self.assertLogs('requests_app.imports', 'WARNING'):
+            imports.run_job(claimed, chunk_size=2, workers=1)
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.preview.name), (ImportJob.STATE_RUNNING, ''))
+
+
+class CatalogImportTests(TestCase):
+    def test_import_in_chunks(self):
+        Study.objects.create(study_id='S-1', title='Stored')
+        rows = [
+            ('Title', 'Study ID'),
+            ('Stored again', 'S-1'),
+            ('New', 'S-2'),
+            ('Repeated in the same chunk', 'S-2'),
+            ('Repeated in a later chunk', 'S-2'),
+            ('Bad id', 'S-3;'),
+            ('', ''),
+            ('Another', 'S-4'),
+        ]
+        result = imports.import_rows('studies', rows, chunk_size=3)
+        self.assertEqual(
+            result, {'imported': 2, 'updated': 0, 'unchanged': 0, 'skipped': 3, 'invalid': 1, 'errors': ['Row 6: invalid study id']},
+        )
+        self.assertEqual(
+            dict(Study.objects.values_list('study_id', 'title')), {'S-1': 'Stored', 'S-2': 'New', 'S-4': 'Another'},
+        )
+
+    def test_import_is_one_transaction(self):
+        rows = [('study_id', 'title'), *((f'S-{number}', 'Study') for number in range(4))]
+        write_rows = imports.write_rows
+        chunks = []
+
+        def fail_second_chunk(*args, **kwargs):
+            chunks.append(args)
+            if len(chunks) == 2:
+                raise RuntimeError('Lost the database')
+            return write_rows(*args, **kwargs)
+
+        with mock.patch.object(imports, 'write_rows', side_effect=fail_second_chunk), self.assertRaises(RuntimeError):
+            imports.import_rows('studies', rows, chunk_size=2)
+        self.assertFalse(Study.objects.exists())
+
+    def test_upsert(self):
+        Probe.objects.create(name='P-1', description='Old', number_of_pairs=20, archived=True)
+        Probe.objects.create(name='P-2', description='Same', target_gene=None, number_of_pairs=None)
+        header = ('name', 'description', 'target_gene', 'vendor', 'platform', 'number_of_pairs')
+        rows = [header, ('P-1', 'New', '', '', '', '20'), ('P-2', 'Same', '', '', '', ''), ('P-3', 'Added', '', '', '', '5')]
+
+        result = imports.import_rows('probes', rows, chunk_size=2, mode=ImportJob.MODE_UPSERT)
+        self.assertEqual((result['imported'], result['updated'], result['unchanged'], result['skipped']), (1, 1, 1, 0))
+        # Columns the file does not have are left alone
+        self.assertEqual(
+            list(Probe.objects.order_by('name').values_list('name', 'description', 'number_of_pairs', 'archived')),
+            [('P-1', 'New', 20, True), ('P-2', 'Same', None, False), ('P-3', 'Added', 5, False)],
+        )
+
+        rows = [(*header, 'archived'), ('P-1', 'New', '', '', '', '20', 'no')]
+        result = imports.import_rows('probes', rows, mode=ImportJob.MODE_UPSERT)
+        self.assertEqual(result['updated'], 1)
+        self.assertFalse(Probe.objects.get(name='P-1').archived)
+
+    def test_insert_mode_skips_existing_rows(self):
+        Study.objects.create(study_id='S-1', title='Stored')
+        result = imports.import_rows('studies', [('study_id', 'title'), ('S-1', 'Changed')])
+        self.assertEqual((result['imported'], result['updated'], result['skipped']), (0, 0, 1))
+        self.assertEqual(Study.objects.get().title, 'Stored')
+
+    def test_missing_columns(self):
+        with self.assertRaisesMessage(imports.ImportFileError, 'Missing required columns: title'):
+            imports.import_rows('studies', [('Study ID', 'Archived'), ('S-1', 'no')])
+
+    def test_row_saved_outside_import_after_lookup(self):
+        Study.objects.create(study_id='S-1', title='Saved from the form')
+        lookups = []
+        existing_keys = imports.existing_keys
+
+        def missing_then_found(spec, keys):
+            # The first lookup runs before the form's study is saved
+            lookups.append(keys)
+            return set() if len(lookups) == 1 else existing_keys(spec, keys)
+
+        rows = [('study_id', 'title'), ('S-1', 'Imported'), ('S-2', 'Imported')]
+        with mock.patch.object(imports, 'existing_keys', side_effect=missing_then_found):
+            result = imports.import_rows('studies', rows)
+        self.assertEqual(len(lookups), 2)
+        self.assertEqual((result['imported'], result['skipped']), (1, 1))
+        self.assertEqual(
+            dict(Study.objects.values_list('study_id', 'title')), {'S-1': 'Saved from the form', 'S-2': 'Imported'},
+        )
+
+
+class ImportPreviewTests(TestCase):
+    rows = [
+        ('name', 'description', 'target_gene', 'vendor', 'platform', 'number_of_pairs'),
+        ('P-1', 'Stored', '', '', '', '20'),
+        ('P-2', 'Changed', '', '', '', ''),
+        ('P-3', 'New', '', '', '', '12'),
+        ('P-1', 'Repeated in a later chunk', '', '', '', '20'),
+        ('P-4;', 'Bad name', '', '', '', ''),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        Probe.objects.create(name='P-1', description='Stored', number_of_pairs=20)
+        Probe.objects.create(name='P-2', description='Stored')
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+    def csv_file(self, rows):
+        return ContentFile('\n'.join(','.join(row) for row in rows).encode(), name='probes.csv')
+
+    def test_preview_per_chunk(self):
+        previews = list(imports.preview_file('probes', self.csv_file(self.rows), mode=ImportJob.MODE_UPSERT, chunk_size=2, workers=1))
+        self.assertEqual([preview['row'].tolist() for preview in previews], [[2, 3], [4, 5], [6]])
+        preview = pd.concat(previews, ignore_index=True)
+        self.assertEqual(
+            preview[['name', 'action', 'changed']].values.tolist(),
+            [['P-1', 'unchanged', ''], ['P-2', 'update', 'description'], ['P-3', 'new', ''],
+             ['P-1', 'duplicate', ''], ['P-4;', 'invalid', '']],
+        )
+
+        file = io.BytesIO()
+        counts = imports.write_preview(imports.IMPORT_SPECS['probes'], iter(previews), file)
+        self.assertEqual(counts, {'new': 1, 'update': 1, 'unchanged': 1, 'existing': 0, 'duplicate': 1, 'invalid': 1})
+        file.seek(0)
+        stored = list(imports.preview_batches(file, batch_size=4))
+        self.assertEqual([len(batch) for batch in stored], [4, 1])
+        self.assertEqual(str(stored[0]['number_of_pairs'].dtype), 'Int64')
+        self.assertEqual(stored[0]['number_of_pairs'].tolist(), [20, pd.NA, 12, pd.NA])
+
+    def test_commit_preview(self):
+        job = imports.create_job('probes', self.csv_file(self.rows), mode=ImportJob.MODE_UPSERT, dry_run=True)
+        imports.run_job(imports.claim_job(), chunk_size=2, workers=1)
+        job.refresh_from_db()
+        self.assertEqual(job.state, ImportJob.STATE_PREVIEW)
+        self.assertEqual(job.preview_counts['update'], 1)
+        self.assertEqual(imports.load_preview(job, columns=['row', 'action'])['action'].tolist()[:3], ['unchanged', 'update', 'new'])
+        self.assertFalse(Probe.objects.filter(name='P-3').exists())
+
+        imports.commit_preview(job)
+        imports.run_job(imports.claim_job(), chunk_size=1, workers=1)
+        job.refresh_from_db()
+        self.assertEqual(
+            (job.state, job.imported_count, job.updated_count, job.unchanged_count, job.skipped_count, job.invalid_count),
+            (ImportJob.STATE_DONE, 1, 1, 1, 1, 1),
+        )
+        self.assertEqual(job.errors, ['Row 6: invalid name'])
+        self.assertEqual(
+            list(Probe.objects.order_by('name').values_list('name', 'description', 'number_of_pairs')),
+            [('P-1', 'Stored', 20), ('P-2', 'Changed', None), ('P-3', 'New', 12)],
+        )
+
+    def test_preview_page_and_commit_view(self):
+        job = imports.create_job('probes', self.csv_file(self.rows), mode=ImportJob.MODE_UPSERT, dry_run=True)
+        imports.run_job(imports.claim_job(), chunk_size=2, workers=1)
+        self.client.force_login(User.objects.create(username='staff', is_staff=True))
+
+        response = self.client.get(reverse('import_job', args=[job.pk]), {'action': 'update'})
+        self.assertEqual(
+            response.context['preview_rows'], [{'row': 3, 'action': 'update', 'key': 'P-2', 'changed': 'description', 'message': ''}],
+        )
+        self.client.post(reverse('commit_import_job', args=[job.pk]))
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.dry_run), (ImportJob.STATE_PENDING, False))
+
+        # Committing twice does nothing
+        response = self.client.post(reverse('commit_import_job', args=[job.pk]), follow=True)
+        self.assertContains(response, 'Only previewed imports can be committed.')
+
+    def test_preview_of_header_only_file(self):
+        job = imports.create_job('probes', self.csv_file(self.rows[:1]), dry_run=True)
+        imports.run_job(imports.claim_job(), workers=1)
+        job.refresh_from_db()
+        self.assertEqual((job.state, sum(job.preview_counts.values())), (ImportJob.STATE_PREVIEW, 0))
+        self.assertEqual(len(imports.load_preview(job)), 0)
+
+        imports.commit_preview(job)
+        imports.run_job(imports.claim_job(), workers=1)
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.imported_count), (ImportJob.STATE_DONE, 0))
+
+
+class ImportFormatTests(TestCase):
+    def test_csv(self):
+        file = ContentFile('\ufeffStudy ID,Title\nS-1,"Two\nlines"\nS-2,Plain\n'.encode(), name='studies.CSV')
+        self.assertEqual(imports.count_rows(file), 2)
+        file.seek(0)
+        self.assertEqual(imports.import_file('studies', file)['imported'], 2)
+        self.assertEqual(Study.objects.get(study_id='S-1').title, 'Two\nlines')
+
+    def test_tsv(self):
+        file = ContentFile(b'study_id\ttitle\nS-1\tWith, a comma\n', name='studies.tsv')
+        self.assertEqual(imports.import_file('studies', file)['imported'], 1)
+        self.assertEqual(Study.objects.get().title, 'With, a comma')
+
+    def test_parquet(self):
+        buffer = io.BytesIO()
+        pd.DataFrame({
+            'name': ['P-1', 'P-2', 'P-3'], 'description': ['', None, 'Three'], 'target_gene': ['G'] * 3,
+            'vendor': ['V'] * 3, 'platform': ['X'] * 3, 'number_of_pairs': pd.array([1, None, 3], dtype='Int64'),
+        }).to_parquet(buffer, index=False, row_group_size=2)
+        file = ContentFile(buffer.getvalue(), name='probes.parquet')
+        self.assertEqual(imports.count_rows(file), 3)
+        file.seek(0)
+        self.assertEqual(imports.import_file('probes', file, chunk_size=2)['imported'], 3)
+        self.assertEqual(
+            list(Probe.objects.order_by('name').values_list('name', 'number_of_pairs')), [('P-1', 1), ('P-2', None), ('P-3', 3)],
+        )
+
+    def test_parquet_missing_column(self):
+        buffer = io.BytesIO()
+        pd.DataFrame({'study_id': ['S-1']}).to_parquet(buffer, index=False)
+        with self.assertRaisesMessage(imports.ImportFileError, 'Missing required columns: title'):
+            imports.import_file('studies', ContentFile(buffer.getvalue(), name='studies.parquet'))
+
+    def test_unsupported_file_type(self):
+        with self.assertRaisesMessage(imports.ImportFileError, 'Please upload one of these file types: Excel (.xlsx), CSV (.csv)'):
+            imports.create_job('studies', ContentFile(b'', name='studies.xls'))
+
+        self.client.force_login(User.objects.create(username='staff', is_staff=True))
+        response = self.client.post(
+            reverse('import_studies'), {'file': SimpleUploadedFile('studies.xls', b'')}, follow=True,
+        )
+        self.assertContains(response, 'Please upload one of these file types')
+        self.assertFalse(ImportJob.objects.exists())
+
+
+class ImportValidationTests(SimpleTestCase):
+    def validate(self, rows):
+        spec = imports.IMPORT_SPECS['probes']
+        return imports.validate_frame(imports.records_frame(list(imports.iter_records(rows, spec)), spec), spec)
+
+    def test_values_normalized_by_column(self):
+        rows, report = self.validate([
+            ('Name', 'Description', 'Target gene', 'Vendor', 'Platform', 'Number of pairs', 'Archived'),
+            ('  P-1 ', None, 'GAPDH', 'Vendor', 'Platform', '12.7', 'Yes'),
+            ('P-2', 'Described', '', '', '', 'many', ''),
+            ('P-3', '', '', '', '', 20, 'no'),
+        ])
+        self.assertTrue(report.empty)
+        self.assertEqual(rows.index.tolist(), [2, 3, 4])
+        self.assertEqual(rows['name'].tolist(), ['P-1', 'P-2', 'P-3'])
+        self.assertEqual(rows['description'].tolist(), ['', 'Described', ''])
+        # Text that is not a number is left empty, numbers are truncated
+        self.assertEqual(rows['number_of_pairs'].tolist(), [12, pd.NA, 20])
+        self.assertEqual(rows['archived'].tolist(), [True, False, False])
+
+    def test_rejected_rows(self):
+        rows, report = self.validate([
+            ('name', 'description', 'target_gene', 'vendor', 'platform', 'number_of_pairs'),
+            ('P-1', '', '', '', '', ''),
+            ('', '', '', '', '', ''),
+            ('P-2;' + 'x' * 300, '', '', '', '', ''),
+            ('P-3', '', 'g' * 256, '', '', ''),
+            ('P-4', '', '', '', '', '1e30'),
+            ('P-1', '', '', '', '', ''),
+            ('', 'No name', '', '', '', ''),
+        ])
+        self.assertEqual(rows.index.tolist(), [2])
+        # Blank lines are dropped silently, and each row reports its first failing check
+        self.assertEqual(report[['row', 'issue', 'message', 'name']].values.tolist(), [
+            [4, 'invalid', 'invalid name', 'P-2;' + 'x' * 300],
+            [5, 'invalid', 'target gene longer than 255 characters', 'P-3'],
+            [6, 'invalid', 'number of pairs out of range', 'P-4'],
+            [7, 'duplicate', 'duplicate name P-1', 'P-1'],
+            [8, 'invalid', 'invalid name', ''],
+        ])
+
+
+class ParallelWorkbookParseTests(SimpleTestCase):
+    """parallel_xlsx_chunks reads openpyxl internals, so these pin down that it still matches the serial reader"""
+
+    SHARED_STRINGS_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml'
+    SHARED_STRINGS_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings'
+
+    @classmethod
+    def workbook(cls, rows=60, missing_row=17):
+        """
+        A probes workbook with dates, numbers, invalid and repeated names and
+        a missing row, whose text cells alternate between inline strings (as
+        openpyxl writes them) and shared strings (as Excel does)
+        """
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(['Name', 'Description', 'Target Gene', 'Vendor', 'Platform', 'Number of Pairs'])
+        for number in range(rows):
+            name = {23: 'bad name!', 31: 'P-3'}.get(number, f'P-{number}')
+            description = date(2024, 1, number % 28 + 1) if number % 5 == 0 else f'Probe {number}'
+            sheet.append([name, description, 'GENE', 'Vendor', 'RNAscope', number])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+
+        with zipfile.ZipFile(buffer) as archive:
+            parts = {name: archive.read(name) for name in archive.namelist()}
+        xml = parts['xl/worksheets/sheet1.xml'].decode()
+        xml = re.sub(rf'<row r="{missing_row + 2}">.*?</row>', '', xml)
+        shared = []
+
+        def share(match):
+            if int(match['row']) % 2:
+                return match[0]
+            shared.append(match['text'])
+            return f'<c r="{match["column"]}{match["row"]}" t="s"><v>{len(shared) - 1}</v></c>'
+
+        xml = re.sub(r'<c r="(?P<column>[A-Z]+)(?P<row>\d+)" t="inlineStr"><is><t>(?P<text>.*?)</t></is></c>', share, xml)
+        parts['xl/worksheets/sheet1.xml'] = xml.encode()
+        parts['xl/sharedStrings.xml'] = (
+            '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            + ''.join(f'<si><t>{text}</t></si>' for text in shared) + '</sst>'
+        ).encode()
+        parts['[Content_Types].xml'] = parts['[Content_Types].xml'].replace(
+            b'</Types>', f'<Override PartName="/xl/sharedStrings.xml" ContentType="{cls.SHARED_STRINGS_TYPE}"/></Types>'.encode(),
+        )
+        parts['xl/_rels/workbook.xml.rels'] = parts['xl/_rels/workbook.xml.rels'].replace(
+            b'</Relationships>',
+            f'<Relationship Id="rIdShared" Type="{cls.SHARED_STRINGS_REL}" Target="sharedStrings.xml"/></Relationships>'.encode(),
+        )
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            for name, content in parts.items():
+                archive.writestr(name, content)
+        return buffer.getvalue()
+
+    def chunks(self, content, workers, **options):
+        with mock.patch.object(imports, 'PARALLEL_PARSE_MIN_BYTES', 0):
+            return list(imports.file_chunks('probes', io.BytesIO(content), 'probes.xlsx', chunk_size=7, workers=workers, **options))
+
+    def assert_same_chunks(self, serial, parallel):
+        self.assertGreater(len(parallel), 1)
+        self.assertEqual([chunk[0] for chunk in parallel], sorted(chunk[0] for chunk in parallel))
+        self.assertEqual(parallel[-1][0], serial[-1][0])
+        for part in (1, 2):
+            pd.testing.assert_frame_equal(
+                pd.concat([chunk[part] for chunk in parallel]), pd.concat([chunk[part] for chunk in serial]),
+            )
+
+    def test_split_mid_tag(self):
+        with zipfile.ZipFile(io.BytesIO(self.workbook())) as archive:
+            xml = archive.read('xl/worksheets/sheet1.xml')
+        whole = list(imports.split_sheet_xml(io.BytesIO(xml), 7))
+        # Blocks this small cut through tags, attributes and the sheetData element
+        self.assertEqual(list(imports.split_sheet_xml(io.BytesIO(xml), 7, block_size=5)), whole)
+
+        self.assertEqual([first_row for first_row, _ in whole], list(range(1, 61, 7)))
+        rows = []
+        for _, part in whole:
+            namespace = {'sheet': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+            rows.extend(row.get('r') for row in ElementTree.fromstring(part).iterfind('sheet:sheetData/sheet:row', namespace))
+        self.assertEqual(rows, [str(number) for number in range(1, 62) if number != 19])
+
+    def test_parallel_parse_matches_serial(self):
+        content = self.workbook()
+        serial = self.chunks(content, workers=1)
+        parallel = self.chunks(content, workers=2)
+        self.assert_same_chunks(serial, parallel)
+
+        rows = pd.concat([chunk[1] for chunk in parallel])
+        self.assertEqual(rows.loc[2, 'description'], '2024-01-01 00:00:00')
+        self.assertEqual(rows.loc[3, 'description'], 'Probe 1')
+        self.assertNotIn(19, rows.index)
+        report = pd.concat([chunk[2] for chunk in parallel])
+        self.assertEqual(report[['row', 'issue']].values.tolist(), [[25, 'invalid']])
+
+    def test_parallel_parse_after_row(self):
+        content = self.workbook()
+        self.assert_same_chunks(self.chunks(content, workers=1, after_row=20), self.chunks(content, workers=2, after_row=20))
+
+    def test_small_workbook_parsed_here(self):
+        with mock.patch.object(imports, 'ProcessPoolExecutor') as pool:
+            chunks = list(imports.file_chunks('probes', io.BytesIO(self.workbook()), 'probes.xlsx', chunk_size=7, workers=2))
+        pool.assert_not_called()
+        self.assertEqual(chunks[-1][0], 61)
+
+    def test_missing_columns(self):
+        workbook = openpyxl.Workbook()
+        workbook.active.append(['Name', 'Description'])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        with self.assertRaisesMessage(imports.ImportFileError, 'Missing required columns: target_gene'):
+            self.chunks(buffer.getvalue(), workers=2)
+
+
+class RequestScopedTestCase(TestCase):
+    """Runs each test as a new web request with fresh reference data versions"""
+
+    def setUp(self):
+        # Versions left in the shared cache by other tests or processes may
+        # match values cached for data that has since been rolled back
+        caches[reference_data.VERSION_CACHE].clear()
+        # As the test client does, keep request_started from closing the test's connection
+        request_started.disconnect(close_old_connections)
+        self.addCleanup(request_started.connect, close_old_connections)
+        request_started.send(sender=self.__class__)
+
+
+class RequestListQueryTests(RequestScopedTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.status = Status.objects.create(status='Submitted')
+        cls.priority = Priority.objects.create(value=3, label='3 - Medium')
+        cls.requestor = Requestor.objects.create(name='Requestor')
+        cls.study = Study.objects.create(study_id='S-1', title='Study 1')
+        cls.antibody = create_antibody('CD3')
+        cls.assignee = Assignee.objects.create(name='Assignee')
+        cls.tissues = [Tissue.objects.create(name='Liver'), Tissue.objects.create(name='Kidney')]
+
+    def add_requests(self, count):
+        for _ in range(count):
+            Request.objects.create(
+                requestor=self.requestor, study=self.study, tissue=self.tissues[0], antibody=self.antibody,
+                status=self.status, priority=self.priority, assigned_to=self.assignee, data={},
+            )
+            for model in [EmbeddingRequest, SectioningRequest]:
+                request = model.objects.create(requestor=self.requestor, study=self.study, status=self.status, assigned_to=self.assignee)
+                request.tissues.set(self.tissues)
+
+    def count_queries(self, url):
+        # The first request fills the reference data cache
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        names = [
+            'staining_requests', 'embedding_requests', 'sectioning_requests',
+            'staining_requests_current', 'embedding_requests_current', 'sectioning_requests_current',
+        ]
+        self.add_requests(1)
+        counts = {name: self.count_queries(reverse(name)) for name in names}
+        self.add_requests(4)
+        for name in names:
+            with self.subTest(name=name):
+                self.assertEqual(self.count_queries(reverse(name)), counts[name])
+
+
+class ReferenceDataCacheTests(RequestScopedTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Created without signals, so no version bump is left pending in the test's transaction
+        [cls.submitted] = Status.objects.bulk_create([Status(status='Submitted')])
+        [cls.priority] = Priority.objects.bulk_create([Priority(value=3, label='3 - Medium')])
+
+    def test_warm_form_render(self):
+        RequestEditForm().as_p()
+        request_started.send(sender=self.__class__)
+        # Only the versions of the lists are read, all with one query
+        with self.assertNumQueries(1):
+            RequestEditForm().as_p()
+
+    def test_change_from_another_process_seen_in_next_request(self):
+        reference_data.reference_list(Assignee)
+        assignee = Assignee.objects.create(name='Assignee')
+        caches[reference_data.VERSION_CACHE].set(reference_data._version_key(Assignee), 'changed elsewhere', timeout=None)
+        with self.assertNumQueries(0):
+            self.assertNotIn(assignee, reference_data.reference_list(Assignee))
+
+        request_started.send(sender=self.__class__)
+        self.assertIn(assignee, reference_data.reference_list(Assignee))
+
+    def test_bumped_once_on_commit(self):
+        self.assertEqual(reference_data.reference_list(Assignee), ())
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Assignee.objects.create(name='First')
+            Assignee.objects.create(name='Second')
+        self.assertEqual(len(callbacks), 1)
+        with self.assertNumQueries(1):
+            self.assertEqual([row.name for row in reference_data.reference_list(Assignee)], ['First', 'Second'])
+
+    def test_bump_in_rolled_back_savepoint(self):
+        reference_data.reference_list(Assignee)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    Assignee.objects.create(name='Rolled back')
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+            Assignee.objects.create(name='Kept')
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual([row.name for row in reference_data.reference_list(Assignee)], ['Kept'])
+
+    def test_delete_invalidates_list(self):
+        # Created without signals: the test's transaction never commits, so a bump queued here would stay pending
+        [assignee] = Assignee.objects.bulk_create([Assignee(name='Assignee')])
+        self.assertEqual(reference_data.get_reference(Assignee, assignee.pk), assignee)
+        with self.captureOnCommitCallbacks(execute=True):
+            assignee.delete()
+        self.assertEqual(reference_data.reference_list(Assignee), ())
+
+    def test_canonical_ids(self):
+        self.assertEqual(reference_data.default_status_id(), self.submitted.pk)
+        self.assertEqual(reference_data.default_priority_id(), self.priority.pk)
+        self.assertIsNone(reference_data.status_id('Complete'))
+        with self.assertNumQueries(0):
+            self.assertEqual(reference_data.status_id('Submitted'), self.submitted.pk)
+            self.assertIsNone(reference_data.status_id('Complete'))
+            self.assertEqual(Request().status_id, self.submitted.pk)
+            self.assertEqual(Request().priority_id, self.priority.pk)
+            self.assertEqual(EmbeddingRequest().status_id, self.submitted.pk)
+
+    def test_canonical_id_follows_changes(self):
+        self.assertIsNone(reference_data.status_id('Complete'))
+        with self.captureOnCommitCallbacks(execute=True):
+            complete = Status.objects.create(status='Complete')
+        self.assertEqual(reference_data.status_id('Complete'), complete.pk)
+
+    def test_missing_default_created(self):
+        Priority.objects.all().delete()
+        priority = Priority.objects.get(pk=reference_data.default_priority_id())
+        self.assertEqual((priority.value, priority.label), (3, '3 - Medium'))
+
+
+class NotificationCacheTests(RequestScopedTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Created without signals, so no version bump is left pending in the test's transaction
+        cls.submitted, cls.complete = Status.objects.bulk_create([Status(status='Submitted'), Status(status='Complete')])
+        NotificationSettings.objects.bulk_create([
+            NotificationSettings(request_type='staining', status=cls.submitted, notify_enabled=True),
+        ])
+        [cls.staff] = User.objects.bulk_create([User(username='staff', email='staff@example.com', is_staff=True)])
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(mock.patch.object(reference_data, 'VERSION_CHECK_INTERVAL', 3600))
+
+    def test_decisions_run_no_query_once_warm(self):
+        notification_cache.notification_matrix()
+        notification_cache.staff_emails()
+        with self.assertNumQueries(0):
+            self.assertTrue(NotificationSettings.is_notification_enabled('staining', self.submitted))
+            self.assertFalse(NotificationSettings.is_notification_enabled('staining', self.complete.pk))
+            self.assertFalse(NotificationSettings.is_notification_enabled('embedding', self.submitted))
+            self.assertEqual(notification_cache.staff_emails(), ('staff@example.com',))
+
+    def test_settings_change_invalidates_matrix(self):
+        self.assertFalse(NotificationSettings.is_notification_enabled('staining', self.complete))
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationSettings.update_settings('staining', {self.complete.pk: True})
+        self.assertTrue(NotificationSettings.is_notification_enabled('staining', self.complete))
+
+    def test_digest_windows(self):
+        self.assertEqual(notification_cache.digest_windows(), {})
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationDigestSettings.objects.create(request_type='embedding', digest_enabled=True, window_minutes=5)
+        self.assertEqual(notification_cache.digest_windows(), {'embedding': timedelta(minutes=5)})
+
+    def test_login_keeps_staff_emails(self):
+        self.assertEqual(notification_cache.staff_emails(), ('staff@example.com',))
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.staff.last_login = timezone.now()
+            self.staff.save(update_fields=['last_login'])
+        self.assertEqual(callbacks, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.staff.is_staff = False
+            self.staff.save()
+        self.assertEqual(notification_cache.staff_emails(), ())
+
+
+class OutboxTestCase(RequestScopedTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.submitted, cls.in_progress, cls.complete = Status.objects.bulk_create([
+            Status(status='Submitted'), Status(status='In Progress'), Status(status='Complete'),
+        ])
+        NotificationSettings.objects.bulk_create([
+            NotificationSettings(request_type='staining', status=status, notify_enabled=True)
+            for status in [cls.submitted, cls.in_progress, cls.complete]
+        ])
+        [cls.requestor] = Requestor.objects.bulk_create([Requestor(name='Requestor', email='requestor@example.com')])
+        cls.priority = Priority.objects.create(value=3, label='3 - Medium')
+        cls.study = Study.objects.create(study_id='S-1', title='Study 1')
+        cls.antibody = create_antibody('CD3')
+        cls.tissue = Tissue.objects.create(name='Liver')
+
+    def create_request(self):
+        return Request.objects.create(
+            requestor=self.requestor, study=self.study, tissue=self.tissue, antibody=self.antibody,
+            status=self.submitted, priority=self.priority, data={},
+        )
+
+    def make_due(self):
+        EmailOutbox.objects.filter(state=EmailOutbox.STATE_PENDING).update(next_attempt_at=timezone.now())
+
+
+class OutboxTests(OutboxTestCase):
+    def test_queued_with_the_save(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.create_request()
+            raise IntegrityError
+        self.assertFalse(EmailOutbox.objects.exists())
+
+        request = self.create_request()
+        request.status = self.in_progress
+        request.save()
+        self.assertEqual(
+            list(EmailOutbox.objects.order_by('pk').values_list('event', 'request_id', 'old_status_id', 'new_status_id')),
+            [('created', request.pk, None, self.submitted.pk), ('status_changed', request.pk, self.submitted.pk, self.in_progress.pk)],
+        )
+
+    def test_process_batch(self):
+        request = self.create_request()
+        deleted = self.create_request()
+        Request.objects.filter(pk=deleted.pk).delete()
+
+        self.assertEqual(outbox.process_batch(), 2)
+        self.assertEqual([message.to for message in mail.outbox], [['requestor@example.com']])
+        self.assertIn(f'#{request.pk}', mail.outbox[0].subject)
+        self.assertEqual(
+            dict(EmailOutbox.objects.values_list('request_id', 'state')),
+            {request.pk: EmailOutbox.STATE_SENT, deleted.pk: EmailOutbox.STATE_SKIPPED},
+        )
+        self.assertEqual(outbox.process_batch(), 0)
+
+    def test_failed_send_is_retried_then_given_up(self):
+        self.create_request()
+        mailer = mock.Mock()
+        mailer.send_batch.side_effect = lambda messages: [SMTPException('Rejected')] * len(messages)
+
+        outbox.process_batch(max_attempts=2, mailer=mailer)
+        entry = EmailOutbox.objects.get()
+        self.assertEqual((entry.state, entry.attempts, entry.last_error), (EmailOutbox.STATE_PENDING, 1, 'Rejected'))
+        self.assertGreater(entry.next_attempt_at, timezone.now() + outbox.RETRY_BASE_DELAY - timedelta(seconds=10))
+        # Not due again until the retry delay has passed
+        self.assertEqual(outbox.process_batch(max_attempts=2, mailer=mailer), 0)
+
+        self.make_due()
+        with self.assertLogs('requests_app.outbox', 'ERROR'):
+            outbox.process_batch(max_attempts=2, mailer=mailer)
+        entry.refresh_from_db()
+        self.assertEqual((entry.state, entry.attempts), (EmailOutbox.STATE_FAILED, 2))
+
+    def test_retry_delay(self):
+        self.assertEqual([outbox.retry_delay(attempts) for attempts in [1, 2, 3]], [timedelta(minutes=minutes) for minutes in [1, 2, 4]])
+        self.assertEqual(outbox.retry_delay(20), outbox.RETRY_MAX_DELAY)
+
+    def test_claims_due_rows_skipping_locked_ones(self):
+        for _ in range(3):
+            self.create_request()
+        later = EmailOutbox.objects.order_by('pk').last()
+        later.next_attempt_at = timezone.now() + timedelta(hours=1)
+        later.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(outbox.process_batch(batch_size=1), 1)
+        self.assertTrue(any('FOR UPDATE SKIP LOCKED' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(outbox.process_batch(batch_size=5), 1)
+        self.assertEqual(EmailOutbox.objects.filter(state=EmailOutbox.STATE_PENDING).get(), later)
+
+
+class DigestTests(OutboxTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        NotificationDigestSettings.objects.bulk_create([
+            NotificationDigestSettings(request_type='staining', digest_enabled=True, window_minutes=15),
+        ])
+
+    def status_change(self, request, old_status, new_status):
+        return EmailOutbox.objects.create(
+            event='status_changed', request_type='staining', request_id=request.pk, old_status_id=old_status.pk,
+            new_status_id=new_status.pk, digest=True, recipient='requestor@example.com',
+        )
+
+    def test_collapse_digest(self):
+        start = timezone.now()
+
+        def entry(pk, minutes, request_id, event, old_status=None, new_status=None):
+            return EmailOutbox(
+                pk=pk, created_at=start + timedelta(minutes=minutes), event=event, request_type='staining',
+                request_id=request_id, old_status_id=getattr(old_status, 'pk', None), new_status_id=new_status.pk,
+            )
+        changes = outbox.collapse_digest([
+            entry(4, 3, 1, 'status_changed', self.in_progress, self.complete),
+            entry(1, 0, 1, 'created', None, self.submitted),
+            entry(2, 1, 1, 'status_changed', self.submitted, self.in_progress),
+            # Request 2 went back to where it started
+            entry(3, 2, 2, 'status_changed', self.submitted, self.in_progress),
+            entry(5, 4, 2, 'status_changed', self.in_progress, self.submitted),
+            entry(6, 5, 3, 'status_changed', self.submitted, self.complete),
+        ])
+        self.assertEqual(changes, [
+            (('staining', 1), {'created': True, 'old_status_id': None, 'new_status_id': self.complete.pk, 'transitions': 2}),
+            (('staining', 3), {'created': False, 'old_status_id': self.submitted.pk, 'new_status_id': self.complete.pk, 'transitions': 1}),
+        ])
+
+    def test_changes_sent_as_one_email_per_window(self):
+        request = self.create_request()
+        for status in [self.in_progress, self.complete]:
+            request.status = status
+            request.save()
+        entries = EmailOutbox.objects.all()
+        self.assertEqual({(entry.digest, entry.recipient) for entry in entries}, {(True, 'requestor@example.com')})
+        # Later events join the window the first one opened
+        self.assertEqual(len({entry.next_attempt_at for entry in entries}), 1)
+        self.assertGreater(entries[0].next_attempt_at, timezone.now() + timedelta(minutes=14))
+        self.assertEqual(outbox.process_batch(), 0)
+
+        self.make_due()
+        # The digest goes out whole even when the batch is smaller
+        self.assertEqual(outbox.process_batch(batch_size=1), 3)
+        self.assertEqual([message.to for message in mail.outbox], [['requestor@example.com']])
+        self.assertEqual(set(EmailOutbox.objects.values_list('state', flat=True)), {EmailOutbox.STATE_SENT})
+
+    def test_undone_change_is_skipped(self):
+        [request] = Request.objects.bulk_create([Request(
+            requestor=self.requestor, study=self.study, tissue=self.tissue, antibody=self.antibody,
+            status=self.submitted, priority=self.priority, data={},
+        )])
+        self.status_change(request, self.submitted, self.in_progress)
+        self.status_change(request, self.in_progress, self.submitted)
+        self.make_due()
+        self.assertEqual(outbox.process_batch(), 2)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(set(EmailOutbox.objects.values_list('state', flat=True)), {EmailOutbox.STATE_SKIPPED})
+
+
+class StatusTrackingTests(OutboxTestCase):
+    def status_events(self):
+        return list(EmailOutbox.objects.filter(event='status_changed').values_list('request_type', 'request_id', 'old_status_id', 'new_status_id'))
+
+    def test_status_change_runs_no_select_of_the_row(self):
+        request = Request.objects.get(pk=self.create_request().pk)
+        request.status = self.in_progress
+        with CaptureQueriesContext(connection) as queries:
+            request.save()
+        selects = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertFalse([sql for sql in selects if 'FROM "requests_app_request"' in sql])
+        self.assertEqual(self.status_events(), [('staining', request.pk, self.submitted.pk, self.in_progress.pk)])
+        self.assertFalse(request.has_changed('status'))
+
+        # Saving the same status again is not a change
+        request.save()
+        self.assertEqual(len(self.status_events()), 1)
+
+    def test_update_fields_without_status(self):
+        request = self.create_request()
+        request.status = self.complete
+        request.notes = 'Notes'
+        request.save(update_fields=['notes'])
+        self.assertEqual(self.status_events(), [])
+        self.assertTrue(request.has_changed('status'))
+        self.assertEqual(request.get_old_value('status'), self.submitted.pk)
+
+        request.save(update_fields=['status'])
+        self.assertEqual(self.status_events(), [('staining', request.pk, self.submitted.pk, self.complete.pk)])
+
+    def test_refresh_from_db(self):
+        request = self.create_request()
+        Request.objects.filter(pk=request.pk).update(status=self.in_progress)
+        request.refresh_from_db()
+        self.assertEqual(request.get_old_value('status'), self.in_progress.pk)
+        self.assertFalse(request.has_changed('status'))
+
+    def test_request_types_tracked_separately(self):
+        staining = self.create_request()
+        embedding = EmbeddingRequest.objects.create(requestor=self.requestor, study=self.study, status=self.submitted)
+        embedding.status = self.complete
+        embedding.save()
+        staining.save()
+        self.assertEqual(self.status_events(), [('embedding', embedding.pk, self.submitted.pk, self.complete.pk)])
+
+
+class FlakyConnection:
+    """Mail connection that fails the sends listed in failures (by send number) with the given errors"""
+
+    def __init__(self, failures=None, open_error=None):
+        self.failures = failures or {}
+        self.open_error = open_error
+        self.opened = 0
+        self.sent = []
+        self.sends = 0
+
+    def open(self):
+        if self.open_error is not None:
+            raise self.open_error
+        self.opened += 1
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        self.sends += 1
+        if self.sends in self.failures:
+            raise self.failures[self.sends]
+        self.sent.extend(message.subject for message in messages)
+        return len(messages)
+
+
+class BatchMailerTests(SimpleTestCase):
+    def messages(self, count):
+        return [mail.EmailMessage(f'Message {number}', 'Body', 'from@example.com', ['to@example.com']) for number in range(count)]
+
+    def test_one_connection_for_the_batch(self):
+        connection = FlakyConnection()
+        with BatchMailer(connection) as mailer:
+            self.assertEqual(mailer.send_batch(self.messages(3)), [None, None, None])
+            mailer.send_batch(self.messages(1))
+        self.assertEqual((connection.opened, len(connection.sent)), (1, 4))
+        self.assertEqual((mailer.last_batch['sent'], mailer.last_batch['failed']), (1, 0))
+
+    def test_reconnects_when_dropped(self):
+        connection = FlakyConnection({2: SMTPServerDisconnected('Dropped')})
+        with self.assertLogs('requests_app.mail_delivery', 'WARNING'), BatchMailer(connection) as mailer:
+            self.assertEqual(mailer.send_batch(self.messages(3)), [None, None, None])
+        self.assertEqual(connection.opened, 2)
+        self.assertEqual(connection.sent, ['Message 0', 'Message 1', 'Message 2'])
+
+    def test_rejected_message_does_not_stop_batch(self):
+        rejected = SMTPRecipientsRefused({'to@example.com': (550, b'No such user')})
+        with BatchMailer(FlakyConnection({1: rejected})) as mailer:
+            self.assertEqual(mailer.send_batch(self.messages(2)), [rejected, None])
+
+    def test_unreachable_server_fails_rest_of_batch(self):
+        error = ConnectionRefusedError('Refused')
+        connection = FlakyConnection(open_error=error)
+        with self.assertLogs('requests_app.mail_delivery', 'ERROR') as logs, BatchMailer(connection) as mailer:
+            self.assertEqual(mailer.send_batch(self.messages(3)), [error, error, error])
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(mailer.last_batch['failed'], 3)
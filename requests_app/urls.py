@@ -13,6 +13,7 @@ urlpatterns = [
     
     # Data Management URLs
     path('data/', views.data_management, name='data_management'),
+    path('autocomplete/<str:lookup>/', views.reference_autocomplete, name='reference_autocomplete'),
     
     # Requestor URLs
     path('data/requestors/', views.RequestorListView.as_view(), name='requestor_list'),
@@ -60,6 +61,10 @@ urlpatterns = [
     path('data/studies/import/', views.ImportStudiesView.as_view(), name='import_studies'),
     path('data/antibodies/import/', views.ImportAntibodiesView.as_view(), name='import_antibodies'),
     path('data/probes/import/', views.ImportProbesView.as_view(), name='import_probes'),
+    path('data/imports/<int:pk>/', views.ImportJobDetailView.as_view(), name='import_job'),
+    path('data/imports/<int:pk>/status/', views.import_job_status, name='import_job_status'),
+    path('data/imports/<int:pk>/commit/', views.commit_import_job, name='commit_import_job'),
+    path('data/imports/<int:pk>/resume/', views.resume_import_job, name='resume_import_job'),
     
     # Request Type Specific URLs (All Requests)
     path('staining/', views.StainingRequestsView.as_view(), name='staining_requests'),
@@ -103,11 +108,13 @@ urlpatterns = [
     
     # Request Log Selection URL
     path('logs/', views.RequestLogSelectionView.as_view(), name='request_log_selection'),
+    path('logs/as-of/', views.RequestsAsOfView.as_view(), name='requests_as_of'),
+    path('logs/as-of/json/', views.requests_as_of_api, name='requests_as_of_api'),
     
     # Request History URLs
-    path('staining/<int:pk>/history/', views.StainingRequestHistoryView.as_view(), name='staining_request_history'),
-    path('embedding/<int:pk>/history/', views.EmbeddingRequestHistoryView.as_view(), name='embedding_request_history'),
-    path('sectioning/<int:pk>/history/', views.SectioningRequestHistoryView.as_view(), name='sectioning_request_history'),
+    path('staining/<int:pk>/history/', views.RequestHistoryView.as_view(request_type='staining'), name='staining_request_history'),
+    path('embedding/<int:pk>/history/', views.RequestHistoryView.as_view(request_type='embedding'), name='embedding_request_history'),
+    path('sectioning/<int:pk>/history/', views.RequestHistoryView.as_view(request_type='sectioning'), name='sectioning_request_history'),
     
         # Notification Configuration URLs
         path('notifications/staining/', views.StainingNotificationConfigView.as_view(), name='staining_notification_config'),
@@ -3,20 +3,26 @@ from django.views.generic import FormView, ListView, UpdateView, DetailView, Del
 from django.urls import reverse_lazy
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import logout
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.utils.decorators import method_decorator
 from .forms import RequestForm, RequestEditForm, RequestSearchForm, StudyEditForm, AntibodyForm, RequestorForm, TissueForm, StatusForm, AssigneeForm, ProbeForm, PriorityForm, SectioningRequestSearchForm, EmbeddingRequestSearchForm, EmbeddingRequestForm, SectioningRequestForm, StainingRequestSearchForm, EmbeddingRequestEditForm, SectioningRequestEditForm, StainingNotificationConfigForm, EmbeddingNotificationConfigForm, SectioningNotificationConfigForm
-from .models import Request, Status, Study, Requestor, Antibody, Tissue, Assignee, Probe, Priority, StainingRequest, EmbeddingRequest, SectioningRequest, StainingRequestChangeLog, EmbeddingRequestChangeLog, SectioningRequestChangeLog, NotificationSettings
+from .queries import shape_request_list, keyword_search
+from .pagination import KeysetPaginationMixin
+from .reference_data import COMPLETE_STATUS, reference_list, selectable_statuses, status_id
+from .imports import IMPORT_SPECS, PREVIEW_ACTIONS, ImportFileError, commit_preview, create_job, load_preview, resume_job
+from .lookups import AUTOCOMPLETE_MODELS, DEFAULT_LOOKUP_LIMIT, MAX_LOOKUP_LIMIT, autocomplete_lookup
+from .models import Request, Status, Study, Requestor, Antibody, Tissue, Assignee, Probe, Priority, StainingRequest, EmbeddingRequest, SectioningRequest, RequestChangeLog, NotificationSettings, NotificationDigestSettings, ImportJob
 from django.http import JsonResponse, HttpResponseRedirect, HttpResponse
 from django.template.loader import render_to_string
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Q
 from datetime import datetime
 import re
 from django.contrib import messages
 from django.core.files.storage import default_storage
+from django.core.paginator import Paginator
 from django.core.files.base import ContentFile
-import openpyxl
 import os
-import pandas as pd
 import io
 
 # Create your views here.
@@ -32,6 +38,21 @@ def home(request):
 def data_management(request):
     return render(request, 'requests_app/data_management.html')
 
+def reference_autocomplete(request, lookup):
+    """JSON matches for the searchable dropdowns, prefix matches first, then fuzzy ones"""
+    model = AUTOCOMPLETE_MODELS.get(lookup)
+    if model is None:
+        return JsonResponse({'error': 'Unknown lookup'}, status=404)
+
+    try:
+        limit = min(max(int(request.GET.get('limit', DEFAULT_LOOKUP_LIMIT)), 1), MAX_LOOKUP_LIMIT)
+    except ValueError:
+        limit = DEFAULT_LOOKUP_LIMIT
+
+    matches = autocomplete_lookup(model, request.GET.get('q', ''), limit=limit,
+                                  include_archived=request.GET.get('archived') == '1')
+    return JsonResponse({'results': [{'id': obj.pk, 'text': str(obj)} for obj in matches]})
+
 # Request Views
 class RequestListView(ListView):
     model = Request
@@ -40,7 +61,7 @@ class RequestListView(ListView):
     paginate_by = 20
 
     def get_queryset(self):
-        queryset = Request.objects.all()
+        queryset = shape_request_list(Request.objects.all())
         
         # Get sort parameters
         sort_by = self.request.GET.get('sort', '-created_at')
@@ -76,10 +97,8 @@ class RequestCreateView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['today_date'] = datetime.now().date()
-        context['tissues'] = Tissue.objects.all().order_by('name')
         context['max_tissues'] = 10
-        context['assignees'] = Assignee.objects.all().order_by('name')
-        context['probes'] = Probe.objects.filter(archived=False).order_by('name')
+        context['assignees'] = reference_list(Assignee)
         
         # Check if we have pre-filled form data from URL parameters
         if self.request.GET.get('success'):
@@ -104,7 +123,7 @@ class RequestCreateView(TemplateView):
         form = RequestForm(request.POST)
         if form.is_valid():
             request_obj = form.save(commit=False)
-            request_obj.status = Status.get_default_status()
+            request_obj.status_id = Status.get_default_status_id()
             
             # Collect additional tissues from form data
             additional_tissues = []
@@ -190,10 +209,8 @@ class StainingRequestCreateView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['today_date'] = datetime.now().date()
-        context['tissues'] = Tissue.objects.all().order_by('name')
         context['max_tissues'] = 10
-        context['assignees'] = Assignee.objects.all().order_by('name')
-        context['probes'] = Probe.objects.filter(archived=False).order_by('name')
+        context['assignees'] = reference_list(Assignee)
         
         # Check if we have pre-filled form data from URL parameters
         if self.request.GET.get('success'):
@@ -218,7 +235,7 @@ class StainingRequestCreateView(TemplateView):
         form = RequestForm(request.POST)
         if form.is_valid():
             request_obj = form.save(commit=False)
-            request_obj.status = Status.get_default_status()
+            request_obj.status_id = Status.get_default_status_id()
             
             # Collect additional tissues from form data
             additional_tissues = []
@@ -287,7 +304,7 @@ class StainingRequestCreateView(TemplateView):
 
     def form_valid(self, form):
         request_obj = form.save(commit=False)
-        request_obj.status = Status.get_default_status()
+        request_obj.status_id = Status.get_default_status_id()
         
         # Collect additional tissues from form data
         additional_tissues = []
@@ -311,7 +328,7 @@ class StainingRequestCreateView(TemplateView):
         request_obj.save()
         
         # Log the creation
-        StainingRequestChangeLog.log_change(
+        RequestChangeLog.log_change(
             request=request_obj,
             change_type='created',
             description='Staining request created'
@@ -325,7 +342,6 @@ class EmbeddingRequestCreateView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['tissues'] = Tissue.objects.all().order_by('name')
         context['form'] = EmbeddingRequestForm()
         return context
 
@@ -382,7 +398,7 @@ class EmbeddingRequestCreateView(TemplateView):
                 request_obj.save()
             
             # Log the creation
-            EmbeddingRequestChangeLog.log_change(
+            RequestChangeLog.log_change(
                 request=request_obj,
                 change_type='created',
                 description='Embedding request created'
@@ -410,7 +426,6 @@ class SectioningRequestCreateView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['tissues'] = Tissue.objects.all().order_by('name')
         context['form'] = SectioningRequestForm()
         return context
 
@@ -467,7 +482,7 @@ class SectioningRequestCreateView(TemplateView):
                 request_obj.save()
             
             # Log the creation
-            SectioningRequestChangeLog.log_change(
+            RequestChangeLog.log_change(
                 request=request_obj,
                 change_type='created',
                 description='Sectioning request created'
@@ -498,19 +513,12 @@ class RequestUpdateView(UpdateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['request_obj'] = self.object
-        context['antibodies'] = Antibody.objects.filter(archived=False).order_by('name')
-        context['studies'] = Study.objects.all().order_by('study_id')
-        context['tissues'] = Tissue.objects.all().order_by('name')
-        context['statuses'] = Status.objects.exclude(status='submitted').order_by('status')
-        context['assignees'] = Assignee.objects.all().order_by('name')
-        context['probes'] = Probe.objects.filter(archived=False).order_by('name')
+        context['statuses'] = selectable_statuses()
+        context['assignees'] = reference_list(Assignee)
         return context
     
     def form_valid(self, form):
         print("DEBUG: RequestUpdateView form_valid called")
-        # Get the original object before saving
-        original_obj = Request.objects.get(pk=self.object.pk)
-        
         # Debug: print all POST data
         print(f"DEBUG: All POST keys: {list(self.request.POST.keys())}")
         
@@ -571,20 +579,18 @@ class RequestSearchView(ListView):
         form = RequestSearchForm(self.request.GET)
         
         context['form'] = form
-        context['tissues'] = Tissue.objects.all().order_by('name')
-        context['assignees'] = Assignee.objects.all().order_by('name')
-        context['antibodies'] = Antibody.objects.filter(archived=False).order_by('name')
-        context['probes'] = Probe.objects.filter(archived=False).order_by('name')
-        context['studies'] = Study.objects.all().order_by('study_id')
-        context['statuses'] = Status.objects.exclude(status='submitted').order_by('status')
-        context['priorities'] = Priority.objects.all().order_by('value')
+        context['assignees'] = reference_list(Assignee)
+        context['statuses'] = selectable_statuses()
+        context['priorities'] = reference_list(Priority)
         return context
 
     def get_queryset(self):
-        queryset = Request.objects.all()
+        queryset = shape_request_list(Request.objects.all())
         form = RequestSearchForm(self.request.GET)
+        keywords = None
         
         if form.is_valid():
+            keywords = form.cleaned_data.get('q')
             request_id = form.cleaned_data.get('request_id')
             date_from = form.cleaned_data.get('date_from')
             date_to = form.cleaned_data.get('date_to')
@@ -630,6 +636,8 @@ class RequestSearchView(ListView):
             if notes:
                 queryset = queryset.filter(notes__icontains=notes)
 
+        if keywords:
+            return keyword_search(queryset, keywords)
         return queryset.order_by('-created_at')
 
 
@@ -650,7 +658,7 @@ class RequestHomeView(ListView):
         return context
 
     def get_queryset(self):
-        queryset = Request.objects.all()
+        queryset = shape_request_list(Request.objects.all())
         
         # Apply sorting
         sort_by = self.request.GET.get('sort', '-created_at')
@@ -685,7 +693,7 @@ class SimpleRequestHomeView(ListView):
         return context
 
     def get_queryset(self):
-        queryset = Request.objects.all()
+        queryset = shape_request_list(Request.objects.all())
         
         # Apply sorting
         sort_by = self.request.GET.get('sort', '-created_at')
@@ -820,13 +828,6 @@ def validate_input(input_str):
     # Allow letters, numbers, spaces, hyphens, and underscores
     return bool(re.match(r'^[a-zA-Z0-9\s\-_]+$', input_str))
 
-def validate_import_input(input_str):
-    # More permissive validation for imports - allows common characters in study titles and IDs
-    if not input_str or len(input_str) > 256:
-        return False
-    # Allow letters, numbers, spaces, hyphens, underscores, parentheses, colons, periods, and commas
-    return bool(re.match(r'^[a-zA-Z0-9\s\-_\(\):.,]+$', input_str))
-
 def requestor_create(request):
     if request.method == 'POST':
         name = request.POST.get('name', '').strip()
@@ -1251,307 +1252,59 @@ def custom_404(request, exception):
 def custom_500(request):
     return render(request, "500.html", status=500)
 
+def import_upload(request, kind, redirect_to):
+    """
+    Queue the uploaded catalog file for import into kind (see
+    imports.IMPORT_SPECS) and show the job's progress page. The file is only
+    stored here; the process_import_jobs worker imports it.
+    """
+    if 'file' not in request.FILES:
+        messages.error(request, 'No file was uploaded.')
+        return redirect(redirect_to)
+    mode = request.POST.get('mode') or ImportJob.MODE_INSERT
+    if mode not in dict(ImportJob.MODE_CHOICES):
+        messages.error(request, f'Unknown import mode: {mode}')
+        return redirect(redirect_to)
+
+    try:
+        job = create_job(kind, request.FILES['file'], request.user, mode, dry_run=bool(request.POST.get('dry_run')))
+    except ImportFileError as e:
+        messages.error(request, str(e))
+        return redirect(redirect_to)
+    except Exception as e:
+        messages.error(request, f'Error processing file: {str(e)}')
+        return redirect(redirect_to)
+
+    if job.dry_run:
+        messages.info(request, f'{job.file_name} was queued for a preview of its changes.')
+    else:
+        messages.info(request, f'{job.file_name} was queued for import.')
+    return redirect('import_job', pk=job.pk)
+
 def import_studies_from_file(request):
     if request.method == 'POST':
-        if 'file' not in request.FILES:
-            messages.error(request, 'No file was uploaded.')
-            return redirect('study_list')
-        
-        uploaded_file = request.FILES['file']
-        
-        # Check file extension
-        if not uploaded_file.name.endswith('.xlsx'):
-            messages.error(request, 'Please upload an Excel file (.xlsx)')
-            return redirect('study_list')
-        
-        try:
-            # Read the Excel file
-            workbook = openpyxl.load_workbook(uploaded_file)
-            sheet = workbook.active
-            
-            # Check if the first row contains the expected headers
-            first_row = [cell.value for cell in sheet[1]]
-            if len(first_row) < 2:
-                messages.error(request, 'File formatting is incorrect for study')
-                return redirect('study_list')
-            
-            # Check for required headers (case insensitive)
-            first_row_lower = [str(cell).lower().strip() if cell else '' for cell in first_row]
-            study_id_index = None
-            title_index = None
-            
-            for i, header in enumerate(first_row_lower):
-                if 'study id' in header:
-                    study_id_index = i
-                elif 'title' in header:
-                    title_index = i
-            
-            if study_id_index is None or title_index is None:
-                messages.error(request, 'File formatting is incorrect for study')
-                return redirect('study_list')
-            
-            # Process each row starting from the second row
-            imported_count = 0
-            for row_num in range(2, sheet.max_row + 1):
-                study_id_cell = sheet.cell(row=row_num, column=study_id_index + 1)
-                title_cell = sheet.cell(row=row_num, column=title_index + 1)
-                
-                study_id = study_id_cell.value
-                title = title_cell.value
-                
-                # Skip empty rows
-                if not study_id or not title:
-                    continue
-                
-                # Clean and validate the data
-                study_id = str(study_id).strip()
-                title = str(title).strip()
-                
-                if validate_import_input(study_id) and validate_import_input(title):
-                    # Check if study already exists
-                    if not Study.objects.filter(study_id=study_id).exists():
-                        Study.objects.create(study_id=study_id, title=title)
-                        imported_count += 1
-            
-            if imported_count > 0:
-                messages.success(request, f'Successfully imported {imported_count} studies.')
-            else:
-                messages.warning(request, 'No new studies were imported.')
-                
-        except Exception as e:
-            messages.error(request, f'Error processing file: {str(e)}')
-        
-        return redirect('study_list')
-    
+        return import_upload(request, 'studies', 'study_list')
     return redirect('study_list')
 
 def import_antibodies_from_file(request):
     if request.method == 'POST':
-        if 'file' not in request.FILES:
-            messages.error(request, 'No file was uploaded.')
-            return redirect('antibody_list')
-        
-        uploaded_file = request.FILES['file']
-        
-        # Check file extension
-        if not uploaded_file.name.endswith('.xlsx'):
-            messages.error(request, 'Please upload an Excel file (.xlsx)')
-            return redirect('antibody_list')
-        
-        try:
-            # Read the Excel file
-            workbook = openpyxl.load_workbook(uploaded_file)
-            sheet = workbook.active
-            
-            # Check if the first row contains the expected headers
-            first_row = [cell.value for cell in sheet[1]]
-            if len(first_row) < 6:
-                messages.error(request, 'File formatting is incorrect for antibody')
-                return redirect('antibody_list')
-            
-            # Check for required headers (case insensitive)
-            first_row_lower = [str(cell).lower().strip() if cell else '' for cell in first_row]
-            name_index = None
-            description_index = None
-            antigen_index = None
-            species_index = None
-            recognizes_index = None
-            vendor_index = None
-            
-            for i, header in enumerate(first_row_lower):
-                if 'name' in header:
-                    name_index = i
-                elif 'description' in header:
-                    description_index = i
-                elif 'antigen' in header:
-                    antigen_index = i
-                elif 'species' in header:
-                    species_index = i
-                elif 'recognizes' in header:
-                    recognizes_index = i
-                elif 'vendor' in header:
-                    vendor_index = i
-            
-            if (name_index is None or description_index is None or antigen_index is None or 
-                species_index is None or recognizes_index is None or vendor_index is None):
-                messages.error(request, 'File formatting is incorrect for antibody')
-                return redirect('antibody_list')
-            
-            # Process each row starting from the second row
-            imported_count = 0
-            for row_num in range(2, sheet.max_row + 1):
-                name_cell = sheet.cell(row=row_num, column=name_index + 1)
-                description_cell = sheet.cell(row=row_num, column=description_index + 1)
-                antigen_cell = sheet.cell(row=row_num, column=antigen_index + 1)
-                species_cell = sheet.cell(row=row_num, column=species_index + 1)
-                recognizes_cell = sheet.cell(row=row_num, column=recognizes_index + 1)
-                vendor_cell = sheet.cell(row=row_num, column=vendor_index + 1)
-                
-                name = name_cell.value
-                description = description_cell.value
-                antigen = antigen_cell.value
-                species = species_cell.value
-                recognizes = recognizes_cell.value
-                vendor = vendor_cell.value
-                
-                # Skip empty rows (name is required)
-                if not name:
-                    continue
-                
-                # Clean and validate the data
-                name = str(name).strip()
-                description = str(description).strip() if description else ''
-                antigen = str(antigen).strip() if antigen else ''
-                species = str(species).strip() if species else ''
-                recognizes = str(recognizes).strip() if recognizes else ''
-                vendor = str(vendor).strip() if vendor else ''
-                
-                if validate_import_input(name):
-                    # Check if antibody already exists
-                    if not Antibody.objects.filter(name=name).exists():
-                        Antibody.objects.create(
-                            name=name,
-                            description=description,
-                            antigen=antigen,
-                            species=species,
-                            recognizes=recognizes,
-                            vendor=vendor
-                        )
-                        imported_count += 1
-            
-            if imported_count > 0:
-                messages.success(request, f'Successfully imported {imported_count} antibodies.')
-            else:
-                messages.warning(request, 'No new antibodies were imported.')
-                
-        except Exception as e:
-            messages.error(request, f'Error processing file: {str(e)}')
-        
-        return redirect('antibody_list')
-    
+        return import_upload(request, 'antibodies', 'antibody_list')
     return redirect('antibody_list')
 
 def import_probes_from_file(request):
     if request.method == 'POST':
-        if 'file' not in request.FILES:
-            messages.error(request, 'No file was uploaded.')
-            return redirect('probe_list')
-        
-        uploaded_file = request.FILES['file']
-        
-        # Check file extension
-        if not uploaded_file.name.endswith('.xlsx'):
-            messages.error(request, 'Please upload an Excel file (.xlsx)')
-            return redirect('probe_list')
-        
-        try:
-            # Read the Excel file
-            workbook = openpyxl.load_workbook(uploaded_file)
-            sheet = workbook.active
-            
-            # Check if the first row contains the expected headers
-            first_row = [cell.value for cell in sheet[1]]
-            if len(first_row) < 6:
-                messages.error(request, 'File formatting is incorrect for probe')
-                return redirect('probe_list')
-            
-            # Check for required headers (case insensitive)
-            first_row_lower = [str(cell).lower().strip() if cell else '' for cell in first_row]
-            name_index = None
-            description_index = None
-            target_gene_index = None
-            vendor_index = None
-            platform_index = None
-            number_of_pairs_index = None
-            
-            for i, header in enumerate(first_row_lower):
-                if 'name' in header:
-                    name_index = i
-                elif 'description' in header:
-                    description_index = i
-                elif 'target gene' in header:
-                    target_gene_index = i
-                elif 'vendor' in header:
-                    vendor_index = i
-                elif 'platform' in header:
-                    platform_index = i
-                elif 'number of pairs' in header:
-                    number_of_pairs_index = i
-            
-            if (name_index is None or description_index is None or
-                target_gene_index is None or vendor_index is None or 
-                platform_index is None or number_of_pairs_index is None):
-                messages.error(request, 'File formatting is incorrect for probe')
-                return redirect('probe_list')
-            
-            # Process each row starting from the second row
-            imported_count = 0
-            for row_num in range(2, sheet.max_row + 1):
-                name_cell = sheet.cell(row=row_num, column=name_index + 1)
-                description_cell = sheet.cell(row=row_num, column=description_index + 1)
-                target_gene_cell = sheet.cell(row=row_num, column=target_gene_index + 1)
-                vendor_cell = sheet.cell(row=row_num, column=vendor_index + 1)
-                platform_cell = sheet.cell(row=row_num, column=platform_index + 1)
-                number_of_pairs_cell = sheet.cell(row=row_num, column=number_of_pairs_index + 1)
-                
-                name = name_cell.value
-                description = description_cell.value
-                target_gene = target_gene_cell.value
-                vendor = vendor_cell.value
-                platform = platform_cell.value
-                number_of_pairs = number_of_pairs_cell.value
-                
-                # Skip empty rows (name is required)
-                if not name:
-                    continue
-                
-                # Clean and validate the data
-                name = str(name).strip()
-                description = str(description).strip() if description else ''
-                target_gene = str(target_gene).strip() if target_gene else ''
-                vendor = str(vendor).strip() if vendor else ''
-                platform = str(platform).strip() if platform else ''
-                
-                # Convert number_of_pairs to integer, default to 0 if not valid
-                try:
-                    number_of_pairs = int(number_of_pairs) if number_of_pairs else 0
-                except (ValueError, TypeError):
-                    number_of_pairs = 0
-                
-                if validate_import_input(name):
-                    # Check if probe already exists
-                    if not Probe.objects.filter(name=name).exists():
-                        Probe.objects.create(
-                            name=name,
-                            description=description,
-                            target_gene=target_gene,
-                            vendor=vendor,
-                            platform=platform,
-                            number_of_pairs=number_of_pairs
-                        )
-                        imported_count += 1
-            
-            if imported_count > 0:
-                messages.success(request, f'Successfully imported {imported_count} probes.')
-            else:
-                messages.warning(request, 'No new probes were imported.')
-                
-        except Exception as e:
-            messages.error(request, f'Error processing file: {str(e)}')
-        
-        return redirect('probe_list')
-    
+        return import_upload(request, 'probes', 'probe_list')
     return redirect('probe_list')
 
 # Staining Request Views
-class StainingRequestsView(ListView):
+class StainingRequestsView(KeysetPaginationMixin, ListView):
     model = StainingRequest
     template_name = 'requests_app/staining_requests.html'
     context_object_name = 'requests'
     paginate_by = 20
 
     def get_queryset(self):
-        queryset = StainingRequest.objects.all()
+        queryset = shape_request_list(StainingRequest.objects.all())
         
         # Get filter parameters
         selected_statuses = self.request.GET.getlist('status')
@@ -1576,7 +1329,7 @@ class StainingRequestsView(ListView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['statuses'] = Status.objects.exclude(status='submitted').order_by('status')
+        context['statuses'] = selectable_statuses()
         context['selected_statuses'] = self.request.GET.getlist('status')
         context['date_from'] = self.request.GET.get('date_from', '')
         context['date_to'] = self.request.GET.get('date_to', '')
@@ -1584,14 +1337,14 @@ class StainingRequestsView(ListView):
         return context
 
 # Embedding Request Views
-class EmbeddingRequestsView(ListView):
+class EmbeddingRequestsView(KeysetPaginationMixin, ListView):
     model = EmbeddingRequest
     template_name = 'requests_app/embedding_requests.html'
     context_object_name = 'requests'
     paginate_by = 20
 
     def get_queryset(self):
-        queryset = EmbeddingRequest.objects.all()
+        queryset = shape_request_list(EmbeddingRequest.objects.all())
         
         # Get filter parameters
         selected_statuses = self.request.GET.getlist('status')
@@ -1616,7 +1369,7 @@ class EmbeddingRequestsView(ListView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['statuses'] = Status.objects.exclude(status='submitted').order_by('status')
+        context['statuses'] = selectable_statuses()
         context['selected_statuses'] = self.request.GET.getlist('status')
         context['date_from'] = self.request.GET.get('date_from', '')
         context['date_to'] = self.request.GET.get('date_to', '')
@@ -1633,17 +1386,18 @@ class EmbeddingRequestSearchView(ListView):
         context = super().get_context_data(**kwargs)
         form = EmbeddingRequestSearchForm(self.request.GET)
         context['form'] = form
-        context['tissues'] = Tissue.objects.all().order_by('name')
-        context['assignees'] = Assignee.objects.all().order_by('name')
-        context['statuses'] = Status.objects.exclude(status='submitted').order_by('status')
-        context['priorities'] = Priority.objects.all().order_by('value')
+        context['assignees'] = reference_list(Assignee)
+        context['statuses'] = selectable_statuses()
+        context['priorities'] = reference_list(Priority)
         return context
 
     def get_queryset(self):
-        queryset = EmbeddingRequest.objects.all()
+        queryset = shape_request_list(EmbeddingRequest.objects.all())
         form = EmbeddingRequestSearchForm(self.request.GET)
+        keywords = None
         
         if form.is_valid():
+            keywords = form.cleaned_data.get('q')
             request_id = form.cleaned_data.get('request_id')
             date_from = form.cleaned_data.get('date_from')
             date_to = form.cleaned_data.get('date_to')
@@ -1689,17 +1443,19 @@ class EmbeddingRequestSearchView(ListView):
             if length_of_time_in_etoh:
                 queryset = queryset.filter(length_of_time_in_etoh__icontains=length_of_time_in_etoh)
 
+        if keywords:
+            return keyword_search(queryset, keywords)
         return queryset.order_by('-created_at')
 
 # Sectioning Request Views
-class SectioningRequestsView(ListView):
+class SectioningRequestsView(KeysetPaginationMixin, ListView):
     model = SectioningRequest
     template_name = 'requests_app/sectioning_requests.html'
     context_object_name = 'requests'
     paginate_by = 20
 
     def get_queryset(self):
-        queryset = SectioningRequest.objects.all()
+        queryset = shape_request_list(SectioningRequest.objects.all())
         
         # Get filter parameters
         selected_statuses = self.request.GET.getlist('status')
@@ -1724,7 +1480,7 @@ class SectioningRequestsView(ListView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['statuses'] = Status.objects.exclude(status='submitted').order_by('status')
+        context['statuses'] = selectable_statuses()
         context['selected_statuses'] = self.request.GET.getlist('status')
         context['date_from'] = self.request.GET.get('date_from', '')
         context['date_to'] = self.request.GET.get('date_to', '')
@@ -1741,17 +1497,18 @@ class SectioningRequestSearchView(ListView):
         context = super().get_context_data(**kwargs)
         form = SectioningRequestSearchForm(self.request.GET)
         context['form'] = form
-        context['tissues'] = Tissue.objects.all().order_by('name')
-        context['assignees'] = Assignee.objects.all().order_by('name')
-        context['statuses'] = Status.objects.exclude(status='submitted').order_by('status')
-        context['priorities'] = Priority.objects.all().order_by('value')
+        context['assignees'] = reference_list(Assignee)
+        context['statuses'] = selectable_statuses()
+        context['priorities'] = reference_list(Priority)
         return context
 
     def get_queryset(self):
-        queryset = SectioningRequest.objects.all()
+        queryset = shape_request_list(SectioningRequest.objects.all())
         form = SectioningRequestSearchForm(self.request.GET)
+        keywords = None
         
         if form.is_valid():
+            keywords = form.cleaned_data.get('q')
             request_id = form.cleaned_data.get('request_id')
             date_from = form.cleaned_data.get('date_from')
             date_to = form.cleaned_data.get('date_to')
@@ -1800,6 +1557,8 @@ class SectioningRequestSearchView(ListView):
             if for_what:
                 queryset = queryset.filter(for_what=for_what)
 
+        if keywords:
+            return keyword_search(queryset, keywords)
         return queryset.order_by('-created_at')
 
 # Staining Request Search View
@@ -1810,9 +1569,10 @@ class StainingRequestSearchView(ListView):
     paginate_by = 20
 
     def get_queryset(self):
-        queryset = Request.objects.all()
+        queryset = shape_request_list(Request.objects.all())
         
         # Get search parameters
+        keywords = self.request.GET.get('q', '').strip()
         request_id = self.request.GET.get('request_id')
         date_from = self.request.GET.get('date_from')
         date_to = self.request.GET.get('date_to')
@@ -1858,12 +1618,14 @@ class StainingRequestSearchView(ListView):
         if notes:
             queryset = queryset.filter(notes__icontains=notes)
 
+        if keywords:
+            return keyword_search(queryset, keywords)
         return queryset.order_by('-created_at')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['form'] = StainingRequestSearchForm(self.request.GET)
-        context['search_performed'] = any(self.request.GET.get(field) for field in ['request_id', 'date_from', 'date_to', 'requestor', 'description', 'antibody', 'probe', 'tissue', 'study', 'status', 'priority', 'assigned_to', 'special_request', 'notes'])
+        context['search_performed'] = any(self.request.GET.get(field) for field in ['q', 'request_id', 'date_from', 'date_to', 'requestor', 'description', 'antibody', 'probe', 'tissue', 'study', 'status', 'priority', 'assigned_to', 'special_request', 'notes'])
         return context
 # Staining Request Detail, Edit, Delete Views
 class StainingRequestDetailView(DetailView):
@@ -1871,6 +1633,11 @@ class StainingRequestDetailView(DetailView):
     template_name = 'requests_app/request_detail.html'
     context_object_name = 'request'
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['change_logs'] = RequestChangeLog.for_request('staining', self.object.pk)
+        return context
+
 class StainingRequestEditView(UpdateView):
     model = Request
     form_class = RequestEditForm
@@ -1880,20 +1647,13 @@ class StainingRequestEditView(UpdateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['request_obj'] = self.object
-        context['antibodies'] = Antibody.objects.filter(archived=False).order_by('name')
-        context['studies'] = Study.objects.all().order_by('study_id')
-        context['tissues'] = Tissue.objects.all().order_by('name')
-        context['statuses'] = Status.objects.exclude(status='submitted').order_by('status')
-        context['assignees'] = Assignee.objects.all().order_by('name')
-        context['probes'] = Probe.objects.filter(archived=False).order_by('name')
-        context['priorities'] = Priority.objects.all().order_by('value')
+        context['statuses'] = selectable_statuses()
+        context['assignees'] = reference_list(Assignee)
+        context['priorities'] = reference_list(Priority)
         return context
     
     def form_valid(self, form):
         print("DEBUG: StainingRequestEditView form_valid called")
-        # Get the original object before saving
-        original_obj = Request.objects.get(pk=self.object.pk)
-        
         # Debug: print all POST data
         print(f"DEBUG: All POST keys: {list(self.request.POST.keys())}")
         
@@ -1935,17 +1695,12 @@ class StainingRequestEditView(UpdateView):
         # Save the form
         response = super().form_valid(form)
         
-        # Determine what fields changed
-        changed_fields = []
-        for field in form.changed_data:
-            if hasattr(original_obj, field) and hasattr(self.object, field):
-                old_value = getattr(original_obj, field)
-                new_value = getattr(self.object, field)
-                if old_value != new_value:
-                    changed_fields.append(field)
+        # The form already knows which fields were edited; the field values
+        # before and after are diffed by log_change
+        changed_fields = form.changed_data
         
         # Log the change (always log, even if no fields detected as changed)
-        StainingRequestChangeLog.log_change(
+        RequestChangeLog.log_change(
             request=self.object,
             change_type='updated',
             changed_fields=changed_fields,
@@ -1965,6 +1720,11 @@ class EmbeddingRequestDetailView(DetailView):
     template_name = 'requests_app/embedding_request_detail.html'
     context_object_name = 'request'
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['change_logs'] = RequestChangeLog.for_request('embedding', self.object.pk)
+        return context
+
 class EmbeddingRequestEditView(UpdateView):
     model = EmbeddingRequest
     form_class = EmbeddingRequestEditForm
@@ -1974,18 +1734,12 @@ class EmbeddingRequestEditView(UpdateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['request_obj'] = self.object
-        context['requestors'] = Requestor.objects.all().order_by('name')
-        context['studies'] = Study.objects.all().order_by('study_id')
-        context['tissues'] = Tissue.objects.all().order_by('name')
-        context['statuses'] = Status.objects.exclude(status='submitted').order_by('status')
-        context['assignees'] = Assignee.objects.all().order_by('name')
+        context['statuses'] = selectable_statuses()
+        context['assignees'] = reference_list(Assignee)
         return context
     
     def form_valid(self, form):
         print("DEBUG: EmbeddingRequestEditView form_valid called")
-        # Get the original object before saving
-        original_obj = EmbeddingRequest.objects.get(pk=self.object.pk)
-        
         # Debug: print all POST data
         print(f"DEBUG: All POST keys: {list(self.request.POST.keys())}")
         
@@ -2027,17 +1781,12 @@ class EmbeddingRequestEditView(UpdateView):
         # Save the form
         response = super().form_valid(form)
         
-        # Determine what fields changed
-        changed_fields = []
-        for field in form.changed_data:
-            if hasattr(original_obj, field) and hasattr(self.object, field):
-                old_value = getattr(original_obj, field)
-                new_value = getattr(self.object, field)
-                if old_value != new_value:
-                    changed_fields.append(field)
+        # The form already knows which fields were edited; the field values
+        # before and after are diffed by log_change
+        changed_fields = form.changed_data
         
         # Log the change (always log, even if no fields detected as changed)
-        EmbeddingRequestChangeLog.log_change(
+        RequestChangeLog.log_change(
             request=self.object,
             change_type='updated',
             changed_fields=changed_fields,
@@ -2057,6 +1806,11 @@ class SectioningRequestDetailView(DetailView):
     template_name = 'requests_app/sectioning_request_detail.html'
     context_object_name = 'request'
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['change_logs'] = RequestChangeLog.for_request('sectioning', self.object.pk)
+        return context
+
 class SectioningRequestEditView(UpdateView):
     model = SectioningRequest
     form_class = SectioningRequestEditForm
@@ -2066,18 +1820,12 @@ class SectioningRequestEditView(UpdateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['request_obj'] = self.object
-        context['requestors'] = Requestor.objects.all().order_by('name')
-        context['studies'] = Study.objects.all().order_by('study_id')
-        context['tissues'] = Tissue.objects.all().order_by('name')
-        context['statuses'] = Status.objects.exclude(status='submitted').order_by('status')
-        context['assignees'] = Assignee.objects.all().order_by('name')
+        context['statuses'] = selectable_statuses()
+        context['assignees'] = reference_list(Assignee)
         return context
     
     def form_valid(self, form):
         print("DEBUG: SectioningRequestEditView form_valid called")
-        # Get the original object before saving
-        original_obj = SectioningRequest.objects.get(pk=self.object.pk)
-        
         # Debug: print all POST data
         print(f"DEBUG: All POST keys: {list(self.request.POST.keys())}")
         
@@ -2119,17 +1867,12 @@ class SectioningRequestEditView(UpdateView):
         # Save the form
         response = super().form_valid(form)
         
-        # Determine what fields changed
-        changed_fields = []
-        for field in form.changed_data:
-            if hasattr(original_obj, field) and hasattr(self.object, field):
-                old_value = getattr(original_obj, field)
-                new_value = getattr(self.object, field)
-                if old_value != new_value:
-                    changed_fields.append(field)
+        # The form already knows which fields were edited; the field values
+        # before and after are diffed by log_change
+        changed_fields = form.changed_data
         
         # Log the change (always log, even if no fields detected as changed)
-        SectioningRequestChangeLog.log_change(
+        RequestChangeLog.log_change(
             request=self.object,
             change_type='updated',
             changed_fields=changed_fields,
@@ -2152,7 +1895,7 @@ class StainingRequestsDeleteView(ListView):
     paginate_by = 20
 
     def get_queryset(self):
-        return Request.objects.all().order_by('-created_at')
+        return shape_request_list(Request.objects.all()).order_by('-created_at')
 
 class EmbeddingRequestsDeleteView(ListView):
     model = EmbeddingRequest
@@ -2161,7 +1904,7 @@ class EmbeddingRequestsDeleteView(ListView):
     paginate_by = 20
 
     def get_queryset(self):
-        return EmbeddingRequest.objects.all().order_by('-created_at')
+        return shape_request_list(EmbeddingRequest.objects.all()).order_by('-created_at')
 
 class SectioningRequestsDeleteView(ListView):
     model = SectioningRequest
@@ -2170,18 +1913,18 @@ class SectioningRequestsDeleteView(ListView):
     paginate_by = 20
 
     def get_queryset(self):
-        return SectioningRequest.objects.all().order_by('-created_at')
+        return shape_request_list(SectioningRequest.objects.all()).order_by('-created_at')
 
 
 # Current Requests Views (Filtered - Exclude Complete)
-class StainingRequestsCurrentView(ListView):
+class StainingRequestsCurrentView(KeysetPaginationMixin, ListView):
     model = StainingRequest
     template_name = 'requests_app/staining_requests.html'
     context_object_name = 'requests'
     paginate_by = 20
 
     def get_queryset(self):
-        queryset = StainingRequest.objects.all()
+        queryset = shape_request_list(StainingRequest.objects.all())
         selected_statuses = self.request.GET.getlist('status')
         date_from = self.request.GET.get('date_from')
         date_to = self.request.GET.get('date_to')
@@ -2194,9 +1937,9 @@ class StainingRequestsCurrentView(ListView):
             queryset = queryset.filter(status__in=status_objects)
         else:
             # Default: exclude complete status when no statuses are selected
-            complete_status = Status.objects.filter(status='Complete').first()
-            if complete_status:
-                queryset = queryset.exclude(status=complete_status)
+            complete_status_id = status_id(COMPLETE_STATUS)
+            if complete_status_id:
+                queryset = queryset.exclude(status_id=complete_status_id)
         
         if date_from:
             queryset = queryset.filter(status_timestamp__gte=date_from)
@@ -2208,7 +1951,7 @@ class StainingRequestsCurrentView(ListView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['statuses'] = Status.objects.exclude(status='submitted').order_by('status')
+        context['statuses'] = selectable_statuses()
         context['selected_statuses'] = self.request.GET.getlist('status')
         context['date_from'] = self.request.GET.get('date_from')
         context['date_to'] = self.request.GET.get('date_to')
@@ -2217,14 +1960,14 @@ class StainingRequestsCurrentView(ListView):
         return context
 
 
-class EmbeddingRequestsCurrentView(ListView):
+class EmbeddingRequestsCurrentView(KeysetPaginationMixin, ListView):
     model = EmbeddingRequest
     template_name = 'requests_app/embedding_requests.html'
     context_object_name = 'requests'
     paginate_by = 20
 
     def get_queryset(self):
-        queryset = EmbeddingRequest.objects.all()
+        queryset = shape_request_list(EmbeddingRequest.objects.all())
         selected_statuses = self.request.GET.getlist('status')
         date_from = self.request.GET.get('date_from')
         date_to = self.request.GET.get('date_to')
@@ -2237,9 +1980,9 @@ class EmbeddingRequestsCurrentView(ListView):
             queryset = queryset.filter(status__in=status_objects)
         else:
             # Default: exclude complete status when no statuses are selected
-            complete_status = Status.objects.filter(status='Complete').first()
-            if complete_status:
-                queryset = queryset.exclude(status=complete_status)
+            complete_status_id = status_id(COMPLETE_STATUS)
+            if complete_status_id:
+                queryset = queryset.exclude(status_id=complete_status_id)
         
         if date_from:
             queryset = queryset.filter(status_timestamp__gte=date_from)
@@ -2251,7 +1994,7 @@ class EmbeddingRequestsCurrentView(ListView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['statuses'] = Status.objects.exclude(status='submitted').order_by('status')
+        context['statuses'] = selectable_statuses()
         context['selected_statuses'] = self.request.GET.getlist('status')
         context['date_from'] = self.request.GET.get('date_from')
         context['date_to'] = self.request.GET.get('date_to')
@@ -2260,14 +2003,14 @@ class EmbeddingRequestsCurrentView(ListView):
         return context
 
 
-class SectioningRequestsCurrentView(ListView):
+class SectioningRequestsCurrentView(KeysetPaginationMixin, ListView):
     model = SectioningRequest
     template_name = 'requests_app/sectioning_requests.html'
     context_object_name = 'requests'
     paginate_by = 20
 
     def get_queryset(self):
-        queryset = SectioningRequest.objects.all()
+        queryset = shape_request_list(SectioningRequest.objects.all())
         selected_statuses = self.request.GET.getlist('status')
         date_from = self.request.GET.get('date_from')
         date_to = self.request.GET.get('date_to')
@@ -2280,9 +2023,9 @@ class SectioningRequestsCurrentView(ListView):
             queryset = queryset.filter(status__in=status_objects)
         else:
             # Default: exclude complete status when no statuses are selected
-            complete_status = Status.objects.filter(status='Complete').first()
-            if complete_status:
-                queryset = queryset.exclude(status=complete_status)
+            complete_status_id = status_id(COMPLETE_STATUS)
+            if complete_status_id:
+                queryset = queryset.exclude(status_id=complete_status_id)
         
         if date_from:
             queryset = queryset.filter(status_timestamp__gte=date_from)
@@ -2294,7 +2037,7 @@ class SectioningRequestsCurrentView(ListView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['statuses'] = Status.objects.exclude(status='submitted').order_by('status')
+        context['statuses'] = selectable_statuses()
         context['selected_statuses'] = self.request.GET.getlist('status')
         context['date_from'] = self.request.GET.get('date_from')
         context['date_to'] = self.request.GET.get('date_to')
@@ -2311,80 +2054,105 @@ class RequestLogSelectionView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Get all request IDs that have change logs for each request type
-        staining_requests_with_logs = StainingRequestChangeLog.objects.values_list('request_id', flat=True).distinct()
-        embedding_requests_with_logs = EmbeddingRequestChangeLog.objects.values_list('request_id', flat=True).distinct()
-        sectioning_requests_with_logs = SectioningRequestChangeLog.objects.values_list('request_id', flat=True).distinct()
-        
-        # Get the actual request objects for display
-        context['staining_requests'] = StainingRequest.objects.filter(key__in=staining_requests_with_logs).order_by('-key')
-        context['embedding_requests'] = EmbeddingRequest.objects.filter(key__in=embedding_requests_with_logs).order_by('-key')
-        context['sectioning_requests'] = SectioningRequest.objects.filter(key__in=sectioning_requests_with_logs).order_by('-key')
+        # One indexed semi-join per request type against the change log
+        for request_type, model in [('staining', StainingRequest), ('embedding', EmbeddingRequest), ('sectioning', SectioningRequest)]:
+            has_logs = Exists(RequestChangeLog.objects.filter(request_type=request_type, request_id=OuterRef('key')))
+            context[f'{request_type}_requests'] = shape_request_list(model.objects.filter(has_logs)).order_by('-key')
         
         return context
 
 
-# Request History Views
-class StainingRequestHistoryView(ListView):
-    model = StainingRequestChangeLog
+# Request History View
+class RequestHistoryView(ListView):
+    """Every logged version of one request; request_type is set per URL"""
+    model = RequestChangeLog
     template_name = 'requests_app/request_history.html'
     context_object_name = 'change_logs'
     paginate_by = 20
+    request_type = None
 
     def get_queryset(self):
-        request_id = self.kwargs['pk']
-        return StainingRequestChangeLog.get_request_history(request_id)
+        return RequestChangeLog.get_request_history(self.request_type, self.kwargs['pk'])
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        request_id = self.kwargs['pk']
-        try:
-            context['request'] = Request.objects.get(pk=request_id)
-            context['request_type'] = 'staining'
-        except Request.DoesNotExist:
-            context['request'] = None
+        model = RequestChangeLog.REQUEST_MODELS[self.request_type]
+        context['request'] = model.objects.filter(pk=self.kwargs['pk']).first()
+        if context['request'] is not None:
+            context['request_type'] = self.request_type
         return context
 
 
-class EmbeddingRequestHistoryView(ListView):
-    model = EmbeddingRequestChangeLog
-    template_name = 'requests_app/request_history.html'
-    context_object_name = 'change_logs'
-    paginate_by = 20
-
-    def get_queryset(self):
-        request_id = self.kwargs['pk']
-        return EmbeddingRequestChangeLog.get_request_history(request_id)
-
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        request_id = self.kwargs['pk']
-        try:
-            context['request'] = EmbeddingRequest.objects.get(pk=request_id)
-            context['request_type'] = 'embedding'
-        except EmbeddingRequest.DoesNotExist:
-            context['request'] = None
-        return context
+# Point-in-time Views
+def as_of_params(query):
+    """
+    (when, request_type, study_id) from the at, request_type and study GET
+    parameters; at defaults to now and is read in the current time zone.
+    Raises ValueError for values that cannot be used.
+    """
+    when = timezone.now()
+    if query.get('at'):
+        when = parse_datetime(query['at'])
+        if when is None:
+            raise ValueError(f"Invalid date and time: {query['at']}")
+        if timezone.is_naive(when):
+            when = timezone.make_aware(when)
+
+    request_type = query.get('request_type') or None
+    if request_type is not None and request_type not in RequestChangeLog.REQUEST_MODELS:
+        raise ValueError(f"Unknown request type: {request_type}")
+
+    study_id = int(query['study']) if query.get('study') else None
+    return when, request_type, study_id
+
+
+def requests_as_of_api(request):
+    """JSON state of every request, or of one request type or study, as of the at parameter"""
+    try:
+        when, request_type, study_id = as_of_params(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    logs = RequestChangeLog.as_of(when, request_type=request_type, study=study_id)
+    return JsonResponse({
+        'as_of': when.isoformat(),
+        'results': [
+            {
+                'request_type': log.request_type,
+                'request_id': log.request_id,
+                'version': log.version,
+                'changed_at': log.changed_at.isoformat(),
+                'state': log.get_state(),
+            }
+            for log in logs
+        ],
+    })
 
 
-class SectioningRequestHistoryView(ListView):
-    model = SectioningRequestChangeLog
-    template_name = 'requests_app/request_history.html'
+class RequestsAsOfView(ListView):
+    """Every request as it was at a given moment, rebuilt from the change log"""
+    template_name = 'requests_app/requests_as_of.html'
     context_object_name = 'change_logs'
-    paginate_by = 20
+    paginate_by = 50
 
     def get_queryset(self):
-        request_id = self.kwargs['pk']
-        return SectioningRequestChangeLog.get_request_history(request_id)
+        try:
+            self.when, self.request_type, self.study_id = as_of_params(self.request.GET)
+            self.error = None
+        except ValueError as e:
+            self.when, self.request_type, self.study_id = timezone.now(), None, None
+            self.error = str(e)
+        return RequestChangeLog.as_of(self.when, request_type=self.request_type, study=self.study_id)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        request_id = self.kwargs['pk']
-        try:
-            context['request'] = SectioningRequest.objects.get(pk=request_id)
-            context['request_type'] = 'sectioning'
-        except SectioningRequest.DoesNotExist:
-            context['request'] = None
+        context['as_of'] = timezone.localtime(self.when)
+        context['selected_request_type'] = self.request_type
+        context['selected_study'] = self.study_id
+        context['request_types'] = NotificationSettings.REQUEST_TYPE_CHOICES
+        # Only the selected study is rendered; the others come from the autocomplete endpoint
+        context['study'] = Study.objects.filter(pk=self.study_id).first() if self.study_id else None
+        context['error'] = self.error
         return context
 
 
@@ -2398,7 +2166,7 @@ class StainingNotificationConfigView(FormView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['statuses'] = Status.objects.all().order_by('status')
+        context['statuses'] = reference_list(Status)
         context['request_type'] = 'staining'
         context['request_type_title'] = 'Staining Request'
         context['request_type_icon'] = 'fas fa-vial'
@@ -2420,6 +2188,11 @@ class StainingNotificationConfigView(FormView):
         
         # Update settings in database
         NotificationSettings.update_settings('staining', status_settings)
+        NotificationDigestSettings.update_settings(
+            'staining',
+            form.cleaned_data['digest_enabled'],
+            form.cleaned_data['digest_window_minutes'] or NotificationDigestSettings.DEFAULT_WINDOW_MINUTES,
+        )
         
         messages.success(self.request, 'Staining request notification settings updated successfully!')
         return super().form_valid(form)
@@ -2434,7 +2207,7 @@ class EmbeddingNotificationConfigView(FormView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['statuses'] = Status.objects.all().order_by('status')
+        context['statuses'] = reference_list(Status)
         context['request_type'] = 'embedding'
         context['request_type_title'] = 'Embedding Request'
         context['request_type_icon'] = 'fas fa-cube'
@@ -2456,6 +2229,11 @@ class EmbeddingNotificationConfigView(FormView):
         
         # Update settings in database
         NotificationSettings.update_settings('embedding', status_settings)
+        NotificationDigestSettings.update_settings(
+            'embedding',
+            form.cleaned_data['digest_enabled'],
+            form.cleaned_data['digest_window_minutes'] or NotificationDigestSettings.DEFAULT_WINDOW_MINUTES,
+        )
         
         messages.success(self.request, 'Embedding request notification settings updated successfully!')
         return super().form_valid(form)
@@ -2470,7 +2248,7 @@ class SectioningNotificationConfigView(FormView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['statuses'] = Status.objects.all().order_by('status')
+        context['statuses'] = reference_list(Status)
         context['request_type'] = 'sectioning'
         context['request_type_title'] = 'Sectioning Request'
         context['request_type_icon'] = 'fas fa-cut'
@@ -2492,6 +2270,11 @@ class SectioningNotificationConfigView(FormView):
         
         # Update settings in database
         NotificationSettings.update_settings('sectioning', status_settings)
+        NotificationDigestSettings.update_settings(
+            'sectioning',
+            form.cleaned_data['digest_enabled'],
+            form.cleaned_data['digest_window_minutes'] or NotificationDigestSettings.DEFAULT_WINDOW_MINUTES,
+        )
         
         messages.success(self.request, 'Sectioning request notification settings updated successfully!')
         return super().form_valid(form)
@@ -2527,213 +2310,137 @@ class EmailTestView(TemplateView):
 
 
 # Import Views
-@method_decorator(user_passes_test(is_staff_user), name='dispatch')
-class ImportAntibodiesView(TemplateView):
-    """View for importing antibodies from Excel file"""
-    template_name = 'requests_app/import_antibodies.html'
-    
+class CatalogImportView(TemplateView):
+    """Base view for importing a reference catalog from an uploaded file, listing its recent import jobs"""
+    template_name = 'requests_app/import_jobs.html'
+    kind = None
+    recent_jobs = 20
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['kind'] = self.kind
+        context['kind_title'] = dict(ImportJob.KIND_CHOICES)[self.kind]
+        context['columns'] = IMPORT_SPECS[self.kind]['columns']
+        context['optional_columns'] = IMPORT_SPECS[self.kind]['optional']
+        context['modes'] = ImportJob.MODE_CHOICES
+        context['jobs'] = ImportJob.objects.filter(kind=self.kind)[:self.recent_jobs]
+        return context
+
     def post(self, request, *args, **kwargs):
-        """Handle file upload and import"""
-        if 'file' not in request.FILES:
-            messages.error(request, 'No file uploaded.')
-            return redirect('admin:index')
-        
-        file = request.FILES['file']
-        
-        # Check file extension
-        if not file.name.endswith('.xlsx'):
-            messages.error(request, 'Please upload an Excel file (.xlsx).')
-            return redirect('admin:index')
-        
-        try:
-            # Read Excel file
-            df = pd.read_excel(file)
-            
-            # Expected columns (case insensitive)
-            expected_columns = ['name', 'description', 'antigen', 'species', 'recognizes', 'vendor']
-            
-            # Normalize column names to lowercase
-            df.columns = df.columns.str.lower().str.strip()
-            
-            # Check if all required columns exist
-            missing_columns = [col for col in expected_columns if col not in df.columns]
-            if missing_columns:
-                messages.error(request, f'Missing required columns: {", ".join(missing_columns)}')
-                return redirect('admin:index')
-            
-            # Import antibodies
-            imported_count = 0
-            skipped_count = 0
-            
-            for index, row in df.iterrows():
-                try:
-                    # Check if antibody already exists
-                    if Antibody.objects.filter(name=row['name']).exists():
-                        skipped_count += 1
-                        continue
-                    
-                    # Create new antibody
-                    Antibody.objects.create(
-                        name=row['name'],
-                        description=row['description'] if pd.notna(row['description']) else '',
-                        antigen=row['antigen'] if pd.notna(row['antigen']) else '',
-                        species=row['species'] if pd.notna(row['species']) else '',
-                        recognizes=row['recognizes'] if pd.notna(row['recognizes']) else '',
-                        vendor=row['vendor'] if pd.notna(row['vendor']) else ''
-                    )
-                    imported_count += 1
-                    
-                except Exception as e:
-                    messages.warning(request, f'Error importing row {index + 2}: {str(e)}')
-                    continue
-            
-            if imported_count > 0:
-                messages.success(request, f'Successfully imported {imported_count} antibodies.')
-            if skipped_count > 0:
-                messages.info(request, f'Skipped {skipped_count} antibodies that already exist.')
-            
-        except Exception as e:
-            messages.error(request, f'Error processing file: {str(e)}')
-        
-        return redirect('admin:index')
+        """Handle file upload; the import itself runs in the background"""
+        return import_upload(request, self.kind, request.resolver_match.view_name)
 
 
 @method_decorator(user_passes_test(is_staff_user), name='dispatch')
-class ImportStudiesView(TemplateView):
-    """View for importing studies from Excel file"""
-    template_name = 'requests_app/import_studies.html'
-    
-    def post(self, request, *args, **kwargs):
-        """Handle file upload and import"""
-        if 'file' not in request.FILES:
-            messages.error(request, 'No file uploaded.')
-            return redirect('admin:index')
-        
-        file = request.FILES['file']
-        
-        # Check file extension
-        if not file.name.endswith('.xlsx'):
-            messages.error(request, 'Please upload an Excel file (.xlsx).')
-            return redirect('admin:index')
-        
-        try:
-            # Read Excel file
-            df = pd.read_excel(file)
-            
-            # Expected columns (case insensitive)
-            expected_columns = ['study_id', 'title']
-            
-            # Normalize column names to lowercase
-            df.columns = df.columns.str.lower().str.strip()
-            
-            # Check if all required columns exist
-            missing_columns = [col for col in expected_columns if col not in df.columns]
-            if missing_columns:
-                messages.error(request, f'Missing required columns: {", ".join(missing_columns)}')
-                return redirect('admin:index')
-            
-            # Import studies
-            imported_count = 0
-            skipped_count = 0
-            
-            for index, row in df.iterrows():
-                try:
-                    # Check if study already exists
-                    if Study.objects.filter(study_id=row['study_id']).exists():
-                        skipped_count += 1
-                        continue
-                    
-                    # Create new study
-                    Study.objects.create(
-                        study_id=row['study_id'],
-                        title=row['title'] if pd.notna(row['title']) else ''
-                    )
-                    imported_count += 1
-                    
-                except Exception as e:
-                    messages.warning(request, f'Error importing row {index + 2}: {str(e)}')
-                    continue
-            
-            if imported_count > 0:
-                messages.success(request, f'Successfully imported {imported_count} studies.')
-            if skipped_count > 0:
-                messages.info(request, f'Skipped {skipped_count} studies that already exist.')
-            
-        except Exception as e:
-            messages.error(request, f'Error processing file: {str(e)}')
-        
-        return redirect('admin:index')
+class ImportAntibodiesView(CatalogImportView):
+    """View for importing antibodies from an uploaded file"""
+    kind = 'antibodies'
 
 
 @method_decorator(user_passes_test(is_staff_user), name='dispatch')
-class ImportProbesView(TemplateView):
-    """View for importing probes from Excel file"""
-    template_name = 'requests_app/import_probes.html'
-    
-    def post(self, request, *args, **kwargs):
-        """Handle file upload and import"""
-        if 'file' not in request.FILES:
-            messages.error(request, 'No file uploaded.')
-            return redirect('admin:index')
-        
-        file = request.FILES['file']
-        
-        # Check file extension
-        if not file.name.endswith('.xlsx'):
-            messages.error(request, 'Please upload an Excel file (.xlsx).')
-            return redirect('admin:index')
-        
-        try:
-            # Read Excel file
-            df = pd.read_excel(file)
-            
-            # Expected columns (case insensitive)
-            expected_columns = ['name', 'description', 'target_gene', 'vendor', 'platform', 'number_of_pairs']
-            
-            # Normalize column names to lowercase
-            df.columns = df.columns.str.lower().str.strip()
-            
-            # Check if all required columns exist
-            missing_columns = [col for col in expected_columns if col not in df.columns]
-            if missing_columns:
-                messages.error(request, f'Missing required columns: {", ".join(missing_columns)}')
-                return redirect('admin:index')
-            
-            # Import probes
-            imported_count = 0
-            skipped_count = 0
-            
-            for index, row in df.iterrows():
-                try:
-                    # Check if probe already exists
-                    if Probe.objects.filter(name=row['name']).exists():
-                        skipped_count += 1
-                        continue
-                    
-                    # Create new probe
-                    Probe.objects.create(
-                        name=row['name'],
-                        description=row['description'] if pd.notna(row['description']) else '',
-                        target_gene=row['target_gene'] if pd.notna(row['target_gene']) else '',
-                        vendor=row['vendor'] if pd.notna(row['vendor']) else '',
-                        platform=row['platform'] if pd.notna(row['platform']) else '',
-                        number_of_pairs=int(row['number_of_pairs']) if pd.notna(row['number_of_pairs']) else None
-                    )
-                    imported_count += 1
-                    
-                except Exception as e:
-                    messages.warning(request, f'Error importing row {index + 2}: {str(e)}')
-                    continue
-            
-            if imported_count > 0:
-                messages.success(request, f'Successfully imported {imported_count} probes.')
-            if skipped_count > 0:
-                messages.info(request, f'Skipped {skipped_count} probes that already exist.')
-            
-        except Exception as e:
-            messages.error(request, f'Error processing file: {str(e)}')
-        
-        return redirect('admin:index')
+class ImportStudiesView(CatalogImportView):
+    """View for importing studies from an uploaded file"""
+    kind = 'studies'
+
+
+@method_decorator(user_passes_test(is_staff_user), name='dispatch')
+class ImportProbesView(CatalogImportView):
+    """View for importing probes from an uploaded file"""
+    kind = 'probes'
+
+
+def import_job_progress(job):
+    """What the import pages poll: the job's state, position in the file and counts so far"""
+    return {
+        'id': job.pk,
+        'kind': job.kind,
+        'mode': job.mode,
+        'file_name': job.file_name,
+        'state': job.state,
+        'state_display': job.get_state_display(),
+        'finished': job.is_finished,
+        'dry_run': job.dry_run,
+        'awaits_confirmation': job.awaits_confirmation,
+        'preview_counts': job.preview_counts,
+        'rows_processed': job.rows_processed,
+        'total_rows': job.total_rows,
+        'percent': job.percent_done,
+        'imported': job.imported_count,
+        'updated': job.updated_count,
+        'unchanged': job.unchanged_count,
+        'skipped': job.skipped_count,
+        'invalid': job.invalid_count,
+        'errors': job.errors,
+        'last_error': job.last_error,
+        'attempts': job.attempts,
+        'updated_at': job.updated_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+@method_decorator(user_passes_test(is_staff_user), name='dispatch')
+class ImportJobDetailView(DetailView):
+    """Progress of one import job; the page polls import_job_status until it finishes"""
+    model = ImportJob
+    template_name = 'requests_app/import_job.html'
+    context_object_name = 'job'
+    preview_page_size = 50
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        job = self.object
+        if job.awaits_confirmation:
+            key = IMPORT_SPECS[job.kind]['key']
+            preview = load_preview(job, columns=['row', 'action', key, 'changed', 'message'])
+            action = self.request.GET.get('action')
+            if action in PREVIEW_ACTIONS:
+                preview = preview[preview['action'] == action]
+            else:
+                action = None
+            # Paginate positions rather than the frame itself, then take just the page's rows
+            page = Paginator(range(len(preview)), self.preview_page_size).get_page(self.request.GET.get('page'))
+            rows = preview.iloc[max(page.start_index() - 1, 0):page.end_index()]
+            context['preview_page'] = page
+            context['preview_rows'] = [
+                {'row': row, 'action': row_action, 'key': value, 'changed': changed, 'message': message}
+                for row, row_action, value, changed, message in rows[['row', 'action', key, 'changed', 'message']].itertuples(index=False)
+            ]
+            context['preview_action'] = action
+            context['preview_counts'] = [(name, job.preview_counts.get(name, 0)) for name in PREVIEW_ACTIONS]
+        return context
+
+
+@user_passes_test(is_staff_user)
+def import_job_status(request, pk):
+    """JSON progress of an import job"""
+    job = get_object_or_404(ImportJob, pk=pk)
+    return JsonResponse(import_job_progress(job))
+
+
+@user_passes_test(is_staff_user)
+def commit_import_job(request, pk):
+    """Queue a previewed import job to apply the previewed changes"""
+    job = get_object_or_404(ImportJob, pk=pk)
+    if request.method == 'POST':
+        if job.awaits_confirmation:
+            commit_preview(job)
+            messages.info(request, f'The previewed changes from {job.file_name} were queued for import.')
+        else:
+            messages.warning(request, 'Only previewed imports can be committed.')
+    return redirect('import_job', pk=job.pk)
+
+
+@user_passes_test(is_staff_user)
+def resume_import_job(request, pk):
+    """Queue a failed import job again, continuing after its last committed row"""
+    job = get_object_or_404(ImportJob, pk=pk)
+    if request.method == 'POST':
+        if job.state == ImportJob.STATE_FAILED:
+            resume_job(job)
+            messages.info(request, f'Import of {job.file_name} will resume after row {job.checkpoint_row}.')
+        else:
+            messages.warning(request, 'Only failed imports can be resumed.')
+    return redirect('import_job', pk=job.pk)
 
 
 def custom_logout(request):
@@ -0,0 +1,36 @@
+"""
+Form widgets for picking reference data (antibodies, probes, studies, requestors, tissues)
+"""
+from django import forms
+from django.urls import reverse
+
+
+class AutocompleteSelect(forms.Select):
+    """
+    Select for a ModelChoiceField that renders only the empty choice and the
+    selected value. static/js/dropdown_search.js fetches the other choices from
+    the autocomplete endpoint as the user types, so the page no longer grows
+    with the size of the catalog.
+    """
+
+    def __init__(self, attrs=None):
+        super().__init__(attrs={'class': 'form-control', **(attrs or {})})
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        model_name = self.choices.queryset.model._meta.model_name
+        context['widget']['attrs']['data-autocomplete-url'] = reverse('reference_autocomplete', args=[model_name])
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        field = self.choices.field
+        # Primary keys are integers; anything else cannot be a selected row
+        selected = [v for v in value if str(v).isdigit()]
+
+        options = []
+        if field.empty_label is not None:
+            options.append(self.create_option(name, '', field.empty_label, not selected, 0))
+        if selected:
+            for index, obj in enumerate(field.queryset.filter(pk__in=selected), start=len(options)):
+                options.append(self.create_option(name, str(obj.pk), field.label_from_instance(obj), True, index))
+        return [(None, options, 0)]